@@ -0,0 +1,131 @@
+"""
+TCX Parser Benchmark
+
+Description:
+    Compares the streaming parse_tcx in scripts/analyze_xert_tcx.py against the
+    original ElementTree implementation (kept below as the reference). Both run
+    single-process over the same files; the script checks that the outputs are
+    identical and reports files/second and peak traced memory per file.
+
+    Without an 'Xert/' folder, --synthetic N benchmarks N generated rides
+    (see benchmarks/synthetic.py). The parse_tcx throughput is also part of
+    the full suite, benchmarks/run_benchmarks.py.
+
+Usage:
+    python benchmarks/bench_parse_tcx.py [TCX_DIR] [--limit N]
+    python benchmarks/bench_parse_tcx.py --synthetic 20 [--seconds 3600]
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from analyze_xert_tcx import parse_tcx, NAMESPACE, TCX_DIR
+from intervals_agent.matching import utc_iso
+import synthetic
+
+
+def parse_tcx_tree(file_path):
+    """Reference implementation: full ElementTree build with repeated findall."""
+    try:
+        root = ET.parse(file_path).getroot()
+        activity = root.find('.//ns:Activity', NAMESPACE)
+        if activity is None:
+            return None
+        activity_date = activity.find('ns:Id', NAMESPACE).text.split('T')[0]
+
+        watts_list, heart_rates = [], []
+        for tp in root.findall('.//ns:Trackpoint', NAMESPACE):
+            watts_elem = tp.find('.//ext:Watts', NAMESPACE)
+            if watts_elem is not None:
+                watts_list.append(float(watts_elem.text))
+            hr_elem = tp.find('.//ns:HeartRateBpm/ns:Value', NAMESPACE)
+            if hr_elem is not None:
+                heart_rates.append(float(hr_elem.text))
+        if not watts_list:
+            return None
+
+        avg_power = sum(watts_list) / len(watts_list)
+        avg_hr = sum(heart_rates) / len(heart_rates) if heart_rates else None
+        times = [tp.find('ns:Time', NAMESPACE).text for tp in root.findall('.//ns:Trackpoint', NAMESPACE) if tp.find('ns:Time', NAMESPACE) is not None]
+        duration_min = 0
+        if len(times) > 1:
+            try:
+                t1 = datetime.fromisoformat(times[0].replace('Z', '+00:00'))
+                t2 = datetime.fromisoformat(times[-1].replace('Z', '+00:00'))
+                duration_min = (t2 - t1).total_seconds() / 60
+            except ValueError:
+                pass
+        return {
+            'Date': activity_date,
+            'Xert_Max_Power': round(max(watts_list), 1),
+            'Xert_Avg_Power': round(avg_power, 1),
+            'Xert_Max_HR': max(heart_rates) if heart_rates else None,
+            'Xert_Avg_HR': round(avg_hr, 1) if avg_hr else None,
+            'Xert_Duration_Min': round(duration_min, 1),
+            'Xert_Start': utc_iso(times[0]) if times else None,
+            'Xert_End': utc_iso(times[-1]) if times else None,
+            'Xert_Filename': os.path.basename(file_path)
+        }
+    except Exception:
+        return None
+
+
+def run(parser, files):
+    """Returns (results, seconds, peak traced bytes for the largest single file)."""
+    start = time.perf_counter()
+    results = [parser(f) for f in files]
+    elapsed = time.perf_counter() - start
+
+    largest = max(files, key=os.path.getsize)
+    tracemalloc.start()
+    parser(largest)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return results, elapsed, peak
+
+
+def benchmark(files):
+    """Times both parsers over files and prints the comparison."""
+    total_mb = sum(os.path.getsize(f) for f in files) / 1e6
+    print(f"Benchmarking {len(files)} files ({total_mb:.1f} MB)...")
+
+    tree_results, tree_time, tree_peak = run(parse_tcx_tree, files)
+    stream_results, stream_time, stream_peak = run(parse_tcx, files)
+
+    print(f"{'Parser':<12}{'Seconds':>10}{'Files/s':>10}{'MB/s':>10}{'Peak MB':>10}")
+    for name, elapsed, peak in [('tree', tree_time, tree_peak), ('streaming', stream_time, stream_peak)]:
+        print(f"{name:<12}{elapsed:>10.2f}{len(files) / elapsed:>10.1f}{total_mb / elapsed:>10.1f}{peak / 1e6:>10.1f}")
+    print(f"Speedup: {tree_time / stream_time:.2f}x")
+    print(f"Outputs identical: {tree_results == stream_results}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming vs tree-based TCX parsing.")
+    parser.add_argument('tcx_dir', nargs='?', default=TCX_DIR)
+    parser.add_argument('--limit', type=int, default=None, help="Only use the first N files.")
+    parser.add_argument('--synthetic', type=int, metavar='N', help="Benchmark N generated rides instead of TCX_DIR.")
+    parser.add_argument('--seconds', type=int, default=3600, help="Duration of each generated ride (default: %(default)s).")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        with tempfile.TemporaryDirectory() as tmp:
+            benchmark(synthetic.generate_tcx_dir(tmp, args.synthetic, args.seconds))
+        return
+    files = sorted(glob.glob(os.path.join(args.tcx_dir, '*.tcx')))[:args.limit]
+    if not files:
+        print(f"Error: no .tcx files found in '{args.tcx_dir}' (use --synthetic N to generate some).")
+        return
+    benchmark(files)
+
+
+if __name__ == "__main__":
+    main()
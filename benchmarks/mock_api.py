@@ -0,0 +1,201 @@
+"""
+Mock Intervals.icu API
+
+Description:
+    A local stand-in for the endpoints the agent syncs from:
+
+        GET /api/v1/athlete/{id}/activities?oldest=YYYY-MM-DD&newest=YYYY-MM-DD[&fields=a,b,...]
+        GET /api/v1/athlete/{id}/wellness?oldest=YYYY-MM-DD&newest=YYYY-MM-DD
+        GET /api/v1/activity/{id}/streams
+
+    It serves synthetic records (benchmarks/synthetic.py), filtered by date the
+    way the real API does, after a configurable per-request latency. A fraction
+    of requests can be answered with 429, and another with 503, to exercise
+    the client's backoff, and with api_keys set, requests with any other key
+    get 401.
+    Requests are handled on threads, so concurrent clients see concurrent latency.
+
+Usage:
+    python benchmarks/mock_api.py [--port 8765] [--races 100] [--latency 0.05] [--throttle 0.1] [--errors 0.05]
+
+    Then point the agent at it:
+    INTERVALS_BASE_URL=http://127.0.0.1:8765/api/v1 INTERVALS_API_KEY=x INTERVALS_ATHLETE_ID=i1 python main.py
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import synthetic
+
+# --- Configuration ---
+API_PREFIX = '/api/v1/athlete/'
+ACTIVITY_PREFIX = '/api/v1/activity/'
+STREAM_SECONDS = 3600  # Length of every served activity stream
+DEFAULT_PORT = 8765
+DEFAULT_LATENCY = 0.05  # Seconds added to every response
+DEFAULT_THROTTLE = 0.0  # Fraction of requests answered with 429
+DEFAULT_ERRORS = 0.0  # Fraction of requests answered with 503
+WELLNESS_PADDING_DAYS = 120  # Wellness served beyond the activity range
+
+
+class MockIntervalsServer:
+    """Threaded HTTP server with the activities and wellness endpoints. Use as a context manager."""
+
+    def __init__(self, activities, wellness, latency=DEFAULT_LATENCY, throttle=DEFAULT_THROTTLE,
+                 host='127.0.0.1', port=0, seed=0, api_keys=None, errors=DEFAULT_ERRORS):
+        self.activities = activities
+        self.wellness = wellness
+        self.api_keys = set(api_keys) if api_keys is not None else None
+        self.latency = latency
+        self.throttle = throttle
+        self.errors = errors
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _fault(self):
+        """429, 503 or None for the next request, drawn from the throttle and errors fractions."""
+        with self.lock:
+            self.requests += 1
+            draw = self.rng.random()
+            if draw < self.throttle:
+                self.throttled += 1
+                return 429
+            if draw < self.throttle + self.errors:
+                self.failed += 1
+                return 503
+            return None
+
+    def _authorized(self, request):
+        """True if no keys are configured or the basic-auth password is one of them."""
+        if self.api_keys is None:
+            return True
+        header = request.headers.get('Authorization', '')
+        try:
+            password = base64.b64decode(header.split(' ', 1)[1]).decode().split(':', 1)[1]
+        except (IndexError, ValueError):
+            return False
+        return password in self.api_keys
+
+    def handle(self, request):
+        """Answers one GET: 401 for unknown keys, 429 or 503 (sometimes), 404 for unknown paths, else the filtered JSON list."""
+        if self.latency:
+            time.sleep(self.latency)
+        if not self._authorized(request):
+            request.send_response(401)
+            request.end_headers()
+            return
+        fault = self._fault()
+        if fault == 429:
+            request.send_response(429)
+            request.send_header('Retry-After', '0')
+            request.end_headers()
+            return
+        if fault == 503:
+            request.send_response(503)
+            request.end_headers()
+            return
+
+        url = urlparse(request.path)
+        query = parse_qs(url.query)
+        oldest = query.get('oldest', ['0000-00-00'])[0]
+        newest = query.get('newest', ['9999-99-99'])[0]
+        endpoint = url.path[len(API_PREFIX):].split('/', 1)[-1] if url.path.startswith(API_PREFIX) else None
+        if endpoint == 'activities':
+            rows = [a for a in self.activities if oldest <= a['start_date_local'][:10] <= newest]
+            if 'fields' in query:
+                fields = query['fields'][0].split(',')
+                rows = [{f: a[f] for f in fields if f in a} for a in rows]
+        elif endpoint == 'wellness':
+            rows = [w for w in self.wellness if oldest <= w['id'] <= newest]
+        elif url.path.startswith(ACTIVITY_PREFIX) and url.path.endswith('/streams'):
+            rows = synthetic.streams(url.path[len(ACTIVITY_PREFIX):].split('/', 1)[0], STREAM_SECONDS)
+        else:
+            request.send_response(404)
+            request.end_headers()
+            return
+
+        body = json.dumps(rows).encode()
+        request.send_response(200)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def synthetic_server(race_count, latency=DEFAULT_LATENCY, throttle=DEFAULT_THROTTLE, port=0, seed=0, api_keys=None,
+                     errors=DEFAULT_ERRORS):
+    """A server over synthetic history with race_count races and wellness covering all of it."""
+    activities = synthetic.activities(race_count, seed=seed)
+    wellness = synthetic.wellness(len(activities) + WELLNESS_PADDING_DAYS, seed=seed)
+    return MockIntervalsServer(activities, wellness, latency=latency, throttle=throttle, port=port, seed=seed,
+                               api_keys=api_keys, errors=errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve synthetic Intervals.icu activities and wellness locally.")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--races', type=int, default=100, help="Races in the synthetic history.")
+    parser.add_argument('--latency', type=float, default=DEFAULT_LATENCY, help="Seconds of latency per request.")
+    parser.add_argument('--throttle', type=float, default=DEFAULT_THROTTLE, help="Fraction of requests answered with 429.")
+    parser.add_argument('--errors', type=float, default=DEFAULT_ERRORS, help="Fraction of requests answered with 503.")
+    args = parser.parse_args()
+
+    server = synthetic_server(args.races, args.latency, args.throttle, port=args.port, errors=args.errors)
+    print(f"Serving {len(server.activities)} activities and {len(server.wellness)} wellness days at {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
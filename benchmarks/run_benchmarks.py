@@ -0,0 +1,456 @@
+"""
+Benchmark Suite
+
+Description:
+    Times every stage of the workflow on synthetic data, so a change can be
+    measured before it is merged and regressions show up between commits:
+
+    - parse_tcx                 streaming TCX parsing (files/s, MB/s, trackpoints/s)
+    - parse_fit                 bulk FIT decoding of the same rides, with the full
+                                metrics and streams (files/s, MB/s, trackpoints/s)
+    - sync[races=N]             main.sync_store against the mock API (benchmarks/mock_api.py)
+                                with per-request latency, into a fresh local store
+    - process_races[races=N]    race table + pre-race features + Performance Score,
+                                for each race count (shows how it scales)
+    - merge                     scripts/merge_xert_data.py on the largest race table
+    - best_efforts[build]       intervals_agent.efforts index over a year of rides in the
+                                trackpoint store, from scratch (rides/s)
+    - best_efforts[query]       pre-race best efforts for every race of the largest table
+    - correlate                 intervals_agent.correlation.correlate on the merged table
+    - render_plots              plot_race_data.py, every figure redrawn
+    - render_dashboard          generate_dashboard.py and calculate_xert_correlations.py
+    - cold_start[...]           a fresh `python -m intervals_agent ...` process, from start
+                                to exit: the CLI's own --help and status, and the --help
+                                of commands whose script imports pandas or the API client
+
+    Everything runs in a temporary workspace; the repository's own tables,
+    cache and figures are not touched. Each benchmark is repeated and the best
+    time is reported (the median is kept too).
+
+    Results are saved as 'benchmarks/results/<commit>.json' (suffixed '-dirty'
+    for uncommitted changes) and compared with the previous result file, or
+    with the one given by --compare. Runs with --only add to the file of the
+    same commit if the parameters match.
+
+Usage:
+    python benchmarks/run_benchmarks.py                       # Full suite
+    python benchmarks/run_benchmarks.py --quick               # Small sizes, for a fast check
+    python benchmarks/run_benchmarks.py --only parse_tcx merge
+    python benchmarks/run_benchmarks.py --race-counts 10,100,1000 --latency 0.05
+    python benchmarks/run_benchmarks.py --compare a2f75a2     # Compare with that commit's results
+
+Output:
+    A table of timings (and change vs. the baseline) and 'benchmarks/results/<commit>.json'.
+"""
+
+import os
+import io
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+from contextlib import contextmanager, redirect_stdout
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+sys.path.insert(0, BENCH_DIR)
+
+import pandas as pd
+
+import synthetic
+from mock_api import synthetic_server
+
+# --- Configuration ---
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+BENCHMARKS = ['parse_tcx', 'parse_fit', 'sync', 'process_races', 'merge', 'best_efforts', 'correlate', 'render_plots',
+              'render_dashboard', 'cold_start']
+DEFAULTS = {'tcx_files': 20, 'tcx_seconds': 3600, 'race_counts': '10,100,1000', 'latency': 0.02, 'repeat': 3}
+QUICK = {'tcx_files': 4, 'tcx_seconds': 900, 'race_counts': '10,100', 'latency': 0.005, 'repeat': 1}
+CHANGE_THRESHOLD = 0.10  # Relative change flagged as faster/slower in the comparison
+EFFORT_RIDES = 365  # Rides in the best_efforts benchmark's trackpoint store
+
+
+def git_commit():
+    """Short hash of HEAD, with '-dirty' if tracked files have uncommitted changes ('unknown' outside git)."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f"{commit}-dirty" if dirty else commit
+
+
+@contextmanager
+def workspace_cwd(path, argv=()):
+    """Runs a script's main() as if started from `path` with `argv`, with its output swallowed."""
+    old_cwd, old_argv = os.getcwd(), sys.argv
+    os.chdir(path)
+    sys.argv = ['benchmark', *argv]
+    try:
+        with redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        os.chdir(old_cwd)
+        sys.argv = old_argv
+
+
+def measure(func, repeat, setup=None):
+    """Runs setup() then func() `repeat` times. Returns (timing dict, last return value)."""
+    times, value = [], None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        value = func()
+        times.append(time.perf_counter() - start)
+    return {'seconds': round(min(times), 6), 'median': round(statistics.median(times), 6)}, value
+
+
+def bench_parse_tcx(work, args, results):
+    from analyze_xert_tcx import parse_tcx
+
+    paths = synthetic.generate_tcx_dir(os.path.join(work, 'Xert'), args.tcx_files, args.tcx_seconds)
+    megabytes = sum(os.path.getsize(p) for p in paths) / 1e6
+    timing, parsed = measure(lambda: [parse_tcx(p) for p in paths], args.repeat)
+    if any(row is None for row in parsed):
+        raise RuntimeError("parse_tcx rejected a synthetic file")
+    seconds = timing['seconds']
+    results['parse_tcx'] = dict(timing, files=len(paths), megabytes=round(megabytes, 2),
+                                files_per_s=round(len(paths) / seconds, 1),
+                                mb_per_s=round(megabytes / seconds, 2),
+                                trackpoints_per_s=round(len(paths) * args.tcx_seconds / seconds))
+
+
+def bench_parse_fit(work, args, results):
+    from analyze_xert_tcx import read_fit
+
+    paths = synthetic.generate_tcx_dir(os.path.join(work, 'Xert'), args.tcx_files, args.tcx_seconds, 'fit')
+    megabytes = sum(os.path.getsize(p) for p in paths) / 1e6
+    timing, _ = measure(lambda: [read_fit(p, collect_streams=True) for p in paths], args.repeat)
+    seconds = timing['seconds']
+    results['parse_fit'] = dict(timing, files=len(paths), megabytes=round(megabytes, 2),
+                                files_per_s=round(len(paths) / seconds, 1),
+                                mb_per_s=round(megabytes / seconds, 2),
+                                trackpoints_per_s=round(len(paths) * args.tcx_seconds / seconds))
+
+
+def bench_sync(work, args, results):
+    import main as agent
+    from intervals_agent.client import IntervalsClient, TokenBucket
+    from intervals_agent.store import LocalStore
+
+    for races in args.race_counts:
+        db_path = os.path.join(work, f'sync_{races}.sqlite')
+
+        def reset():
+            if os.path.exists(db_path):
+                os.remove(db_path)
+
+        def sync():
+            # No client-side rate limit: the latency of the server is what is measured
+            with LocalStore(db_path) as store, \
+                    IntervalsClient('i0', 'benchmark', base_url=server.base_url,
+                                    rate_limiter=TokenBucket(rate=1e6)) as client, \
+                    redirect_stdout(io.StringIO()):
+                agent.sync_store(store, client, full_sync=True)
+            return server.requests
+
+        with synthetic_server(races, latency=args.latency) as server:
+            timing, _ = measure(sync, args.repeat, setup=reset)
+            requests_made = server.requests // args.repeat
+        results[f'sync[races={races}]'] = dict(timing, requests=requests_made, latency=args.latency)
+
+
+def history(races):
+    """Synthetic (activities, wellness_by_date) with `races` races."""
+    activities = synthetic.activities(races)
+    return activities, {w['id']: w for w in synthetic.wellness(len(activities) + 120)}
+
+
+def race_table(activities, wellness_by_date):
+    """Runs process_races + calculate_performance_score, as main.py does."""
+    import main as agent
+
+    with redirect_stdout(io.StringIO()):
+        return agent.calculate_performance_score(agent.process_races(activities, wellness_by_date))
+
+
+def bench_process_races(work, args, results):
+    race_table(*history(2))  # Warm-up: imports and first-call overhead are not part of the scaling
+    for races in args.race_counts:
+        activities, wellness_by_date = history(races)
+        timing, df = measure(lambda: race_table(activities, wellness_by_date), args.repeat)
+        results[f'process_races[races={races}]'] = dict(timing, races=len(df),
+                                                       races_per_s=round(len(df) / timing['seconds']))
+
+
+def prepare_tables(work, args):
+    """Writes race_analysis and xert_metrics for the largest race count into the workspace (once)."""
+    from intervals_agent.tables import write_table, table_exists
+
+    if table_exists(os.path.join(work, 'race_analysis.parquet')):
+        return
+    races = max(args.race_counts)
+    df = race_table(*history(races))
+    write_table(df, os.path.join(work, 'race_analysis.parquet'), csv=False)
+    # Xert rides on every third day of the history, so about a third of the races match
+    all_dates = sorted({a['start_date_local'][:10] for a in synthetic.activities(races)})
+    xert = pd.DataFrame(synthetic.xert_metrics(all_dates[::3]))
+    write_table(xert, os.path.join(work, 'xert_metrics.parquet'), csv=False)
+
+
+def prepare_merged(work, args):
+    from intervals_agent.tables import table_exists
+
+    if not table_exists(os.path.join(work, 'race_analysis_with_xert.parquet')):
+        bench_merge(work, args, {})
+
+
+def bench_merge(work, args, results):
+    import merge_xert_data
+
+    prepare_tables(work, args)
+
+    def merge():
+        with workspace_cwd(work):
+            merge_xert_data.main()
+
+    timing, _ = measure(merge, args.repeat)
+    results['merge'] = dict(timing, races=max(args.race_counts))
+
+
+def bench_best_efforts(work, args, results):
+    import numpy as np
+    from intervals_agent.trackpoints import TrackpointStore
+    from intervals_agent.efforts import BestEffortsIndex, EFFORT_WINDOWS_DAYS
+    from intervals_agent.tables import read_table
+
+    prepare_tables(work, args)
+    races = read_table(os.path.join(work, 'race_analysis.parquet'))
+    # A year's worth of rides spread over the race history, so every query window holds some
+    all_dates = sorted({a['start_date_local'][:10] for a in synthetic.activities(max(args.race_counts))})
+    dates = all_dates[::max(1, len(all_dates) // EFFORT_RIDES)][:EFFORT_RIDES]
+    store = TrackpointStore(os.path.join(work, 'effort_trackpoints'))
+    if not len(store):
+        rng = np.random.default_rng(0)
+        start = pd.Timestamp(dates[0]).timestamp()
+        store.append((f'ride_{i:04d}', date, {
+            'time': start + i * 86400 + np.arange(args.tcx_seconds, dtype=np.float64),
+            'power': np.maximum(rng.normal(220, 60, args.tcx_seconds), 0),
+            'hr': rng.normal(140, 8, args.tcx_seconds),
+        }) for i, date in enumerate(dates))
+    index_path = os.path.join(work, 'best_efforts.npz')
+
+    def reset():
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+    timing, _ = measure(lambda: BestEffortsIndex(index_path).update(store), args.repeat, setup=reset)
+    results['best_efforts[build]'] = dict(timing, rides=len(dates), rides_per_s=round(len(dates) / timing['seconds'], 1))
+
+    index = BestEffortsIndex(index_path)
+    index.update(store)
+    timing, _ = measure(lambda: index.pre_race(races['Date']), args.repeat)
+    results['best_efforts[query]'] = dict(timing, races=len(races), windows=len(EFFORT_WINDOWS_DAYS))
+
+
+def bench_correlate(work, args, results):
+    from intervals_agent.correlation import correlate
+    from intervals_agent.tables import read_table
+
+    prepare_merged(work, args)
+    df = read_table(os.path.join(work, 'race_analysis_with_xert.parquet'))
+    df = df.dropna(subset=['Performance Score', 'Xert_Max_Power'])
+    features = [c for c in df.columns if c.startswith('Xert_') and c != 'Xert_Filename']
+    timing, _ = measure(lambda: correlate(df, 'Performance Score', features), args.repeat)
+    results['correlate'] = dict(timing, rows=len(df), features=len(features))
+
+
+def clear_figures(work):
+    shutil.rmtree(os.path.join(work, 'figures'), ignore_errors=True)
+
+
+def bench_render_plots(work, args, results):
+    import plot_race_data
+
+    prepare_tables(work, args)
+
+    def plots():
+        with workspace_cwd(work):
+            plot_race_data.main()
+        return len(glob.glob(os.path.join(work, 'figures', '*.png')))
+
+    timing, figures = measure(plots, args.repeat, setup=lambda: clear_figures(work))
+    results['render_plots'] = dict(timing, figures=figures)
+
+
+def bench_render_dashboard(work, args, results):
+    import generate_dashboard
+    import calculate_xert_correlations
+
+    prepare_merged(work, args)
+
+    def dashboard():
+        with workspace_cwd(work):
+            os.makedirs('figures', exist_ok=True)
+            generate_dashboard.main()
+            calculate_xert_correlations.main()
+        return len(glob.glob(os.path.join(work, 'figures', '*.*g')))
+
+    timing, figures = measure(dashboard, args.repeat, setup=lambda: clear_figures(work))
+    results['render_dashboard'] = dict(timing, figures=figures)
+
+
+COLD_START_COMMANDS = [['--help'], ['status'], ['merge', '--help'], ['fetch', '--help']]
+
+
+def bench_cold_start(work, args, results):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    for command in COLD_START_COMMANDS:
+        argv = [sys.executable, '-m', 'intervals_agent'] + command
+
+        def run():
+            subprocess.run(argv, cwd=work, env=env, check=True, capture_output=True)
+
+        run()  # Warm the OS file cache and the bytecode cache, as on any machine after the first run
+        timing, _ = measure(run, max(args.repeat, 3))
+        results[f"cold_start[{' '.join(command)}]"] = timing
+
+
+RUNNERS = {
+    'parse_tcx': bench_parse_tcx,
+    'parse_fit': bench_parse_fit,
+    'sync': bench_sync,
+    'process_races': bench_process_races,
+    'merge': bench_merge,
+    'best_efforts': bench_best_efforts,
+    'correlate': bench_correlate,
+    'render_plots': bench_render_plots,
+    'render_dashboard': bench_render_dashboard,
+    'cold_start': bench_cold_start,
+}
+
+
+def result_files():
+    """Saved result files, oldest first."""
+    files = glob.glob(os.path.join(RESULTS_DIR, '*.json'))
+    return sorted(files, key=os.path.getmtime)
+
+
+def load_baseline(ref, current_path):
+    """The result to compare against: a path, a commit prefix, or (ref=None) the latest other file."""
+    if ref and os.path.exists(ref):
+        path = ref
+    else:
+        candidates = [f for f in result_files() if os.path.abspath(f) != os.path.abspath(current_path)]
+        if ref:
+            candidates = [f for f in candidates if os.path.basename(f).startswith(ref)]
+        if not candidates:
+            return None
+        path = candidates[-1]
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def format_results(report, baseline=None):
+    """Plain-text table of the timings, with the relative change against baseline if given."""
+    base = baseline['benchmarks'] if baseline else {}
+    header = f"{'Benchmark':<30}{'best (s)':>11}{'median (s)':>12}"
+    if baseline:
+        header += f"{baseline['commit']:>16}{'change':>10}"
+    lines = [header]
+    for name, entry in report['benchmarks'].items():
+        line = f"{name:<30}{entry['seconds']:>11.3f}{entry['median']:>12.3f}"
+        if name in base:
+            before = base[name]['seconds']
+            change = (entry['seconds'] - before) / before if before else 0.0
+            flag = ' slower' if change > CHANGE_THRESHOLD else ' faster' if change < -CHANGE_THRESHOLD else ''
+            line += f"{before:>16.3f}{change:>+10.1%}{flag}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the workflow on synthetic data and compare across commits.")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help="Only run these benchmarks.")
+    parser.add_argument('--quick', action='store_true', help="Small sizes and a single repeat.")
+    parser.add_argument('--tcx-files', type=int, help=f"Synthetic TCX files (default: {DEFAULTS['tcx_files']}).")
+    parser.add_argument('--tcx-seconds', type=int, help=f"Duration of each ride in seconds (default: {DEFAULTS['tcx_seconds']}).")
+    parser.add_argument('--race-counts', help=f"Comma-separated race counts (default: {DEFAULTS['race_counts']}).")
+    parser.add_argument('--latency', type=float, help=f"Mock API latency per request in seconds (default: {DEFAULTS['latency']}).")
+    parser.add_argument('--repeat', type=int, help=f"Runs per benchmark, the best is reported (default: {DEFAULTS['repeat']}).")
+    parser.add_argument('--compare', metavar='COMMIT', help="Compare with this commit's results (prefix or path; default: the previous file).")
+    parser.add_argument('--no-save', action='store_true', help="Do not write benchmarks/results/<commit>.json.")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary workspace for inspection.")
+    args = parser.parse_args()
+
+    for key, value in (QUICK if args.quick else DEFAULTS).items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+    args.race_counts = sorted(int(n) for n in str(args.race_counts).split(',') if n.strip())
+    return args
+
+
+def main():
+    args = parse_args()
+    selected = args.only or BENCHMARKS
+    commit = git_commit()
+    work = tempfile.mkdtemp(prefix='intervals-bench-')
+    print(f"Benchmarking {commit} in {work}...")
+
+    results = {}
+    try:
+        for name in selected:
+            print(f"  {name}...")
+            RUNNERS[name](work, args, results)
+    finally:
+        if args.keep:
+            print(f"Workspace kept: {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'params': {k: getattr(args, k) for k in DEFAULTS},
+        'benchmarks': results,
+    }
+    result_path = os.path.join(RESULTS_DIR, f"{commit}.json")
+    baseline = load_baseline(args.compare, result_path)
+    if args.compare and baseline is None:
+        print(f"Warning: no saved results match '{args.compare}'.")
+    if baseline and baseline.get('params') != report['params']:
+        print(f"Warning: {baseline['commit']} was run with different parameters; timings may not be comparable.")
+
+    print()
+    print(format_results(report, baseline))
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        # A partial run (--only) adds to the results already saved for this commit
+        if os.path.exists(result_path):
+            with open(result_path, encoding='utf-8') as f:
+                previous = json.load(f)
+            if previous.get('params') == report['params']:
+                report['benchmarks'] = dict(previous['benchmarks'], **report['benchmarks'])
+        with open(result_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {os.path.relpath(result_path, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
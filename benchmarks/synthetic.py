@@ -0,0 +1,235 @@
+"""
+Synthetic Benchmark Data
+
+Description:
+    Reproducible stand-ins for the private inputs, so benchmarks do not need
+    the 'Xert/' folder or a live Intervals.icu account:
+
+    - TCX or FIT files of configurable count and duration (1 Hz power, HR,
+      cadence, speed and distance, with occasional dropouts like real
+      recordings); the same seed gives the same ride in both formats
+    - Intervals.icu activity, stream and wellness JSON records (as the API returns them)
+    - Xert metric rows shaped like the output of analyze_xert_tcx.py
+
+    Everything is seeded, so the same arguments always produce the same data.
+
+Usage:
+    python benchmarks/synthetic.py OUTPUT_DIR [--count 20] [--seconds 3600] [--format fit]
+"""
+
+import os
+import math
+import struct
+import random
+import argparse
+from datetime import date, datetime, timedelta
+
+# --- Configuration ---
+START_DATE = date(2023, 1, 1)
+HR_DROPOUT = 0.05
+POWER_DROPOUT = 0.02
+TCX_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2" '
+    'xmlns:ns3="http://www.garmin.com/xmlschemas/ActivityExtension/v2">\n'
+    '<Activities><Activity Sport="Biking"><Id>{start}Z</Id><Lap StartTime="{start}Z">'
+    '<TotalTimeSeconds>{seconds}</TotalTimeSeconds><Track>\n'
+)
+TCX_FOOTER = '</Track></Lap></Activity></Activities></TrainingCenterDatabase>\n'
+FIT_EPOCH = datetime(1989, 12, 31)
+FIT_CRC_TABLE = (0x0000, 0xCC01, 0xD801, 0x1400, 0xF001, 0x3C00, 0x2800, 0xE401,
+                 0xA001, 0x6C00, 0x7800, 0xB401, 0x5000, 0x9C01, 0x8801, 0x4400)
+
+
+def ride_samples(seconds, seed):
+    """1 Hz samples (power or None, HR or None, cadence, distance) of one ride, shared by the TCX and FIT writers."""
+    rng = random.Random(seed)
+    base_power = rng.randint(150, 260)
+    samples, distance = [], 0.0
+    for i in range(seconds):
+        # Slow variation plus noise, roughly like a steady ride with surges
+        power = max(0, int(base_power + 80 * math.sin(i / 300) + rng.gauss(0, 40)))
+        distance += 9.0
+        hr = None if rng.random() < HR_DROPOUT else 120 + power // 8
+        watts = None if rng.random() < POWER_DROPOUT else power
+        samples.append((watts, hr, rng.randint(60, 100), distance))
+    return samples
+
+
+def ride_start(seed, start=None):
+    return start or datetime.combine(START_DATE + timedelta(days=seed), datetime.min.time()) + timedelta(hours=8)
+
+
+def write_tcx(path, seconds, seed, start=None):
+    """Writes one ride of `seconds` 1 Hz trackpoints. Returns the file size in bytes."""
+    start = ride_start(seed, start)
+    parts = [TCX_HEADER.format(start=start.isoformat(), seconds=seconds)]
+    for i, (watts, hr, cadence, distance) in enumerate(ride_samples(seconds, seed)):
+        t = start + timedelta(seconds=i)
+        hr = '' if hr is None else f'<HeartRateBpm><Value>{hr}</Value></HeartRateBpm>'
+        watts = '' if watts is None else f'<ns3:Watts>{watts}</ns3:Watts>'
+        parts.append(f'<Trackpoint><Time>{t.isoformat()}Z</Time><DistanceMeters>{distance:.1f}</DistanceMeters>{hr}'
+                     f'<Cadence>{cadence}</Cadence><Extensions><ns3:TPX><ns3:Speed>9.0</ns3:Speed>'
+                     f'{watts}</ns3:TPX></Extensions></Trackpoint>\n')
+    parts.append(TCX_FOOTER)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(''.join(parts))
+    return os.path.getsize(path)
+
+
+def fit_crc(data, crc=0):
+    """The FIT CRC-16 of data."""
+    for byte in data:
+        for nibble in (byte & 0x0F, byte >> 4):
+            tmp = FIT_CRC_TABLE[crc & 0x0F]
+            crc = ((crc >> 4) & 0x0FFF) ^ tmp ^ FIT_CRC_TABLE[nibble]
+    return crc
+
+
+def write_fit(path, seconds, seed, start=None):
+    """Writes the same ride as write_tcx as a FIT activity file (file_id, records, session). Returns the file size."""
+    start = ride_start(seed, start)
+    fit_start = int((start - FIT_EPOCH).total_seconds())
+    body = bytearray()
+    # Definitions: local 0 = file_id (type, time_created), 1 = record, 2 = session (start_time)
+    body += struct.pack('<BBBHB', 0x40, 0, 0, 0, 2) + bytes([0, 1, 0x00, 4, 4, 0x86])
+    body += struct.pack('<BBI', 0, 4, fit_start)
+    body += struct.pack('<BBBHB', 0x41, 0, 0, 20, 6) + bytes([253, 4, 0x86, 5, 4, 0x86, 6, 2, 0x84,
+                                                             7, 2, 0x84, 3, 1, 0x02, 4, 1, 0x02])
+    record = struct.Struct('<BIIHHBB')
+    for i, (watts, hr, cadence, distance) in enumerate(ride_samples(seconds, seed)):
+        body += record.pack(0x01, fit_start + i, round(distance * 100), 9000,
+                            0xFFFF if watts is None else watts, 0xFF if hr is None else hr, cadence)
+    body += struct.pack('<BBBHB', 0x42, 0, 0, 18, 1) + bytes([2, 4, 0x86])
+    body += struct.pack('<BI', 0x02, fit_start)
+    header = struct.pack('<BBHI4s', 14, 0x20, 2132, len(body), b'.FIT')
+    header += struct.pack('<H', fit_crc(header))
+    with open(path, 'wb') as f:
+        f.write(header + body + struct.pack('<H', fit_crc(header + body)))
+    return os.path.getsize(path)
+
+
+def generate_tcx_dir(directory, count, seconds, fmt='tcx'):
+    """Writes `count` rides (one per day) into directory as 'tcx' or 'fit' files. Returns the paths."""
+    os.makedirs(directory, exist_ok=True)
+    write = write_fit if fmt == 'fit' else write_tcx
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'ride_{i:04d}.{fmt}')
+        write(path, seconds, seed=i)
+        paths.append(path)
+    return paths
+
+
+def activities(race_count, rides_per_race=4, seed=0):
+    """Activity records: one race every rides_per_race activities, one activity per day."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(race_count * rides_per_race):
+        day = START_DATE + timedelta(days=i)
+        moving_time = rng.randint(2400, 10800)
+        records.append({
+            'id': f'i{i}',
+            'race': i % rides_per_race == 0,
+            'start_date_local': f'{day.isoformat()}T09:00:00',
+            'start_date': f'{day.isoformat()}T08:00:00Z',
+            'name': f'Race, stage {i} 🚴' if i % rides_per_race == 0 else f'Ride {i}',
+            'type': 'Ride',
+            'average_speed': rng.uniform(8, 12),
+            'icu_joules': moving_time * rng.randint(180, 280),
+            'distance': moving_time * rng.uniform(8, 12),
+            'moving_time': moving_time,
+            'elapsed_time': moving_time + rng.randint(0, 600),
+            'max_heartrate': rng.randint(165, 195),
+            'icu_weighted_avg_watts': rng.randint(200, 300),
+            'icu_variability_index': rng.uniform(1.0, 1.3),
+            'icu_power_hr': rng.uniform(1.2, 1.8),
+            'icu_efficiency_factor': rng.uniform(1.4, 2.0),
+            'icu_ftp': 280,
+        })
+    return records
+
+
+def streams(activity_id, seconds=3600):
+    """Activity streams as the API returns them: [{'type': ..., 'data': [...]}, ...], seeded by the ID."""
+    rng = random.Random(activity_id)
+    base_power = rng.randint(180, 280)
+    watts, heartrate = [], []
+    for i in range(seconds):
+        power = max(0, int(base_power + 80 * math.sin(i / 300) + rng.gauss(0, 40)))
+        watts.append(None if rng.random() < POWER_DROPOUT else power)
+        # Heart rate creeps up over the ride (cardiac drift)
+        heartrate.append(None if rng.random() < HR_DROPOUT else 120 + power // 8 + i // 600)
+    return [
+        {'type': 'time', 'data': list(range(seconds))},
+        {'type': 'watts', 'data': watts},
+        {'type': 'heartrate', 'data': heartrate},
+        {'type': 'cadence', 'data': [rng.randint(60, 100) for _ in range(seconds)]},
+        {'type': 'velocity_smooth', 'data': [9.0] * seconds},
+        {'type': 'distance', 'data': [9.0 * i for i in range(seconds)]},
+    ]
+
+
+def wellness(days, seed=0, start=None):
+    """Daily wellness records keyed like the API's 'id' ('YYYY-MM-DD'), with some gaps."""
+    rng = random.Random(seed)
+    start = start or START_DATE - timedelta(days=90)
+    records = []
+    for i in range(days):
+        if rng.random() < 0.05:
+            continue
+        records.append({
+            'id': (start + timedelta(days=i)).isoformat(),
+            'restingHR': rng.randint(42, 55),
+            'hrv': rng.randint(35, 80),
+            'sleepSecs': rng.randint(20000, 32000),
+            'weight': round(rng.uniform(68, 72), 1) if rng.random() < 0.3 else None,
+            'ctl': rng.uniform(60, 110),
+            'atl': rng.uniform(50, 130),
+            'rampRate': rng.uniform(-5, 8),
+        })
+    return records
+
+
+def xert_metrics(dates, seed=0):
+    """Rows shaped like xert_metrics: one or two rides per date, the first at the time of that day's activity."""
+    rng = random.Random(seed)
+    rows = []
+    for d in dates:
+        for n in range(rng.choice((1, 1, 2))):
+            avg_power = rng.uniform(150, 280)
+            duration = rng.uniform(40, 240)
+            start = datetime.fromisoformat(f'{d}T08:00:00') + timedelta(minutes=rng.uniform(-2, 2) + 300 * n)
+            rows.append({
+                'Date': d,
+                'Xert_Start': start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'Xert_End': (start + timedelta(minutes=duration)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'Xert_Max_Power': rng.uniform(700, 1200),
+                'Xert_Avg_Power': avg_power,
+                'Xert_Max_HR': float(rng.randint(165, 195)),
+                'Xert_Avg_HR': rng.uniform(130, 165),
+                'Xert_Duration_Min': duration,
+                'Xert_NP': avg_power * rng.uniform(1.02, 1.2),
+                'Xert_VI': rng.uniform(1.02, 1.2),
+                'Xert_Decoupling_Pct': rng.uniform(-2, 10),
+                'Xert_MMP_1min': rng.uniform(350, 600),
+                'Xert_MMP_5min': rng.uniform(280, 400),
+                'Xert_MMP_20min': rng.uniform(230, 320),
+                'Xert_Filename': f'{d}_{n}.tcx',
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic TCX or FIT files.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--count', type=int, default=20, help="Number of rides.")
+    parser.add_argument('--seconds', type=int, default=3600, help="Duration of each ride in seconds.")
+    parser.add_argument('--format', choices=['tcx', 'fit'], default='tcx', help="File format (default: %(default)s).")
+    args = parser.parse_args()
+    paths = generate_tcx_dir(args.output_dir, args.count, args.seconds, args.format)
+    print(f"Wrote {len(paths)} {args.format.upper()} files to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
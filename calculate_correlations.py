@@ -1,9 +1,12 @@
+import sys
 import pandas as pd
+from intervals_agent.correlation import correlate, format_table
+from intervals_agent.tables import read_table
 
-output_file = "C:/intervals-agent/race_analysis.csv"
+output_file = "race_analysis.parquet"
 
 try:
-    df = pd.read_csv(output_file)
+    df = read_table(output_file)
 
     # Define activities to exclude by Activity ID (e.g., due to puncture)
     excluded_activity_ids = ['i83150165'] # Only exclude the puncture race
@@ -12,7 +15,7 @@ try:
     df_filtered = df[~df['Activity ID'].isin(excluded_activity_ids)].copy()
 
     if not df_filtered.empty:
-        # Ensure Performance Score is calculated consistently (it should be in race_analysis.csv now)
+        # Ensure Performance Score is calculated consistently (it should be in race_analysis.parquet now)
         # If not, this section would recalculate it, but it should be loaded directly.
         # For safety, let's ensure the column exists and is numeric.
         if 'Performance Score' not in df_filtered.columns:
@@ -31,20 +34,21 @@ try:
             'Power/Weight (W/kg)'
         ]
 
+        # Pearson and Spearman with bootstrap CIs and permutation p-values (BH-adjusted across metrics)
+        metrics_for_correlation = [m for m in metrics_for_correlation if m in df_filtered.columns]
+        result = correlate(df_filtered, 'Performance Score', metrics_for_correlation)
+
         print("\n--- Pearson Correlation Coefficients with Performance Score ---")
-        for metric in metrics_for_correlation:
-            # Drop rows with NaN in either metric or Performance Score for correlation calculation
-            temp_df = df_filtered[[metric, 'Performance Score']].dropna()
-            if not temp_df.empty and len(temp_df) > 1: # Need at least 2 points for correlation
-                correlation = temp_df[metric].corr(temp_df['Performance Score'])
-                print(f"{metric:<40}: {correlation:.4f}")
-            else:
-                print(f"{metric:<40}: Not enough data for correlation (or all NaN)")
+        print(format_table(result, 'pearson'))
+        print("\n--- Spearman Rank Correlations with Performance Score ---")
+        print(format_table(result, 'spearman'))
 
     else:
         print("No races found for correlation analysis after exclusion.")
 
 except FileNotFoundError:
     print(f"Error: The file {output_file} was not found. Please ensure it has been generated.")
+    sys.exit(1)
 except Exception as e:
-    print(f"An unexpected error occurred: {e}")
\ No newline at end of file
+    print(f"An unexpected error occurred: {e}")
+    sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,7 @@
+"""
+Intervals Agent shared library.
+
+Reusable building blocks for the race analysis scripts (local data store,
+API access, parsers and analysis helpers). The top-level scripts and the
+files in 'scripts/' are thin drivers around these modules.
+"""
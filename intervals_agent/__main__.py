@@ -0,0 +1,5 @@
+import sys
+
+from intervals_agent.cli import main
+
+sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Command-Line Interface
+
+Description:
+    One entry point for the whole workflow, `python -m intervals_agent <command>`,
+    instead of remembering which script in which folder does what.
+
+    Each command runs an existing script's main() with the remaining
+    arguments, so every script's own options and --help work unchanged. The
+    CLI itself imports nothing but the standard library: a script (and with
+    it pandas, matplotlib or the API client) is only imported once its command
+    is chosen, so `--help`, `status` and mistyped commands answer at
+    interpreter speed. Configuration (.env, environment variables) is read
+    by the script that needs it, when it runs.
+
+    The repository is not an installable package (no setup.py or
+    pyproject.toml), so there is no `intervals-agent` console command: run
+    `python -m intervals_agent` from the repository root.
+
+Usage:
+    python -m intervals_agent --help
+    python -m intervals_agent fetch --streams           # main.py
+    python -m intervals_agent ingest-xert --rebuild     # scripts/analyze_xert_tcx.py
+    python -m intervals_agent merge                     # scripts/merge_xert_data.py
+    python -m intervals_agent correlate                 # scripts/calculate_xert_correlations.py
+    python -m intervals_agent plot                      # plot_race_data.py
+    python -m intervals_agent dashboard                 # scripts/generate_dashboard.py
+    python -m intervals_agent watch                     # Keep the outputs current as races and exports land
+    python -m intervals_agent status                    # Which pipeline stages are out of date
+    python -m intervals_agent <command> --help          # That script's options
+"""
+
+import os
+import sys
+import argparse
+import importlib
+
+# --- Configuration ---
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROG = 'python -m intervals_agent'
+# Command -> (module, fixed arguments, description); modules live in the repository root or scripts/
+COMMANDS = {
+    'fetch': ('main', [], "Sync races and wellness from Intervals.icu and write race_analysis.parquet."),
+    'ingest-xert': ('analyze_xert_tcx', [], "Parse the Xert/ TCX and FIT exports into xert_metrics.parquet."),
+    'merge': ('merge_xert_data', [], "Match Xert rides to races into race_analysis_with_xert.parquet."),
+    'correlate': ('calculate_xert_correlations', [], "Correlate Xert metrics with race performance."),
+    'plot': ('plot_race_data', [], "Draw the per-metric scatter plots in figures/."),
+    'dashboard': ('generate_dashboard', [], "Draw the correlation dashboard."),
+    'simulations': ('find_race_simulations', [], "Find training rides that resemble each race."),
+    'pipeline': ('run_pipeline', [], "Run every stage that is out of date."),
+    'batch': ('run_batch', [], "Run the race analysis for every athlete in a roster."),
+    'watch': ('run_pipeline', ['--watch'], "Refresh now, then whenever a new race or Xert export lands."),
+    'status': ('run_pipeline', ['--dry-run'], "Show which pipeline stages are out of date, without running them."),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog=PROG, description="Intervals.icu race analysis.")
+    commands = parser.add_subparsers(dest='command', metavar='command', required=True)
+    for name, (_, _, description) in COMMANDS.items():
+        # No options of its own: everything after the command, --help included, goes to the script
+        commands.add_parser(name, help=description, description=description, add_help=False)
+    return parser
+
+
+def run_command(name, args):
+    """Imports the command's script and runs its main() as if it had been called with args."""
+    module_name, fixed, _ = COMMANDS[name]
+    for path in (os.path.join(ROOT, 'scripts'), ROOT):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    sys.argv = [f'{PROG} {name}'] + fixed + list(args)
+    return importlib.import_module(module_name).main()
+
+
+def main(argv=None):
+    args, rest = build_parser().parse_known_args(argv)
+    return run_command(args.command, rest)
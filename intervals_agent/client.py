@@ -0,0 +1,223 @@
+"""
+Intervals.icu HTTP Client
+
+Description:
+    A shared client for the Intervals.icu REST API. It provides:
+    - A pooled requests.Session (keep-alive across calls and threads)
+    - A token-bucket rate limiter shared by every request made through it
+    - Retries with exponential backoff on 429 and 5xx responses (honouring Retry-After)
+    - A bounded thread pool for running independent requests concurrently
+    - Streaming decode of large JSON lists (iter_json), so a long activity
+      history is handled one element at a time instead of as one big body
+
+    Failed requests raise instead of returning empty data, so a throttled call can
+    no longer silently turn into missing wellness values.
+
+Configuration (optional environment variables):
+    - INTERVALS_BASE_URL        (default: https://intervals.icu/api/v1, point at a stub server for testing)
+    - INTERVALS_MAX_CONCURRENCY (default: 4)
+    - INTERVALS_RATE_LIMIT      (requests per second, default: 10)
+"""
+
+import os
+import json
+import time
+import codecs
+import random
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from intervals_agent import instrument
+from intervals_agent.scheduler import bounded_map
+
+# --- Configuration ---
+BASE_URL = os.getenv("INTERVALS_BASE_URL", "https://intervals.icu/api/v1")
+MAX_CONCURRENCY = int(os.getenv("INTERVALS_MAX_CONCURRENCY", "4"))
+RATE_LIMIT = float(os.getenv("INTERVALS_RATE_LIMIT", "10"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30
+REQUEST_TIMEOUT = 60
+STREAM_CHUNK_BYTES = 64 * 1024  # Read size when decoding a streamed JSON list
+NUMBER_CONTINUATION = frozenset('.eE+-0123456789')  # Characters that can extend a decoded JSON number
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Each request takes one token; tokens refill at
+    `rate` per second up to `capacity`, so short bursts are allowed but the
+    long-run request rate never exceeds `rate`.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available, then consumes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class IntervalsClient:
+    """Pooled, rate-limited and retrying client for one athlete's Intervals.icu data."""
+
+    def __init__(self, athlete_id, api_key, base_url=BASE_URL, max_workers=MAX_CONCURRENCY,
+                 rate_limiter=None, max_retries=MAX_RETRIES, backoff=BACKOFF_SECONDS,
+                 timeout=REQUEST_TIMEOUT):
+        self.athlete_id = athlete_id
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or TokenBucket()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.auth = ("API_KEY", api_key)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def athlete_url(self, path):
+        """Builds the URL of an endpoint under /athlete/{id}/."""
+        return f"{self.base_url}/athlete/{self.athlete_id}/{path.lstrip('/')}"
+
+    def activity_url(self, activity_id, path):
+        """Builds the URL of an endpoint under /activity/{id}/ (e.g. streams)."""
+        return f"{self.base_url}/activity/{activity_id}/{path.lstrip('/')}"
+
+    def _retry_delay(self, attempt, response=None):
+        """Seconds to wait before the next attempt: Retry-After if given, else exponential backoff with jitter."""
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                return min(float(response.headers['Retry-After']), MAX_BACKOFF_SECONDS)
+            except ValueError:
+                pass
+        return min(self.backoff * (2 ** attempt), MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.0)
+
+    def get(self, url, params=None, stream=False, **kwargs):
+        """
+        Performs a rate-limited GET, retrying throttled, failed-server and
+        connection errors with backoff. Raises on the final failure.
+        With stream, the body is left unread for the caller to iterate.
+        """
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                instrument.count('api.retries')
+            with instrument.timer('api.rate_limit_wait'):
+                self.rate_limiter.acquire()
+            instrument.count('api.calls')
+            try:
+                with instrument.timer('api.get'):
+                    response = self.session.get(url, params=params, timeout=self.timeout, stream=stream, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                instrument.count('api.connection_errors')
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._retry_delay(attempt))
+                continue
+            if not stream:
+                instrument.count('api.bytes', len(response.content))
+
+            if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                instrument.count(f'api.status_{response.status_code}')
+                response.close()
+                time.sleep(self._retry_delay(attempt, response))
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def get_json(self, path, params=None):
+        """GETs an athlete endpoint and returns the decoded JSON body."""
+        return self.get(self.athlete_url(path), params=params).json()
+
+    def iter_json(self, path, params=None):
+        """GETs an athlete endpoint that returns a JSON list and yields its elements as they arrive."""
+        with self.get(self.athlete_url(path), params=params, stream=True) as response:
+            response.raise_for_status()
+            yield from iter_json_array(_counted(response.iter_content(STREAM_CHUNK_BYTES)))
+
+    def map(self, func, items):
+        """Runs func over items on the client's thread pool, returning results in input order."""
+        items = list(items)
+        if len(items) <= 1 or self.max_workers <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(func, items))
+
+    def map_unordered(self, func, items):
+        """Like map, but yields each result as soon as it is ready (in completion order)."""
+        items = list(items)
+        if len(items) <= 1 or self.max_workers <= 1:
+            yield from map(func, items)
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            yield from bounded_map(executor, func, items, self.max_workers)
+
+
+def _counted(chunks):
+    """Passes byte chunks through, adding their size to the api.bytes counter."""
+    for chunk in chunks:
+        instrument.count('api.bytes', len(chunk))
+        yield chunk
+
+
+def iter_json_array(chunks):
+    """
+    Yields the elements of a top-level JSON array read from byte chunks, each
+    one as soon as it is complete, so only one element (plus one chunk) is
+    held in memory at a time. Raises ValueError on malformed or truncated input.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos, opened = '', 0, False
+    for chunk in chunks:
+        buffer = buffer[pos:] + text.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not opened:
+                if buffer[pos] != '[':
+                    raise ValueError("expected a JSON array")
+                opened, pos = True, pos + 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Element not complete yet
+            if end == len(buffer) or buffer[end] in NUMBER_CONTINUATION:
+                break  # A number at the end of a chunk ('-0', '1e') may continue in the next one
+            yield item
+            pos = end
+    buffer = buffer[pos:] + text.decode(b'', final=True)
+    raise ValueError(f"truncated JSON array ({len(buffer)} characters left undecoded)")
@@ -0,0 +1,201 @@
+"""
+Correlation Engine
+
+Description:
+    Correlates many features with one target (e.g. 'Performance Score') at once
+    and reports how uncertain each correlation is, which matters with ~20 races.
+
+    For every feature it computes:
+    - Pearson r and Spearman rho on pairwise-complete rows
+    - Bootstrap percentile confidence intervals
+    - Two-sided permutation p-values, plus multiple-testing-adjusted p-values
+      (Benjamini-Hochberg by default, or Holm / Bonferroni)
+
+    All features are handled together as matrices. Correlations are built from
+    masked sums, so a bootstrap resample is just a weight vector and thousands
+    of resamples become a few matrix products; permutations are drawn per
+    feature inside its own complete rows and evaluated in batches.
+
+    Spearman CIs resample the ranks of the original sample rather than
+    re-ranking each resample, a standard approximation that keeps them batched.
+"""
+
+import warnings
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+N_BOOTSTRAP = 2000
+N_PERMUTATIONS = 5000
+CONFIDENCE = 0.95
+CORRECTION = 'fdr_bh'
+BATCH_SIZE = 250  # Resamples evaluated per matrix product
+MIN_PAIRS = 3
+
+
+def _correlation_from_sums(n, sx, sy, sxx, syy, sxy):
+    """Pearson r from (weighted) counts and sums; NaN where undefined."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx ** 2 / n
+        var_y = syy - sy ** 2 / n
+        r = cov / np.sqrt(var_x * var_y)
+    r = np.where((n >= MIN_PAIRS) & (var_x > 0) & (var_y > 0), r, np.nan)
+    return np.clip(r, -1.0, 1.0)
+
+
+def _prepare(X, Y):
+    """
+    Masks (n x p) X and Y to pairwise-complete rows, centres each column on its
+    complete rows (for numerical stability) and zeroes the rest.
+    Returns (mask as float, X0, Y0).
+    """
+    mask = np.isfinite(X) & np.isfinite(Y)
+    counts = mask.sum(axis=0)
+    with np.errstate(invalid='ignore'):
+        mean_x = np.where(mask, X, 0).sum(axis=0) / np.maximum(counts, 1)
+        mean_y = np.where(mask, Y, 0).sum(axis=0) / np.maximum(counts, 1)
+    X0 = np.where(mask, X - mean_x, 0.0)
+    Y0 = np.where(mask, Y - mean_y, 0.0)
+    return mask.astype(np.float64), X0, Y0
+
+
+def _pairwise_r(M, X0, Y0, weights=None):
+    """Pearson r per column. weights (B x n) gives one row of results per resample."""
+    if weights is None:
+        weights = np.ones((1, M.shape[0]))
+    return _correlation_from_sums(weights @ M, weights @ X0, weights @ Y0,
+                                  weights @ X0 ** 2, weights @ Y0 ** 2, weights @ (X0 * Y0))
+
+
+def _bootstrap_ci(M, X0, Y0, n_boot, confidence, rng):
+    """Percentile CI per column from n_boot multinomial-weight resamples of the rows."""
+    n = M.shape[0]
+    samples = []
+    for start in range(0, n_boot, BATCH_SIZE):
+        weights = rng.multinomial(n, np.full(n, 1.0 / n), size=min(BATCH_SIZE, n_boot - start)).astype(np.float64)
+        samples.append(_pairwise_r(M, X0, Y0, weights))
+    samples = np.concatenate(samples)
+    alpha = (1 - confidence) / 2
+    with warnings.catch_warnings():
+        # All-NaN columns (too few pairs) simply yield a NaN interval
+        warnings.simplefilter('ignore', RuntimeWarning)
+        low, high = np.nanquantile(samples, [alpha, 1 - alpha], axis=0)
+    return low, high
+
+
+def _permutation_p(M, X0, Y0, r_observed, n_perm, rng):
+    """
+    Two-sided permutation p-value per column. Y is shuffled among each column's
+    own complete rows, so sums, counts and variances stay fixed and only the
+    cross product changes.
+    """
+    n, p = M.shape
+    valid = M.astype(bool)
+    # Complete rows of each column listed first, in row order
+    valid_rows = np.argsort(~valid, axis=0, kind='stable')
+    exceed = np.zeros(p)
+    n_pairs, sx, sy = M.sum(axis=0), X0.sum(axis=0), Y0.sum(axis=0)
+    sxx, syy = (X0 ** 2).sum(axis=0), (Y0 ** 2).sum(axis=0)
+    for start in range(0, n_perm, BATCH_SIZE):
+        size = min(BATCH_SIZE, n_perm - start)
+        # Random keys, +inf outside the complete rows: sorting puts a random order of the complete rows first
+        keys = rng.random((size, n, p))
+        keys[:, ~valid] = np.inf
+        source = np.argsort(keys, axis=1)
+        shuffled = np.empty((size, n, p))
+        np.put_along_axis(shuffled, np.broadcast_to(valid_rows, (size, n, p)),
+                          np.take_along_axis(np.broadcast_to(Y0, (size, n, p)), source, axis=1), axis=1)
+        sxy = np.einsum('bnp,np->bp', shuffled, X0)
+        r_perm = _correlation_from_sums(n_pairs, sx, sy, sxx, syy, sxy)
+        exceed += (np.abs(r_perm) >= np.abs(r_observed) - 1e-12).sum(axis=0)
+    p_values = (exceed + 1) / (n_perm + 1)
+    p_values[~np.isfinite(r_observed)] = np.nan
+    return p_values
+
+
+def adjust_pvalues(p_values, method=CORRECTION):
+    """
+    Multiple-testing correction ('fdr_bh', 'holm' or 'bonferroni'); NaNs are
+    ignored and kept.
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full_like(p_values, np.nan)
+    tested = np.flatnonzero(np.isfinite(p_values))
+    m = len(tested)
+    if not m:
+        return adjusted
+    order = tested[np.argsort(p_values[tested], kind='stable')]
+    ranked = p_values[order]
+    if method == 'bonferroni':
+        values = ranked * m
+    elif method == 'holm':
+        values = np.maximum.accumulate(ranked * (m - np.arange(m)))
+    elif method == 'fdr_bh':
+        values = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+    else:
+        raise ValueError(f"Unknown correction method: {method}")
+    adjusted[order] = np.minimum(values, 1.0)
+    return adjusted
+
+
+def correlate(df, target, features=None, n_boot=N_BOOTSTRAP, n_perm=N_PERMUTATIONS,
+              confidence=CONFIDENCE, correction=CORRECTION, seed=0):
+    """
+    Correlates every feature column with the target column.
+
+    Rows without a target value are dropped; each feature then uses its own
+    pairwise-complete rows. When features is None every other column is used
+    and non-numeric ones are skipped; listed features always get a row.
+    Returns a DataFrame indexed by feature with columns n, pearson_r,
+    pearson_ci_low, pearson_ci_high, pearson_p, pearson_p_adj and the same
+    five for spearman (spearman_rho, ...).
+    """
+    rng = np.random.default_rng(seed)
+    data = df[df[target].notna()]
+    X = data[[c for c in data.columns if c != target] if features is None else list(features)]
+    X = X.apply(pd.to_numeric, errors='coerce')
+    if features is None and len(X):
+        # Auto-selected columns: skip text columns
+        X = X.loc[:, X.notna().any()]
+    y = pd.to_numeric(data[target], errors='coerce').to_numpy(dtype=np.float64)
+
+    result = pd.DataFrame(index=pd.Index(X.columns, name='feature'))
+    if X.empty:
+        return result
+    Xv = X.to_numpy(dtype=np.float64)
+    Yv = np.broadcast_to(y[:, None], Xv.shape)
+    result['n'] = (np.isfinite(Xv) & np.isfinite(Yv)).sum(axis=0)
+
+    # Ranks among each column's complete rows, for Spearman
+    complete = np.isfinite(Xv) & np.isfinite(Yv)
+    X_ranks = pd.DataFrame(np.where(complete, Xv, np.nan)).rank().to_numpy()
+    Y_ranks = pd.DataFrame(np.where(complete, Yv, np.nan)).rank().to_numpy()
+
+    for name, stat, (A, B) in (('pearson', 'r', (Xv, Yv)), ('spearman', 'rho', (X_ranks, Y_ranks))):
+        M, A0, B0 = _prepare(A, B)
+        r = _pairwise_r(M, A0, B0)[0]
+        low, high = _bootstrap_ci(M, A0, B0, n_boot, confidence, rng)
+        # Resamples repeating rows can reach MIN_PAIRS where the sample itself has too few
+        low[~np.isfinite(r)], high[~np.isfinite(r)] = np.nan, np.nan
+        p_values = _permutation_p(M, A0, B0, r, n_perm, rng)
+        result[f'{name}_{stat}'] = r
+        result[f'{name}_ci_low'] = low
+        result[f'{name}_ci_high'] = high
+        result[f'{name}_p'] = p_values
+        result[f'{name}_p_adj'] = adjust_pvalues(p_values, correction)
+    return result
+
+
+def format_table(result, method='pearson'):
+    """Plain-text summary: one line per feature with r, CI and p-values."""
+    stat = 'rho' if method == 'spearman' else 'r'
+    lines = [f"{'Metric':<40}{'n':>4}{stat:>8}   {'95% CI':<17}{'p':>8}{'p_adj':>8}"]
+    for feature, row in result.iterrows():
+        if not np.isfinite(row[f'{method}_{stat}']):
+            lines.append(f"{feature:<40}{int(row['n']):>4}   Not enough data for correlation")
+            continue
+        ci = f"[{row[f'{method}_ci_low']:+.2f}, {row[f'{method}_ci_high']:+.2f}]"
+        lines.append(f"{feature:<40}{int(row['n']):>4}{row[f'{method}_{stat}']:>8.4f}   {ci:<17}"
+                     f"{row[f'{method}_p']:>8.4f}{row[f'{method}_p_adj']:>8.4f}")
+    return '\n'.join(lines)
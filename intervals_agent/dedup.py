@@ -0,0 +1,132 @@
+"""
+Duplicate Ride Detection
+
+Description:
+    The Xert archive holds some rides more than once (the same ride exported
+    again under another file name, or as both TCX and FIT). Left in, they
+    would be summed into a race's duration and matched as training rides
+    twice. This module finds them from a small per-ride fingerprint, kept in
+    the manifest, so a dedup pass over thousands of files never re-reads them.
+
+    ride_fingerprint holds:
+    - start    First timestamp (epoch seconds)
+    - samples  Number of samples
+    - digest   Hash of the power and HR at DIGEST_SAMPLES evenly spaced samples
+    - profile  Mean power per PROFILE_SECONDS block of clock time, as
+               [first block number, watts...], so two recordings of the same
+               ride line up block by block even if one starts later
+
+    find_duplicates sorts the rides by start and compares each one with the
+    rides that started at most NEAR_START_SECONDS earlier:
+    - exact: same start, sample count and digest (the same samples, whatever
+      the file name or format)
+    - near: start and sample count close, and the power profiles agree over
+      their common blocks (a trimmed or re-recorded copy)
+    The ride with the most samples is kept and every ride that is an exact or
+    near copy of it is dropped. Matching is not transitive: if A is near B
+    and B near C but A is not near C, keeping A drops B and keeps C.
+"""
+
+import hashlib
+import numpy as np
+
+# --- Configuration ---
+DIGEST_SAMPLES = 64          # Samples hashed into the digest
+PROFILE_SECONDS = 120        # Block length of the power profile
+PROFILE_BLOCKS = 180         # Blocks kept (6 h)
+NEAR_START_SECONDS = 120     # Near duplicates start at most this far apart
+NEAR_SAMPLE_FRACTION = 0.1   # ... have sample counts within this fraction of each other
+NEAR_POWER_WATTS = 5         # ... and a median block power difference of at most this
+NEAR_MIN_BLOCKS = 2          # ... over at least this many common blocks (all of them if fewer)
+
+
+def ride_fingerprint(streams):
+    """Fingerprint of a ride's streams (time, power, hr); None if it has no timestamps."""
+    times = np.asarray(streams['time'], dtype=np.float64)
+    timed = np.isfinite(times)
+    if not timed.any():
+        return None
+    power = np.asarray(streams['power'], dtype=np.float64)
+    hr = np.asarray(streams['hr'], dtype=np.float64)
+
+    picks = np.unique(np.linspace(0, len(power) - 1, DIGEST_SAMPLES).astype(np.int64))
+    sampled = np.nan_to_num(np.stack([power[picks], hr[picks]]), nan=-1.0)
+    digest = hashlib.blake2b(np.rint(sampled).astype('<i4').tobytes(), digest_size=8).hexdigest()
+
+    block = np.floor(times[timed] / PROFILE_SECONDS).astype(np.int64)
+    first = int(block.min())  # not block[0]: timestamps may be out of order
+    block -= first
+    valid = (block < PROFILE_BLOCKS) & np.isfinite(power[timed])
+    block, watts = block[valid], power[timed][valid]
+    size = int(block.max()) + 1 if len(block) else 0
+    counts = np.bincount(block, minlength=size)
+    means = np.bincount(block, watts, minlength=size) / np.maximum(counts, 1)
+    profile = np.where(counts > 0, np.rint(means), -1).astype(np.int64)
+
+    return {'start': int(round(times[timed][0])), 'samples': int(len(power)), 'digest': digest,
+            'profile': [first] + profile.tolist()}
+
+
+def exact_key(fingerprint):
+    return fingerprint['start'], fingerprint['samples'], fingerprint['digest']
+
+
+def profiles_agree(a, b):
+    """True if two profiles' mean powers match over the blocks both have data for."""
+    offset = b[0] - a[0]
+    pa, pb = np.asarray(a[1:]), np.asarray(b[1:])
+    lo, hi = max(0, offset), min(len(pa), len(pb) + offset)
+    if hi <= lo:
+        return False
+    pa, pb = pa[lo:hi], pb[lo - offset:hi - offset]
+    common = (pa >= 0) & (pb >= 0)
+    if common.sum() < min(NEAR_MIN_BLOCKS, len(common)) or not common.any():
+        return False
+    return np.median(np.abs(pa[common] - pb[common])) <= NEAR_POWER_WATTS
+
+
+def is_near(a, b):
+    """True if fingerprints a and b look like two recordings of the same ride."""
+    return (abs(a['start'] - b['start']) <= NEAR_START_SECONDS
+            and abs(a['samples'] - b['samples']) <= NEAR_SAMPLE_FRACTION * max(a['samples'], b['samples'])
+            and profiles_agree(a['profile'], b['profile']))
+
+
+def find_duplicates(fingerprints, stored=()):
+    """
+    {dropped path: (kept path, 'exact' or 'near')} for {path: fingerprint}.
+    Rides are taken in order of preference, most samples first, ties going
+    to paths in stored (e.g. rides whose streams are already in the
+    trackpoint store), then to the first path. A ride is dropped if it
+    duplicates a ride already kept, else kept.
+    """
+    stored = set(stored)
+    paths = sorted(fingerprints, key=lambda path: fingerprints[path]['start'])
+    matches = {path: [] for path in paths}
+    lo = 0
+    for i, path in enumerate(paths):
+        fingerprint = fingerprints[path]
+        while fingerprints[paths[lo]]['start'] < fingerprint['start'] - NEAR_START_SECONDS:
+            lo += 1
+        for other in paths[lo:i]:
+            if exact_key(fingerprints[other]) == exact_key(fingerprint):
+                kind = 'exact'
+            elif is_near(fingerprints[other], fingerprint):
+                kind = 'near'
+            else:
+                continue
+            matches[path].append((other, kind))
+            matches[other].append((path, kind))
+
+    def preference(path):
+        return -fingerprints[path]['samples'], path not in stored, path
+
+    kept, duplicates = set(), {}
+    for path in sorted(paths, key=preference):
+        candidates = [(preference(other), other, kind) for other, kind in matches[path] if other in kept]
+        if candidates:
+            _, other, kind = min(candidates)
+            duplicates[path] = (other, kind)
+        else:
+            kept.add(path)
+    return duplicates
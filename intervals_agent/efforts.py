@@ -0,0 +1,144 @@
+"""
+Best-Efforts Index
+
+Description:
+    Answers "what was my best 5-minute power (or HR) in the N days before this
+    date?" for any number of dates at once, without touching the ride files.
+
+    - Every ride in the trackpoint store gets its mean-maximal power and HR at
+      the standard durations (see intervals_agent/physiology.py). The values
+      are cached in 'best_efforts.npz' so only new or re-ingested rides are
+      computed on later runs, like the simulation index.
+    - The rides are folded into one row of daily maxima per calendar day, and
+      a sparse table of maxima over every power-of-two run of days is built on
+      top of it. The best value over any range of days is then the larger of
+      two overlapping table rows, so a query costs the same for a week as for
+      a season, and all dates are answered in a few array operations.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from intervals_agent.physiology import resample_1hz, mean_max_power, mean_max_hr, MMP_DURATIONS
+
+# --- Configuration ---
+DEFAULT_INDEX_PATH = 'best_efforts.npz'
+EFFORT_COLUMNS = [f'MMP_{label}' for label in MMP_DURATIONS] + [f'HR_{label}' for label in MMP_DURATIONS]
+EFFORT_WINDOWS_DAYS = (28, 60)  # Pre-race windows added to the race table
+
+
+def ride_efforts(streams):
+    """Mean-maximal power and HR of one ride, in EFFORT_COLUMNS order (NaN where the ride is too short)."""
+    power, hr = resample_1hz(streams['time'], streams['power'], streams['hr'])
+    curve = [*mean_max_power(power).values(), *mean_max_hr(hr).values()]
+    return np.array([np.nan if value is None else value for value in curve], dtype=np.float64)
+
+
+def day_numbers(dates):
+    """'YYYY-MM-DD' strings -> days since the epoch as floats (NaN where missing or unparseable)."""
+    days = pd.to_datetime(pd.Series(dates, dtype='object'), errors='coerce', format='%Y-%m-%d')
+    return ((days - pd.Timestamp(0)) / pd.Timedelta(days=1)).to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class BestEffortsIndex:
+    """Cached per-ride best efforts with a range-maximum table over days."""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.keys = np.empty(0, dtype=str)
+        self.dates = np.empty(0, dtype=str)
+        self.signatures = np.empty(0, dtype=str)
+        self.values = np.empty((0, len(EFFORT_COLUMNS)))
+        if os.path.exists(path):
+            with np.load(path) as data:
+                if list(data['columns']) == EFFORT_COLUMNS:
+                    for name in ('keys', 'dates', 'signatures', 'values'):
+                        setattr(self, name, data[name])
+        self._build()
+
+    def save(self):
+        with open(self.path, 'wb') as f:
+            np.savez(f, keys=self.keys, dates=self.dates, signatures=self.signatures, values=self.values,
+                     columns=np.array(EFFORT_COLUMNS))
+
+    def update(self, store, signatures=None):
+        """
+        Brings the index in line with the trackpoint store: rides that were
+        removed are dropped and only new or re-ingested rides are computed.
+        signatures maps ride keys to a content signature such as the manifest
+        sha256, which survives compact(); rides without one fall back to their
+        position in the store, and are recomputed whenever it moves.
+        Returns the number of rides computed.
+        """
+        signatures = signatures or {}
+
+        def signature(entry):
+            return signatures.get(entry['key']) or f"{entry['segment']}:{entry['offset']}"
+
+        current = {entry['key']: entry for entry in store.entries()}
+        keep = np.array([k in current and signature(current[k]) == s for k, s in zip(self.keys, self.signatures)],
+                        dtype=bool)
+        keys, dates, kept = list(self.keys[keep]), list(self.dates[keep]), list(self.signatures[keep])
+        values = [self.values[keep]]
+
+        todo = set(current) - set(keys)
+        for entry, streams in store.load(['time', 'power', 'hr'], keys=todo):
+            keys.append(entry['key'])
+            dates.append(entry['date'])
+            kept.append(signature(entry))
+            values.append(ride_efforts(streams)[None, :])
+
+        self.keys, self.dates, self.signatures = np.array(keys, dtype=str), np.array(dates, dtype=str), np.array(kept, dtype=str)
+        self.values = np.concatenate(values)
+        self._build()
+        return len(todo)
+
+    def _build(self):
+        """Daily maxima and their sparse table: level k holds the maximum of days [i, i + 2**k)."""
+        days = day_numbers(self.dates)
+        valid = np.isfinite(days)
+        self.first_day = int(days[valid].min()) if valid.any() else 0
+        n_days = int(days[valid].max()) - self.first_day + 1 if valid.any() else 0
+        daily = np.full((n_days, len(EFFORT_COLUMNS)), -np.inf)
+        np.maximum.at(daily, days[valid].astype(np.int64) - self.first_day,
+                      np.nan_to_num(self.values[valid], nan=-np.inf))
+        self.levels = [daily]
+        width = 1
+        while 2 * width <= n_days:
+            previous = self.levels[-1]
+            self.levels.append(np.maximum(previous[:-width], previous[width:]))
+            width *= 2
+
+    def best_between(self, first_days, last_days):
+        """
+        Best value of every effort column over the rides dated first..last
+        (inclusive, days since the epoch) for each pair; an (n, columns) array,
+        NaN where no ride in the range has a value.
+        """
+        first = np.asarray(first_days, dtype=np.float64) - self.first_day
+        last = np.asarray(last_days, dtype=np.float64) - self.first_day
+        best = np.full((len(first), len(EFFORT_COLUMNS)), -np.inf)
+        n_days = len(self.levels[0])
+        with np.errstate(invalid='ignore'):
+            lo = np.maximum(np.nan_to_num(first, nan=n_days), 0).astype(np.int64)
+            hi = np.minimum(np.nan_to_num(last, nan=-1), n_days - 1).astype(np.int64)
+        queried = hi >= lo
+        # The largest power-of-two run that fits the range; two of them (from each end) cover it
+        level = np.where(queried, np.frexp(np.maximum(hi - lo + 1, 1))[1] - 1, -1)
+        for k in np.unique(level[queried]):
+            rows = level == k
+            table = self.levels[k]
+            best[rows] = np.maximum(table[lo[rows]], table[hi[rows] - 2 ** k + 1])
+        best[~np.isfinite(best)] = np.nan
+        return best
+
+    def best_before(self, dates, days):
+        """Best efforts in the `days` days before each date (the date itself excluded), as a DataFrame."""
+        day = day_numbers(dates)
+        best = self.best_between(day - days, day - 1)
+        return pd.DataFrame(best.round(1), columns=[f'Xert_Best_{column}_{days}d' for column in EFFORT_COLUMNS])
+
+    def pre_race(self, dates, windows=EFFORT_WINDOWS_DAYS):
+        """best_before for every window, side by side (e.g. Xert_Best_MMP_5min_60d)."""
+        return pd.concat([self.best_before(dates, days) for days in windows], axis=1)
@@ -0,0 +1,116 @@
+"""
+Pre-Race Feature Engine
+
+Description:
+    Builds one daily wellness frame and derives every pre-race feature for all
+    races in a single vectorized pass, instead of looping over races and windows.
+
+    - N-day rolling means of Resting HR, HRV and Sleep (any set of windows)
+    - Exponentially weighted means (any set of spans)
+    - Deltas of each window against the longest window, and missing-day counts
+    - Weight and PMC values (CTL/ATL/ramp rate) via nearest-date as-of joins
+
+    An "N-day pre-race" window covers the N days before the race plus race day
+    itself, matching the original per-race API queries.
+"""
+
+import pandas as pd
+
+# --- Configuration ---
+DEFAULT_WINDOWS = (7, 14)
+WEIGHT_TOLERANCE_DAYS = 30
+PMC_TOLERANCE_DAYS = 0  # Exact day before the race, as before; raise to accept older values
+WELLNESS_FIELDS = ['restingHR', 'hrv', 'sleepSecs', 'weight', 'ctl', 'atl', 'rampRate']
+# Zero means "not recorded" for these fields
+ZERO_IS_MISSING = ['restingHR', 'hrv', 'sleepSecs', 'weight']
+WINDOW_METRICS = {
+    'restingHR': ('Avg Resting HR ({days}-day pre-race)', 1),
+    'hrv': ('Avg HRV ({days}-day pre-race)', 1),
+    'sleepSecs': ('Avg Sleep (hours, {days}-day pre-race)', 3600),
+}
+SHORT_NAMES = {'restingHR': 'Resting HR', 'hrv': 'HRV', 'sleepSecs': 'Sleep (hours)'}
+PMC_COLUMNS = {
+    'ctl': 'Fitness (CTL, day pre-race)',
+    'atl': 'Fatigue (ATL, day pre-race)',
+    'rampRate': 'Form (Ramp Rate, day pre-race)',
+}
+
+
+def daily_wellness_frame(wellness_by_date):
+    """
+    One row per calendar day (gaps filled with NaN) from a {'YYYY-MM-DD': entry} index.
+    Zero readings of HR/HRV/sleep/weight are treated as missing.
+    """
+    df = pd.DataFrame.from_records(list(wellness_by_date.values()), columns=['id'] + WELLNESS_FIELDS)
+    df.index = pd.to_datetime(df.pop('id'))
+    df = df.apply(pd.to_numeric, errors='coerce').sort_index()
+    df[ZERO_IS_MISSING] = df[ZERO_IS_MISSING].mask(df[ZERO_IS_MISSING] == 0)
+    if df.empty:
+        return df
+    return df.reindex(pd.date_range(df.index.min(), df.index.max(), freq='D'))
+
+
+def _asof(race_dates, series, tolerance_days, direction):
+    """Value of series at the nearest recorded date to each race date, within a tolerance."""
+    values = series.dropna()
+    left = pd.DataFrame({'date': pd.DatetimeIndex(race_dates).astype('datetime64[ns]')}).reset_index()
+    if values.empty:
+        return pd.Series(float('nan'), index=left['index'])
+    right = pd.DataFrame({'date': pd.DatetimeIndex(values.index).astype('datetime64[ns]'), 'value': values.to_numpy()})
+    merged = pd.merge_asof(left.sort_values('date'), right, on='date', direction=direction,
+                           tolerance=pd.Timedelta(days=tolerance_days))
+    return merged.set_index('index')['value'].sort_index()
+
+
+def pre_race_features(race_dates, daily, windows=DEFAULT_WINDOWS, ewm_spans=(), extra=False,
+                      weight_tolerance_days=WEIGHT_TOLERANCE_DAYS, pmc_tolerance_days=PMC_TOLERANCE_DAYS):
+    """
+    Computes pre-race features for every race at once.
+
+    race_dates: sequence of dates (one per race); daily: output of daily_wellness_frame.
+    Returns a DataFrame with one row per race (same order) containing 'Weight (kg)',
+    the rolling-window averages, optional EWMAs (ewm_spans), optional deltas and
+    missing-day counts (extra=True), and the day-before PMC values.
+    """
+    race_index = pd.DatetimeIndex(pd.to_datetime(list(race_dates)))
+    features = pd.DataFrame(index=range(len(race_index)))
+    if not len(race_index):
+        return features
+
+    # Extend the frame so every window around every race is covered
+    if daily.empty:
+        daily = pd.DataFrame(columns=WELLNESS_FIELDS, dtype=float)
+    start = min([race_index.min() - pd.Timedelta(days=max(windows, default=0))] + list(daily.index[:1]))
+    end = max([race_index.max()] + list(daily.index[-1:]))
+    daily = daily.reindex(pd.date_range(start, end, freq='D'))
+
+    features['Weight (kg)'] = _asof(race_index, daily['weight'], weight_tolerance_days, 'nearest').to_numpy()
+
+    longest = max(windows, default=None)
+    for days in windows:
+        rolling = daily[list(WINDOW_METRICS)].rolling(days + 1, min_periods=1)
+        means = rolling.mean().reindex(race_index)
+        counts = rolling.count().reindex(race_index)
+        for field, (name, scale) in WINDOW_METRICS.items():
+            features[name.format(days=days)] = (means[field] / scale).round(2).to_numpy()
+            if extra:
+                features[f'Missing {SHORT_NAMES[field]} Days ({days}-day pre-race)'] = (days + 1 - counts[field]).to_numpy()
+
+    if extra and longest is not None:
+        for days in windows:
+            if days == longest:
+                continue
+            for field, (name, _) in WINDOW_METRICS.items():
+                features[f'{SHORT_NAMES[field]} Delta ({days} vs {longest}-day)'] = (
+                    features[name.format(days=days)] - features[name.format(days=longest)]).round(2)
+
+    for span in ewm_spans:
+        ewm = daily[list(WINDOW_METRICS)].ewm(span=span, ignore_na=True).mean().reindex(race_index)
+        for field, (_, scale) in WINDOW_METRICS.items():
+            features[f'EWMA {SHORT_NAMES[field]} ({span}-day span)'] = (ewm[field] / scale).round(2).to_numpy()
+
+    day_before = race_index - pd.Timedelta(days=1)
+    for field, column in PMC_COLUMNS.items():
+        features[column] = _asof(day_before, daily[field], pmc_tolerance_days, 'backward').to_numpy()
+
+    return features
@@ -0,0 +1,199 @@
+"""
+Run Instrumentation
+
+Description:
+    Opt-in timers and counters for finding out where a run spends its time
+    (HTTP, XML parsing, pandas, matplotlib) and for spotting regressions
+    between runs.
+
+    - timer(name): context manager recording wall and CPU time per named block
+    - timed(name): the same as a function decorator
+    - count(name, n): named counters (API calls, bytes, retries, files, cache hits...)
+    - rate(name, counter, timer): derived per-second rates, e.g. trackpoints/s
+
+    Nothing is recorded unless profiling is enabled, with --profile on the
+    scripts that have it or INTERVALS_PROFILE=1 for any script (run_pipeline.py
+    passes it on to every stage). Disabled calls cost a dictionary lookup.
+
+    At exit an enabled run prints a summary table and writes a JSON trace to
+    'profiles/<script>.json'; one line per run is appended to
+    'profiles/history.jsonl', so runs can be compared over time.
+
+    CPU time is the calling thread's for timers inside worker threads and the
+    whole process's otherwise; work done in child processes (the TCX parsing
+    pool) shows up as wall time only.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+from datetime import datetime
+from functools import wraps
+from contextlib import nullcontext
+
+# --- Configuration ---
+PROFILE_ENV = 'INTERVALS_PROFILE'
+PROFILE_DIR = os.getenv('INTERVALS_PROFILE_DIR', 'profiles')
+HISTORY_FILE = 'history.jsonl'
+
+_lock = threading.Lock()
+_run = None  # Recording state of the current process, None while disabled
+
+
+def enabled():
+    return _run is not None
+
+
+def enable(name, profile_dir=PROFILE_DIR):
+    """Starts recording for this process; the report is written at exit."""
+    global _run
+    if _run is not None:
+        return
+    _run = {
+        'name': name,
+        'argv': sys.argv[1:],
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'start_wall': time.perf_counter(),
+        'start_cpu': time.process_time(),
+        'profile_dir': profile_dir,
+        'timers': {},
+        'counters': {},
+        'rates': {},
+        'events': [],
+    }
+    # Child processes (pipeline stages) inherit the setting
+    os.environ[PROFILE_ENV] = '1'
+    atexit.register(report)
+
+
+def enable_from_env(name, flag=False):
+    """Enables recording if flag is set or INTERVALS_PROFILE is set to a non-zero value."""
+    if flag or os.getenv(PROFILE_ENV, '') not in ('', '0'):
+        enable(name)
+
+
+class _Timer:
+    """Records one timed block into the current run."""
+
+    def __init__(self, name):
+        self.name = name
+        self.in_main_thread = threading.current_thread() is threading.main_thread()
+
+    def _cpu(self):
+        return time.process_time() if self.in_main_thread else time.thread_time()
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = self._cpu()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall
+        cpu = self._cpu() - self.cpu
+        run = _run
+        if run is None:
+            return False
+        with _lock:
+            entry = run['timers'].setdefault(self.name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+            entry['calls'] += 1
+            entry['wall'] += wall
+            entry['cpu'] += cpu
+            run['events'].append({'name': self.name, 'start': round(self.wall - run['start_wall'], 6),
+                                  'wall': round(wall, 6), 'cpu': round(cpu, 6)})
+        return False
+
+
+def timer(name):
+    """Context manager timing a block as `name` (no-op while disabled)."""
+    return _Timer(name) if _run is not None else nullcontext()
+
+
+def timed(name=None):
+    """Decorator timing every call of a function (as `name`, default module.function)."""
+    def decorate(func):
+        label = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _run is None:
+                return func(*args, **kwargs)
+            with _Timer(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    """Adds n to a counter (no-op while disabled)."""
+    run = _run
+    if run is None:
+        return
+    with _lock:
+        run['counters'][name] = run['counters'].get(name, 0) + n
+
+
+def rate(name, counter, timer_name):
+    """Declares a derived rate: counter value per second of the named timer's wall time."""
+    if _run is not None:
+        _run['rates'][name] = (counter, timer_name)
+
+
+def snapshot():
+    """The current run as a JSON-serializable dict (None while disabled)."""
+    run = _run
+    if run is None:
+        return None
+    with _lock:
+        rates = {}
+        for name, (counter, timer_name) in run['rates'].items():
+            seconds = run['timers'].get(timer_name, {}).get('wall', 0.0)
+            if seconds > 0 and counter in run['counters']:
+                rates[name] = round(run['counters'][counter] / seconds, 1)
+        return {
+            'name': run['name'],
+            'argv': run['argv'],
+            'started': run['started'],
+            'wall': round(time.perf_counter() - run['start_wall'], 6),
+            'cpu': round(time.process_time() - run['start_cpu'], 6),
+            'timers': {k: {'calls': v['calls'], 'wall': round(v['wall'], 6), 'cpu': round(v['cpu'], 6)}
+                       for k, v in run['timers'].items()},
+            'counters': dict(run['counters']),
+            'rates': rates,
+            'events': list(run['events']),
+        }
+
+
+def format_summary(trace):
+    """Plain-text summary table of a trace."""
+    lines = [f"\n--- Profile: {trace['name']} ({trace['wall']:.2f} s wall, {trace['cpu']:.2f} s CPU) ---",
+             f"{'Timer':<40}{'calls':>7}{'wall (s)':>11}{'cpu (s)':>10}"]
+    for name, entry in sorted(trace['timers'].items(), key=lambda item: -item[1]['wall']):
+        lines.append(f"{name:<40}{entry['calls']:>7}{entry['wall']:>11.3f}{entry['cpu']:>10.3f}")
+    if trace['counters'] or trace['rates']:
+        lines.append(f"{'Counter':<40}{'value':>17}")
+        for name, value in sorted(trace['counters'].items()):
+            lines.append(f"{name:<40}{value:>17,}")
+        for name, value in sorted(trace['rates'].items()):
+            lines.append(f"{name:<40}{value:>17,.1f}")
+    return '\n'.join(lines)
+
+
+def report():
+    """Prints the summary and writes the JSON trace plus a history line. Runs at exit."""
+    trace = snapshot()
+    if trace is None:
+        return
+    print(format_summary(trace))
+    profile_dir = _run['profile_dir']
+    os.makedirs(profile_dir, exist_ok=True)
+    trace_path = os.path.join(profile_dir, f"{trace['name']}.json")
+    with open(trace_path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f, indent=2)
+    summary = {k: trace[k] for k in ('name', 'argv', 'started', 'wall', 'cpu', 'counters', 'rates')}
+    summary['timers'] = {k: v['wall'] for k, v in trace['timers'].items()}
+    with open(os.path.join(profile_dir, HISTORY_FILE), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(summary) + '\n')
+    print(f"Profile trace saved to {trace_path}")
@@ -0,0 +1,102 @@
+"""
+Ingestion Manifest
+
+Description:
+    Remembers every ingested file's path, size, mtime and SHA-256 together with
+    the metrics parsed from it, so re-runs only parse new or changed files.
+
+    A file whose size and mtime are unchanged is trusted as-is. If either changed,
+    the content hash decides: a file that was only touched (e.g. copied back from
+    a backup) keeps its cached metrics, one whose content changed is re-parsed.
+
+    Files that yielded no metrics keep the reason (e.g. a parse error), so the
+    error log can list every file that is currently failing. Parsed files also
+    keep their ride fingerprint, for finding duplicates (see intervals_agent/dedup.py).
+"""
+
+import os
+import json
+import hashlib
+
+# --- Configuration ---
+DEFAULT_MANIFEST_PATH = 'xert_manifest.json'
+MANIFEST_VERSION = 1
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_sha256(path):
+    """Returns the hex SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """JSON-backed record of ingested files and their parsed metrics."""
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.files = data.get('files', {})
+
+    def plan(self, paths, stat=os.stat, sha256=file_sha256):
+        """
+        Compares the files on disk against the manifest.
+        Returns (to_parse, deleted): paths that need parsing, and manifest
+        entries whose file no longer exists. stat and sha256 can be replaced
+        for paths that are not plain files (see intervals_agent/sources.py).
+        """
+        to_parse = []
+        for path in paths:
+            stat_result = stat(path)
+            entry = self.files.get(path)
+            if entry is None:
+                to_parse.append(path)
+            elif entry['size'] != stat_result.st_size or entry['mtime'] != stat_result.st_mtime:
+                if entry['sha256'] == sha256(path):
+                    entry['size'], entry['mtime'] = stat_result.st_size, stat_result.st_mtime
+                else:
+                    to_parse.append(path)
+
+        present = set(paths)
+        deleted = [path for path in self.files if path not in present]
+        return to_parse, deleted
+
+    def update(self, path, size, mtime, sha256, metrics, error=None, fingerprint=None):
+        """Records a parsed file. metrics may be None for files that yielded no data, with error the reason."""
+        self.files[path] = {'size': size, 'mtime': mtime, 'sha256': sha256, 'metrics': metrics}
+        if error is not None:
+            self.files[path]['error'] = error
+        if fingerprint is not None:
+            self.files[path]['fingerprint'] = fingerprint
+
+    def remove(self, paths):
+        for path in paths:
+            self.files.pop(path, None)
+
+    def metrics(self, exclude=()):
+        """Returns the cached metrics of every file that produced data, except the paths in exclude."""
+        return [entry['metrics'] for path, entry in self.files.items()
+                if entry['metrics'] is not None and path not in exclude]
+
+    def fingerprints(self):
+        """Returns {path: fingerprint} for files that produced data."""
+        return {path: entry['fingerprint'] for path, entry in self.files.items()
+                if entry['metrics'] is not None and entry.get('fingerprint')}
+
+    def errors(self):
+        """Returns {path: reason} for files that yielded no data."""
+        return {path: entry['error'] for path, entry in self.files.items() if entry.get('error')}
+
+    def save(self):
+        """Writes the manifest atomically (temp file + rename)."""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.files}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,136 @@
+"""
+Ride-to-Race Matching
+
+Description:
+    Matches recorded ride files (Xert TCX exports) to Intervals.icu races by
+    time, instead of by calendar date alone, so warm-ups, cool-downs and the
+    other ride of a double-activity day are not mixed into a race's metrics.
+
+    - overlap_pairs finds every (race, file) pair whose [start, end] intervals
+      overlap with a sorted sweep (searchsorted over race starts and a running
+      maximum of race ends). The work is proportional to the number of pairs
+      found, not races x files.
+    - assign_files keeps, for each file, the race it overlaps the longest
+      (at least MIN_OVERLAP_SECONDS).
+    - aggregate_by combines several files per race, weighted by file duration:
+      weighted means for averages, the 4th-power mean for NP/IF, sums for
+      duration/TSS and maxima for peaks.
+
+    Timestamps are ISO-8601 UTC strings ('2024-05-12T09:30:00Z') in the tables
+    and float epoch seconds (NaN when unknown) inside this module.
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+
+# --- Configuration ---
+MIN_OVERLAP_SECONDS = 60  # Shorter overlaps are clock skew or a file ending as the race starts
+UTC_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def utc_iso(value):
+    """Normalizes a timestamp (ISO text, naive = UTC, or datetime) to 'YYYY-MM-DDTHH:MM:SSZ'; None if unparseable."""
+    if value is None:
+        return None
+    try:
+        dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime(UTC_FORMAT)
+
+
+def epoch_window(times):
+    """(first, last) of an array of epoch seconds as ISO UTC strings; (None, None) if none are finite."""
+    times = np.asarray(times, dtype=np.float64)
+    times = times[np.isfinite(times)]
+    if not len(times):
+        return None, None
+    return tuple(utc_iso(datetime.fromtimestamp(t, timezone.utc)) for t in (times.min(), times.max()))
+
+
+def to_epoch(values):
+    """ISO UTC strings -> float epoch seconds (NaN where missing or unparseable)."""
+    parsed = pd.to_datetime(pd.Series(values, dtype='object'), utc=True, errors='coerce', format='ISO8601')
+    seconds = (parsed - pd.Timestamp(0, tz='UTC')).dt.total_seconds()
+    return seconds.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def overlap_pairs(race_start, race_end, file_start, file_end):
+    """
+    All (race index, file index, overlap seconds) with positive overlap, as
+    three arrays. Inputs are epoch-second arrays; rows with NaN times are skipped.
+    """
+    race_start, race_end = np.asarray(race_start, dtype=np.float64), np.asarray(race_end, dtype=np.float64)
+    file_start, file_end = np.asarray(file_start, dtype=np.float64), np.asarray(file_end, dtype=np.float64)
+    races = np.flatnonzero(np.isfinite(race_start) & np.isfinite(race_end))
+    files = np.flatnonzero(np.isfinite(file_start) & np.isfinite(file_end))
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+    if not len(races) or not len(files):
+        return empty
+
+    order = races[np.argsort(race_start[races], kind='stable')]
+    starts = race_start[order]
+    # Races overlapping a file [s, e]: start < e (a prefix of the sorted races) and end > s.
+    # The running max of ends is sorted, so the first race that can still reach s is a searchsorted away.
+    reach = np.maximum.accumulate(race_end[order])
+    hi = np.searchsorted(starts, file_end[files], side='left')
+    lo = np.searchsorted(reach, file_start[files], side='right')
+    counts = np.maximum(hi - lo, 0)
+    if not counts.sum():
+        return empty
+
+    # Expand each file's candidate range [lo, hi) into explicit pairs
+    file_of_pair = np.repeat(files, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    race_of_pair = order[np.repeat(lo, counts) + offsets]
+    overlap = (np.minimum(race_end[race_of_pair], file_end[file_of_pair])
+               - np.maximum(race_start[race_of_pair], file_start[file_of_pair]))
+    keep = overlap > 0
+    return race_of_pair[keep], file_of_pair[keep], overlap[keep]
+
+
+def assign_files(race_start, race_end, file_start, file_end, min_overlap=MIN_OVERLAP_SECONDS):
+    """
+    The race index each file belongs to (-1 for none): the race it overlaps
+    longest, if that overlap is at least min_overlap seconds.
+    """
+    race_idx, file_idx, overlap = overlap_pairs(race_start, race_end, file_start, file_end)
+    assigned = np.full(len(file_start), -1, dtype=np.int64)
+    keep = overlap >= min_overlap
+    race_idx, file_idx, overlap = race_idx[keep], file_idx[keep], overlap[keep]
+    # Longest overlap last per file, so the assignment keeps it (the sort is stable, so a
+    # file lying wholly inside two races goes to the one that started later)
+    order = np.lexsort((overlap, file_idx))
+    assigned[file_idx[order]] = race_idx[order]
+    return assigned
+
+
+def aggregate_by(df, key, aggregation, weight):
+    """
+    Groups df by key and aggregates columns with 'max', 'sum' (NaN if the
+    group has no values), 'mean', 'wmean' (weighted by the weight column) or
+    'wpow4' (weighted 4th-power mean, for Normalized Power and IF). Returns
+    one row per key value.
+    """
+    # A tiny floor keeps zero-length files from dividing by zero (they then weigh equally)
+    weights = (df[weight].fillna(0).clip(lower=0) if weight in df else pd.Series(1.0, index=df.index)) + 1e-9
+    plain = {c: how for c, how in aggregation.items() if how in ('max', 'mean')}
+    out = df.groupby(key).agg(plain) if plain else pd.DataFrame(index=pd.Index(df[key].unique(), name=key))
+    sums = [c for c, how in aggregation.items() if how == 'sum']
+    if sums:
+        # min_count=1: a group with no values stays NaN instead of summing to 0
+        out[sums] = df.groupby(key)[sums].sum(min_count=1)
+    for column, how in aggregation.items():
+        if how not in ('wmean', 'wpow4'):
+            continue
+        values = df[column].astype(float)
+        if how == 'wpow4':
+            values = values ** 4
+        w = weights.where(values.notna(), 0)
+        totals = pd.DataFrame({key: df[key], 'num': (values.fillna(0) * w), 'den': w}).groupby(key).sum()
+        result = totals['num'] / totals['den'].where(totals['den'] > 0)
+        out[column] = result ** 0.25 if how == 'wpow4' else result
+    return out[list(aggregation)].reset_index()
@@ -0,0 +1,175 @@
+"""
+Ride Physiology Metrics
+
+Description:
+    Vectorized per-ride metrics computed from sample streams (see
+    intervals_agent/trackpoints.py). Every function works on whole NumPy
+    arrays; there is no per-sample Python loop.
+
+    - Normalized Power (30 s rolling mean, 4th-power average)
+    - Intensity Factor and Training Stress Score (given an FTP)
+    - Mean-maximal power (and HR) at standard durations, via cumulative sums
+    - Aerobic decoupling: first-half vs second-half Pw:HR (cardiac drift)
+
+    Streams are first put on a 1 Hz grid (sample-and-hold), since Xert/Garmin
+    exports may use smart recording with irregular sample spacing.
+"""
+
+import numpy as np
+
+# --- Configuration ---
+NP_WINDOW_SECONDS = 30
+MAX_HOLD_SECONDS = 5  # Gaps longer than this are treated as stopped (0 W, no HR)
+MIN_DECOUPLING_SECONDS = 20 * 60  # Minimum ride length for a meaningful decoupling value
+MIN_HR_COVERAGE = 0.9  # Share of a window's seconds that need HR for its mean-maximal HR
+MMP_DURATIONS = {
+    '5s': 5,
+    '30s': 30,
+    '1min': 60,
+    '5min': 300,
+    '20min': 1200,
+    '60min': 3600,
+}
+PHYSIOLOGY_COLUMNS = ['Xert_NP', 'Xert_VI', 'Xert_Decoupling_Pct'] + [f'Xert_MMP_{label}' for label in MMP_DURATIONS]
+
+
+def resample_1hz(time, power, hr=None):
+    """
+    Puts power (and optionally HR) on a 1 Hz grid starting at the first timestamp.
+    Each second takes the most recent sample; seconds more than MAX_HOLD_SECONDS
+    after a sample count as stopped (power 0, HR NaN). Missing power reads as 0.
+    Returns (power_1hz, hr_1hz or None); empty arrays if there are no timestamps.
+    """
+    time = np.asarray(time, dtype=np.float64)
+    valid = np.isfinite(time)
+    if not valid.any():
+        return np.empty(0), (np.empty(0) if hr is not None else None)
+
+    order = np.argsort(time[valid], kind='stable')
+    t = time[valid][order]
+    seconds = np.round(t - t[0]).astype(np.int64)
+    grid = np.arange(seconds[-1] + 1)
+    source = np.searchsorted(seconds, grid, side='right') - 1
+    stopped = (grid - seconds[source]) > MAX_HOLD_SECONDS
+
+    p = np.nan_to_num(np.asarray(power, dtype=np.float64)[valid][order], nan=0.0)[source]
+    p[stopped] = 0.0
+    h = None
+    if hr is not None:
+        h = np.asarray(hr, dtype=np.float64)[valid][order][source]
+        h[stopped] = np.nan
+    return p, h
+
+
+def _window_sums(values, window):
+    """Sums of every contiguous `window`-length run of values (cumulative-sum differences)."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    return cumulative[window:] - cumulative[:-window]
+
+
+def normalized_power(power_1hz):
+    """Normalized Power of a 1 Hz power stream, or None if shorter than the rolling window."""
+    if len(power_1hz) < NP_WINDOW_SECONDS:
+        return None
+    rolling = _window_sums(power_1hz, NP_WINDOW_SECONDS) / NP_WINDOW_SECONDS
+    return float(np.mean(rolling ** 4) ** 0.25)
+
+
+def intensity_factor(np_watts, ftp):
+    """IF = NP / FTP. Works element-wise on arrays; NaN where inputs are missing."""
+    return np.asarray(np_watts, dtype=np.float64) / ftp
+
+
+def training_stress_score(duration_seconds, np_watts, ftp):
+    """TSS = seconds x NP x IF / (FTP x 3600) x 100. Works element-wise on arrays."""
+    np_watts = np.asarray(np_watts, dtype=np.float64)
+    return np.asarray(duration_seconds, dtype=np.float64) * np_watts * (np_watts / ftp) / (ftp * 3600) * 100
+
+
+def mean_max_power(power_1hz, durations=MMP_DURATIONS):
+    """Best average power for each duration (seconds); None where the ride is shorter."""
+    cumulative = np.concatenate(([0.0], np.cumsum(power_1hz)))
+    curve = {}
+    for label, seconds in durations.items():
+        if len(power_1hz) < seconds:
+            curve[label] = None
+        else:
+            curve[label] = float(np.max(cumulative[seconds:] - cumulative[:-seconds]) / seconds)
+    return curve
+
+
+def mean_max_hr(hr_1hz, durations=MMP_DURATIONS):
+    """
+    Highest average HR held for each duration (seconds), over windows with HR
+    for at least MIN_HR_COVERAGE of the seconds (dropouts are left out of the
+    average); None where the ride is shorter or no window qualifies.
+    """
+    has_hr = np.isfinite(hr_1hz)
+    cumulative = np.concatenate(([0.0], np.cumsum(np.where(has_hr, hr_1hz, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(has_hr)))
+    curve = {}
+    for label, seconds in durations.items():
+        if len(hr_1hz) < seconds:
+            curve[label] = None
+            continue
+        n = counts[seconds:] - counts[:-seconds]
+        covered = n >= MIN_HR_COVERAGE * seconds
+        sums = (cumulative[seconds:] - cumulative[:-seconds])[covered]
+        curve[label] = float(np.max(sums / n[covered])) if covered.any() else None
+    return curve
+
+
+def aerobic_decoupling(power_1hz, hr_1hz):
+    """
+    Pw:HR decoupling in percent: how much the power-to-HR ratio fell from the
+    first half of the ride to the second. Positive values mean cardiac drift.
+    None if the ride is too short or either half has no HR.
+    """
+    if hr_1hz is None or len(power_1hz) < MIN_DECOUPLING_SECONDS:
+        return None
+    half = len(power_1hz) // 2
+    ratios = []
+    for p, h in ((power_1hz[:half], hr_1hz[:half]), (power_1hz[half:], hr_1hz[half:])):
+        has_hr = np.isfinite(h)
+        if not has_hr.any():
+            return None
+        mean_hr = h[has_hr].mean()
+        if mean_hr <= 0:
+            return None
+        ratios.append(p[has_hr].mean() / mean_hr)
+    if ratios[0] <= 0:
+        return None
+    return float((ratios[0] - ratios[1]) / ratios[0] * 100)
+
+
+def ride_metrics(streams):
+    """
+    FTP-independent physiology metrics for one ride, keyed by PHYSIOLOGY_COLUMNS.
+    IF and TSS depend on the athlete's FTP and are derived later from Xert_NP
+    (see add_load_metrics), so changing FTP never requires re-parsing.
+    """
+    power, hr = resample_1hz(streams['time'], streams['power'], streams.get('hr'))
+    metrics = dict.fromkeys(PHYSIOLOGY_COLUMNS)
+    if not len(power):
+        return metrics
+
+    np_watts = normalized_power(power)
+    avg_power = power.mean()
+    metrics['Xert_NP'] = round(np_watts, 1) if np_watts is not None else None
+    metrics['Xert_VI'] = round(np_watts / avg_power, 3) if np_watts is not None and avg_power > 0 else None
+    decoupling = aerobic_decoupling(power, hr)
+    metrics['Xert_Decoupling_Pct'] = round(decoupling, 2) if decoupling is not None else None
+    for label, value in mean_max_power(power).items():
+        metrics[f'Xert_MMP_{label}'] = round(value, 1) if value is not None else None
+    return metrics
+
+
+def add_load_metrics(df, ftp):
+    """Adds Xert_IF and Xert_TSS columns to a metrics DataFrame (NaN when FTP is not set)."""
+    if ftp:
+        df['Xert_IF'] = intensity_factor(df['Xert_NP'], ftp).round(3)
+        df['Xert_TSS'] = training_stress_score(df['Xert_Duration_Min'] * 60, df['Xert_NP'], ftp).round(1)
+    else:
+        df['Xert_IF'] = np.nan
+        df['Xert_TSS'] = np.nan
+    return df
@@ -0,0 +1,204 @@
+"""
+Cached Pipeline Runner
+
+Description:
+    Runs the project's scripts as a dependency graph and skips every stage whose
+    inputs are unchanged since its last successful run.
+
+    Each stage declares the files/directories it reads, the files it writes, the
+    code it depends on and the environment variables that affect it. Stages are
+    linked automatically: a stage depends on every stage that writes one of its
+    inputs. A stage's fingerprint hashes:
+    - input files by content (directories by a listing of path, size and mtime)
+    - its code files by content, its command line and the listed env values
+
+    A stage re-runs when its fingerprint differs from the stored one or one of
+    its outputs is missing. Because downstream stages fingerprint the *content*
+    of upstream outputs, an upstream re-run that produces identical files does
+    not cascade. Stages of the same wave (no dependency between them) run in
+    parallel as subprocesses.
+"""
+
+import os
+import sys
+import glob
+import json
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from intervals_agent.manifest import file_sha256
+from intervals_agent import instrument
+
+# --- Configuration ---
+DEFAULT_STATE_PATH = 'pipeline_state.json'
+STATE_VERSION = 1
+DEFAULT_JOBS = 4
+
+
+class Stage:
+    """One step of the pipeline: a Python script run as a subprocess."""
+
+    def __init__(self, name, command, inputs=(), outputs=(), code=(), env=(), always=False):
+        self.name = name
+        self.command = list(command)  # Script path and arguments, run with the current interpreter
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)  # Files, directories or glob patterns
+        self.code = list(code)
+        self.env = list(env)
+        self.always = always  # Run even if the fingerprint is unchanged (e.g. API sync)
+
+
+def _path_digest(path):
+    """Content hash of a file, listing hash of a directory, None if missing."""
+    if os.path.isfile(path):
+        return file_sha256(path)
+    if os.path.isdir(path):
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f"{os.path.relpath(os.path.join(root, name), path)}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+    return None
+
+
+def missing_inputs(stage):
+    return [path for path in stage.inputs if not os.path.exists(path)]
+
+
+def outputs_exist(stage):
+    return all(glob.glob(pattern) for pattern in stage.outputs)
+
+
+def fingerprint(stage):
+    """SHA-256 over the stage's inputs, code, command line and environment."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(stage.command).encode())
+    for path in stage.inputs + stage.code:
+        digest.update(f"{path}={_path_digest(path)}\n".encode())
+    for name in stage.env:
+        digest.update(f"${name}={os.getenv(name, '')}\n".encode())
+    return digest.hexdigest()
+
+
+class Pipeline:
+    """A set of stages plus the fingerprints of their last successful runs."""
+
+    def __init__(self, stages, state_path=DEFAULT_STATE_PATH):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.state = {}
+        if os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == STATE_VERSION:
+                self.state = data.get('stages', {})
+        self.writers = {os.path.normpath(out): stage.name for stage in stages for out in stage.outputs}
+        self.upstream = {
+            stage.name: sorted({self.writers[os.path.normpath(p)] for p in stage.inputs
+                                if os.path.normpath(p) in self.writers} - {stage.name})
+            for stage in stages
+        }
+
+    def save(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': STATE_VERSION, 'stages': self.state}, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def waves(self):
+        """Stages grouped into waves; every stage comes after all its upstream stages."""
+        level = {}
+
+        def depth(name, seen=()):
+            if name in seen:
+                raise ValueError(f"Pipeline has a dependency cycle through '{name}'")
+            if name not in level:
+                level[name] = 1 + max((depth(up, seen + (name,)) for up in self.upstream[name]), default=-1)
+            return level[name]
+
+        for name in self.stages:
+            depth(name)
+        return [[name for name in self.stages if level[name] == i] for i in range(max(level.values(), default=-1) + 1)]
+
+    def needs_run(self, name, force=False):
+        """Returns the reason a stage must run, or None if it is up to date."""
+        stage = self.stages[name]
+        if force:
+            return 'forced'
+        if stage.always:
+            return 'always runs'
+        previous = self.state.get(name)
+        if previous is None:
+            return 'never run'
+        if not outputs_exist(stage):
+            return 'outputs missing'
+        if previous['fingerprint'] != fingerprint(stage):
+            return 'inputs or code changed'
+        return None
+
+    def _execute(self, stage):
+        env = dict(os.environ, MPLBACKEND='Agg')  # Headless, parallel-safe plotting
+        with instrument.timer(f'stage.{stage.name}'):
+            result = subprocess.run([sys.executable] + stage.command, capture_output=True, text=True, env=env)
+        return result.returncode, result.stdout + result.stderr
+
+    def run(self, jobs=DEFAULT_JOBS, force=(), dry_run=False, verbose=False):
+        """
+        Runs every stage that is out of date, wave by wave. A stage whose inputs
+        are missing is blocked (its existing outputs are used as they are);
+        stages downstream of a failure are skipped.
+        Returns {stage name: status}.
+        """
+        status = {}
+        for wave in self.waves():
+            todo = []
+            for name in wave:
+                stage = self.stages[name]
+                failed = [up for up in self.upstream[name] if status.get(up) in ('failed', 'skipped')]
+                if failed:
+                    status[name] = 'skipped'
+                    print(f"[{name}] skipped: upstream stage {', '.join(failed)} did not succeed")
+                    continue
+                # In a dry run, inputs a planned upstream stage would write are not missing
+                missing = [path for path in missing_inputs(stage)
+                           if status.get(self.writers.get(os.path.normpath(path))) != 'planned']
+                if missing:
+                    status[name] = 'blocked'
+                    print(f"[{name}] blocked: missing {', '.join(missing)}")
+                    continue
+                with instrument.timer('fingerprint'):
+                    reason = self.needs_run(name, force=name in force)
+                if reason is None and dry_run and any(status.get(up) == 'planned' for up in self.upstream[name]):
+                    # Whether it really runs depends on what the upstream run writes
+                    reason = 'if upstream outputs change'
+                if reason is None:
+                    status[name] = 'cached'
+                    print(f"[{name}] up to date")
+                    continue
+                print(f"[{name}] {'would run' if dry_run else 'running'} ({reason})")
+                todo.append(stage)
+
+            if dry_run:
+                # Assume the stage runs; downstream decisions then depend on its new outputs
+                status.update({stage.name: 'planned' for stage in todo})
+                continue
+            with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+                results = list(executor.map(self._execute, todo))
+            for stage, (returncode, output) in zip(todo, results):
+                if verbose or returncode:
+                    print(f"--- [{stage.name}] output ---\n{output.rstrip()}")
+                if returncode:
+                    status[stage.name] = 'failed'
+                    print(f"[{stage.name}] failed (exit code {returncode})")
+                    continue
+                status[stage.name] = 'ran'
+                # Fingerprint after the run, so stages that update their own inputs (the API sync) settle
+                self.state[stage.name] = {'fingerprint': fingerprint(stage)}
+                self.save()
+                print(f"[{stage.name}] done")
+        for value in status.values():
+            instrument.count(f'stages.{value}')
+        return status
@@ -0,0 +1,136 @@
+"""
+Incremental Figure Renderer
+
+Description:
+    Renders many figures in parallel and skips the ones that would come out the
+    same as last time.
+
+    Each figure is a FigureJob: an output path, a module-level draw function
+    (data, style) -> matplotlib Figure, the data slice it plots and its style.
+    The job's key is a SHA-256 over the data, the style, the savefig options
+    and the draw function's source code; it is stored next to the image
+    ('<image>.sha256'). A figure is only drawn again if the image is missing or
+    its key changed, so re-rendering 'figures/' costs time proportional to the
+    figures whose data or look actually changed.
+
+    Out-of-date figures are drawn in a process pool on the non-interactive Agg
+    backend. Scripts that use it must keep their top level import-safe
+    (work under `if __name__ == "__main__":`), since workers import them.
+"""
+
+import os
+import json
+import hashlib
+import inspect
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from intervals_agent import instrument
+
+# --- Configuration ---
+RENDER_VERSION = 1  # Bump to re-render every figure
+HASH_SUFFIX = '.sha256'
+
+
+class FigureJob:
+    """One image to render: draw(data, style) must return a matplotlib Figure."""
+
+    def __init__(self, path, draw, data, style=None, savefig=None):
+        self.path = path
+        self.draw = draw
+        self.data = data
+        self.style = style or {}
+        self.savefig = savefig or {}
+
+
+def _update(digest, value):
+    """Feeds a DataFrame/Series/array/dict/list/scalar into a hash, deterministically."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        frame = value.to_frame() if isinstance(value, pd.Series) else value
+        digest.update(repr((type(value).__name__, [str(c) for c in frame.columns],
+                            [str(t) for t in frame.dtypes])).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif hasattr(value, 'tobytes'):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(value.tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(repr(key).encode())
+            _update(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"[{len(value)}".encode())
+        for item in value:
+            _update(digest, item)
+    else:
+        digest.update(json.dumps(value, default=repr).encode())
+
+
+def figure_key(job):
+    """Content hash of everything that determines how the figure looks."""
+    digest = hashlib.sha256(f"render-v{RENDER_VERSION}".encode())
+    digest.update(f"{job.draw.__module__}.{job.draw.__qualname__}".encode())
+    digest.update(inspect.getsource(job.draw).encode())
+    for part in (job.data, job.style, job.savefig):
+        _update(digest, part)
+    return digest.hexdigest()
+
+
+def _stored_key(path):
+    try:
+        with open(path + HASH_SUFFIX, encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def is_current(job, key=None):
+    """True if the image exists and was rendered from the same key."""
+    return os.path.exists(job.path) and _stored_key(job.path) == (key or figure_key(job))
+
+
+def _render(job, key):
+    """Draws and saves one figure (runs in a worker process)."""
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+    import matplotlib.pyplot as plt
+
+    fig = job.draw(job.data, job.style)
+    directory = os.path.dirname(job.path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = job.path + '.tmp'
+    options = dict(job.savefig)
+    options.setdefault('format', os.path.splitext(job.path)[1].lstrip('.') or 'png')
+    fig.savefig(tmp_path, **options)
+    plt.close(fig)
+    os.replace(tmp_path, job.path)
+    with open(job.path + HASH_SUFFIX, 'w', encoding='utf-8') as f:
+        f.write(key)
+    return job.path
+
+
+def render(jobs, max_workers=None, force=False):
+    """
+    Renders every job whose image is missing or out of date.
+    Returns (rendered paths, skipped paths).
+    """
+    todo, skipped = [], []
+    with instrument.timer('render.hash'):
+        for job in jobs:
+            key = figure_key(job)
+            if not force and is_current(job, key):
+                skipped.append(job.path)
+            else:
+                todo.append((job, key))
+    instrument.count('figures.skipped', len(skipped))
+    instrument.count('figures.rendered', len(todo))
+
+    with instrument.timer('render.draw'):
+        if len(todo) <= 1 or max_workers == 1:
+            rendered = [_render(job, key) for job, key in todo]
+        else:
+            workers = min(len(todo), max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rendered = list(executor.map(_render, *zip(*todo)))
+    return rendered, skipped
@@ -0,0 +1,95 @@
+"""
+Chunked Work Scheduling
+
+Description:
+    Runs many small jobs (one per file) on a process pool without holding the
+    whole job list's results in memory, and reports progress as it goes.
+
+    - chunk_size picks how many items each task carries: enough to amortize
+      the per-task pickling and IPC cost, small enough that every worker gets
+      several tasks (so one slow chunk does not leave the others idle at the end).
+    - bounded_map submits the chunks lazily, keeping at most max_in_flight of
+      them queued or running, and yields results as soon as a chunk completes
+      (in completion order). Memory is bounded by the chunks in flight, not
+      by the number of items.
+    - Progress prints a live items/s and MB/s readout with an ETA.
+"""
+
+import sys
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+# --- Configuration ---
+MAX_CHUNK = 16            # Items per task at most
+CHUNKS_PER_WORKER = 4     # Aim for at least this many tasks per worker
+IN_FLIGHT_PER_WORKER = 2  # Tasks queued or running per worker
+PROGRESS_SECONDS = 1.0    # Minimum time between progress lines
+
+
+def chunk_size(n_items, workers, max_chunk=MAX_CHUNK):
+    """Items per task for n_items spread over workers."""
+    return max(1, min(max_chunk, n_items // max(1, workers * CHUNKS_PER_WORKER)))
+
+
+def chunked(items, size):
+    """Splits a list into consecutive lists of at most size items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def bounded_map(executor, func, tasks, max_in_flight):
+    """
+    Yields func(task) for every task, in completion order, never having more
+    than max_in_flight tasks submitted but not yet collected. Exceptions
+    raised by func propagate to the caller.
+    """
+    tasks = iter(tasks)
+    pending = set()
+    while True:
+        for task in tasks:
+            pending.add(executor.submit(func, task))
+            if len(pending) >= max_in_flight:
+                break
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+class Progress:
+    """Prints 'done/total, items/s, MB/s, ETA', rewriting one line on a terminal."""
+
+    def __init__(self, total, unit='files', stream=None, interval=PROGRESS_SECONDS):
+        self.total = total
+        self.unit = unit
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.live = self.stream.isatty()
+        self.done = 0
+        self.bytes = 0
+        self.start = self.last = time.perf_counter()
+
+    def update(self, items=1, nbytes=0):
+        self.done += items
+        self.bytes += nbytes
+        now = time.perf_counter()
+        if now - self.last >= self.interval and self.done < self.total:
+            self.last = now
+            self._print(now, final=False)
+
+    def _print(self, now, final):
+        elapsed = max(now - self.start, 1e-9)
+        per_second = self.done / elapsed
+        remaining = (self.total - self.done) / per_second if per_second else 0
+        line = (f"  {self.done}/{self.total} {self.unit} ({self.done / max(self.total, 1):.0%}), "
+                f"{per_second:.1f} {self.unit}/s, {self.bytes / 1e6 / elapsed:.1f} MB/s, "
+                + (f"{elapsed:.1f} s" if final else f"ETA {remaining:.0f} s"))
+        if self.live:
+            self.stream.write('\r' + line.ljust(79) + ('\n' if final else ''))
+        else:
+            self.stream.write(line + '\n')
+        self.stream.flush()
+
+    def finish(self):
+        """Prints the final totals (once, ending the live line)."""
+        self._print(time.perf_counter(), final=True)
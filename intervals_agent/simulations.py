@@ -0,0 +1,197 @@
+"""
+Race Simulation Index (TRACK-003)
+
+Description:
+    Finds training rides whose hardest stretch looks like a race, so the tiny
+    race sample can be grown with "race simulations".
+
+    Every ride in the trackpoint store is cut into sliding windows of a few
+    standard lengths. Each window gets a feature vector describing its power
+    distribution (time in zones relative to a reference power), intensity and
+    variability (mean power, NP, VI), mean-maximal power shape and heart rate.
+    All windows of a ride are computed at once from cumulative sums, and the
+    vectors are cached in 'race_simulations_index.npz' so only new or changed
+    rides are processed on later runs.
+
+    A query z-scores the features and ranks every window of the requested
+    length by Euclidean distance to the race profile in one matrix operation,
+    keeping the best window per ride.
+"""
+
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from intervals_agent.physiology import resample_1hz, NP_WINDOW_SECONDS
+
+# --- Configuration ---
+DEFAULT_INDEX_PATH = 'race_simulations_index.npz'
+WINDOW_MINUTES = (30, 60, 90, 120, 180)
+STRIDE_SECONDS = 300
+ZONE_EDGES = (0.55, 0.75, 0.90, 1.05, 1.20)  # Fractions of the reference power (Coggan-style zones)
+MMP_SHAPE_SECONDS = (5, 60, 300)
+FEATURE_NAMES = (
+    ['mean_power', 'normalized_power', 'variability_index']
+    + [f'zone_{i + 1}_fraction' for i in range(len(ZONE_EDGES) + 1)]
+    + [f'mmp_{d}s_ratio' for d in MMP_SHAPE_SECONDS]
+    + ['mean_hr']
+)
+
+
+def _cumsum0(values, axis=0):
+    """Cumulative sum with a leading zero, so sum(values[a:b]) == c[b] - c[a]."""
+    values = np.asarray(values, dtype=np.float64)
+    pad = [(0, 0)] * values.ndim
+    pad[axis] = (1, 0)
+    return np.pad(np.cumsum(values, axis=axis), pad)
+
+
+def _window_means(power, seconds):
+    """Mean of every contiguous `seconds`-long run of a 1 Hz stream."""
+    cumulative = _cumsum0(power)
+    return (cumulative[seconds:] - cumulative[:-seconds]) / seconds
+
+
+def window_features(power, hr, window_seconds, ref_power, stride_seconds=STRIDE_SECONDS):
+    """
+    Feature vectors for every window of window_seconds (stepping by stride_seconds)
+    of a 1 Hz ride. Returns (starts, features) with one row per window, or empty
+    arrays if the ride is shorter than the window.
+    """
+    n = len(power)
+    if n < window_seconds:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(FEATURE_NAMES)))
+    starts = np.arange(0, n - window_seconds + 1, stride_seconds)
+    ends = starts + window_seconds
+
+    cumulative = _cumsum0(power)
+    mean_power = (cumulative[ends] - cumulative[starts]) / window_seconds
+
+    c4 = _cumsum0(_window_means(power, NP_WINDOW_SECONDS) ** 4)
+    span = window_seconds - NP_WINDOW_SECONDS + 1
+    normalized = ((c4[starts + span] - c4[starts]) / span) ** 0.25
+    variability = np.divide(normalized, mean_power, out=np.full_like(normalized, np.nan), where=mean_power > 0)
+
+    zones = np.digitize(power / ref_power, ZONE_EDGES)
+    one_hot = _cumsum0(zones[:, None] == np.arange(len(ZONE_EDGES) + 1), axis=0)
+    zone_fractions = (one_hot[ends] - one_hot[starts]) / window_seconds
+
+    mmp_ratios = []
+    for seconds in MMP_SHAPE_SECONDS:
+        # Best `seconds`-long effort inside each window
+        best = sliding_window_view(_window_means(power, seconds), window_seconds - seconds + 1)[starts].max(axis=1)
+        mmp_ratios.append(np.divide(best, mean_power, out=np.full_like(best, np.nan), where=mean_power > 0))
+
+    has_hr = np.isfinite(hr)
+    hr_sums, hr_counts = _cumsum0(np.where(has_hr, hr, 0.0)), _cumsum0(has_hr)
+    counts = hr_counts[ends] - hr_counts[starts]
+    mean_hr = np.divide(hr_sums[ends] - hr_sums[starts], counts, out=np.full(len(starts), np.nan), where=counts > 0)
+
+    features = np.column_stack([mean_power, normalized, variability, zone_fractions, *mmp_ratios, mean_hr])
+    return starts, features
+
+
+def ride_windows(streams, ref_power, window_minutes=WINDOW_MINUTES):
+    """All window feature rows of one ride: (lengths, starts, features) across every window length."""
+    power, hr = resample_1hz(streams['time'], streams['power'], streams['hr'])
+    lengths, starts, features = [], [], []
+    for minutes in window_minutes:
+        window_starts, window_features_ = window_features(power, hr, minutes * 60, ref_power)
+        lengths.append(np.full(len(window_starts), minutes))
+        starts.append(window_starts)
+        features.append(window_features_)
+    return np.concatenate(lengths), np.concatenate(starts), np.concatenate(features)
+
+
+class SimulationIndex:
+    """Cached window feature vectors for every ride in the trackpoint store."""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.ref_power = None
+        self.keys = np.empty(0, dtype=str)       # One per ride
+        self.dates = np.empty(0, dtype=str)
+        self.signatures = np.empty(0, dtype=str)
+        self.ride = np.empty(0, dtype=np.int64)  # One per window: position in keys
+        self.length = np.empty(0, dtype=np.int64)
+        self.start = np.empty(0, dtype=np.int64)
+        self.features = np.empty((0, len(FEATURE_NAMES)))
+        if os.path.exists(path):
+            with np.load(path) as data:
+                if list(data['feature_names']) == FEATURE_NAMES:
+                    for name in ('keys', 'dates', 'signatures', 'ride', 'length', 'start', 'features'):
+                        setattr(self, name, data[name])
+                    self.ref_power = float(data['ref_power'])
+
+    def save(self):
+        with open(self.path, 'wb') as f:
+            np.savez(f, keys=self.keys, dates=self.dates, signatures=self.signatures, ride=self.ride,
+                     length=self.length, start=self.start, features=self.features,
+                     ref_power=self.ref_power, feature_names=np.array(FEATURE_NAMES))
+
+    def update(self, store, ref_power, signatures=None):
+        """
+        Brings the index in line with the trackpoint store. Only rides that are new
+        or were re-ingested are processed; a different ref_power rebuilds everything.
+        signatures maps ride keys to a content signature such as the manifest
+        sha256, which survives compact(); rides without one fall back to their
+        position in the store, and are reprocessed whenever it moves.
+        Returns the number of rides processed.
+        """
+        signatures = signatures or {}
+
+        def signature(entry):
+            return signatures.get(entry['key']) or f"{entry['segment']}:{entry['offset']}"
+
+        current = {entry['key']: entry for entry in store.entries()}
+        if self.ref_power != ref_power:
+            keep = np.zeros(len(self.keys), dtype=bool)
+        else:
+            keep = np.array([k in current and signature(current[k]) == s for k, s in zip(self.keys, self.signatures)], dtype=bool)
+
+        # Drop stale rides and renumber the survivors
+        new_position = np.cumsum(keep) - 1
+        window_keep = keep[self.ride] if len(self.ride) else np.empty(0, dtype=bool)
+        keys, dates, kept = list(self.keys[keep]), list(self.dates[keep]), list(self.signatures[keep])
+        ride, length, start, features = [new_position[self.ride[window_keep]]], [self.length[window_keep]], [self.start[window_keep]], [self.features[window_keep]]
+
+        todo = set(current) - set(keys)
+        for entry, streams in store.load(['time', 'power', 'hr'], keys=todo):
+            lengths, starts, rows = ride_windows(streams, ref_power)
+            ride.append(np.full(len(lengths), len(keys)))
+            keys.append(entry['key'])
+            dates.append(entry['date'])
+            kept.append(signature(entry))
+            length.append(lengths)
+            start.append(starts)
+            features.append(rows)
+
+        self.ref_power = ref_power
+        self.keys, self.dates, self.signatures = np.array(keys, dtype=str), np.array(dates, dtype=str), np.array(kept, dtype=str)
+        self.ride = np.concatenate(ride).astype(np.int64)
+        self.length = np.concatenate(length).astype(np.int64)
+        self.start = np.concatenate(start).astype(np.int64)
+        self.features = np.concatenate(features) if features else np.empty((0, len(FEATURE_NAMES)))
+        return len(todo)
+
+    def top_k(self, profile, window_minutes, k=5, exclude_keys=()):
+        """
+        The k rides whose best window of window_minutes is closest to profile.
+        Returns a list of (key, date, start_seconds, distance, features), closest first.
+        """
+        candidates = np.flatnonzero((self.length == window_minutes) & ~np.isin(self.keys[self.ride], list(exclude_keys)))
+        if not len(candidates):
+            return []
+        rows = self.features[candidates]
+        mean, std = np.nanmean(rows, axis=0), np.nanstd(rows, axis=0)
+        std[~(std > 0)] = 1.0
+        z_rows = np.nan_to_num((rows - mean) / std)
+        z_profile = np.nan_to_num((np.asarray(profile) - mean) / std)
+        distances = np.sqrt(((z_rows - z_profile) ** 2).sum(axis=1))
+
+        # Best window per ride, then the k best rides
+        order = np.argsort(distances, kind='stable')
+        _, first = np.unique(self.ride[candidates[order]], return_index=True)
+        best = order[np.sort(first)][:k]
+        return [(self.keys[self.ride[candidates[i]]], self.dates[self.ride[candidates[i]]],
+                 int(self.start[candidates[i]]), float(distances[i]), rows[i]) for i in best]
@@ -0,0 +1,108 @@
+"""
+Ride File Sources
+
+Description:
+    Finds and opens ride files (TCX or FIT) whether they are plain ('ride.tcx'),
+    gzipped ('ride.tcx.gz') or members of a zip archive ('export.zip'), without
+    unpacking anything to disk: compressed files are decompressed as the
+    parser reads them.
+
+    A zip member is addressed as '<archive>.zip/<member name>', so it can be
+    used like any other path as a manifest or trackpoint store key. Its size,
+    mtime and hash are those of the member itself, so adding rides to an
+    archive does not make the rides already in it look changed.
+"""
+
+import os
+import gzip
+import zipfile
+import hashlib
+from datetime import datetime
+from functools import lru_cache
+from collections import namedtuple
+from contextlib import contextmanager, ExitStack
+
+from intervals_agent.manifest import file_sha256, HASH_CHUNK_BYTES
+
+# --- Configuration ---
+RIDE_SUFFIXES = ('.tcx', '.tcx.gz', '.fit', '.fit.gz')
+ARCHIVE_SUFFIX = '.zip'
+
+SourceStat = namedtuple('SourceStat', ['st_size', 'st_mtime'])
+
+
+def split_member(path):
+    """('<archive>.zip', 'member name') for a zip member path, (path, None) otherwise."""
+    index = path.lower().find(ARCHIVE_SUFFIX + '/')
+    if index < 0:
+        index = path.lower().find(ARCHIVE_SUFFIX + os.sep)
+    if index < 0:
+        return path, None
+    return path[:index + len(ARCHIVE_SUFFIX)], path[index + len(ARCHIVE_SUFFIX) + 1:]
+
+
+@lru_cache(maxsize=64)
+def _members(archive, mtime):
+    """{member name: ZipInfo} of the ride files in an archive (cached per archive version)."""
+    with zipfile.ZipFile(archive) as z:
+        return {info.filename: info for info in z.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(RIDE_SUFFIXES)}
+
+
+def members(archive):
+    """{member name: ZipInfo} of the ride files in an archive."""
+    return _members(archive, os.stat(archive).st_mtime)
+
+
+def find_sources(directory):
+    """Every ride file in directory: plain and gzipped files, plus the ride files inside zip archives. Sorted."""
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        lower = name.lower()
+        if lower.endswith(RIDE_SUFFIXES):
+            paths.append(path)
+        elif lower.endswith(ARCHIVE_SUFFIX):
+            try:
+                paths.extend(f'{path}/{member}' for member in sorted(members(path)))
+            except zipfile.BadZipFile:
+                print(f"Warning: skipping '{path}', not a valid zip archive.")
+    return paths
+
+
+@contextmanager
+def open_source(path):
+    """Opens a source for binary reading; gzip and zip members are decompressed on the fly."""
+    archive, member = split_member(path)
+    with ExitStack() as stack:
+        if member is None:
+            f = stack.enter_context(open(path, 'rb'))
+        else:
+            f = stack.enter_context(stack.enter_context(zipfile.ZipFile(archive)).open(member))
+        if path.lower().endswith('.gz'):
+            f = stack.enter_context(gzip.GzipFile(fileobj=f, mode='rb'))
+        yield f
+
+
+def source_stat(path):
+    """(st_size, st_mtime) of a source; for a zip member, its stored size and timestamp."""
+    archive, member = split_member(path)
+    if member is None:
+        return os.stat(path)
+    info = members(archive)[member]
+    return SourceStat(info.file_size, datetime(*info.date_time).timestamp())
+
+
+def source_sha256(path):
+    """Hex SHA-256 of a source's bytes as stored (the member's bytes for zip members)."""
+    archive, member = split_member(path)
+    if member is None:
+        return file_sha256(path)
+    digest = hashlib.sha256()
+    with zipfile.ZipFile(archive) as z, z.open(member) as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
@@ -0,0 +1,103 @@
+"""
+Local Intervals.icu Store
+
+Description:
+    A SQLite copy of the race activities and wellness rows fetched from
+    Intervals.icu, together with the sync watermark used for incremental
+    refreshes, so 'race_analysis.parquet' can be rebuilt offline.
+
+    Only races are stored: an activity a sync finds is no longer a race is
+    deleted. Each race is the JSON of the ACTIVITY_FIELDS the race table
+    reads (the sync asks the API for just those), so a new field needs adding
+    there and a full sync. Wellness rows are stored as the API returns them.
+"""
+
+import json
+import sqlite3
+
+# --- Configuration ---
+DEFAULT_DB_PATH = 'intervals_cache.sqlite'
+# Activity fields requested from the API and stored: everything main.py's race table and stream metrics read
+ACTIVITY_FIELDS = ('id', 'race', 'name', 'type', 'start_date_local', 'start_date', 'elapsed_time', 'moving_time',
+                   'distance', 'average_speed', 'icu_joules', 'max_heartrate', 'icu_variability_index',
+                   'icu_power_hr', 'icu_efficiency_factor', 'icu_weighted_avg_watts', 'icu_ftp')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    id TEXT PRIMARY KEY,
+    start_date_local TEXT,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS wellness (
+    date TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class LocalStore:
+    """Persistent store for races, wellness rows and sync state."""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def upsert_activities(self, activities):
+        """Inserts or replaces activities, keyed by their Intervals.icu ID."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO activities (id, start_date_local, data) VALUES (?, ?, ?)",
+                [(a['id'], a.get('start_date_local'), json.dumps(a)) for a in activities],
+            )
+        return len(activities)
+
+    def delete_activities(self, ids):
+        """Removes activities by ID (e.g. ones no longer marked as races); unknown IDs are ignored."""
+        with self.conn:
+            self.conn.executemany("DELETE FROM activities WHERE id = ?", [(i,) for i in ids])
+        return len(ids)
+
+    def upsert_wellness(self, rows):
+        """Inserts or replaces wellness rows, keyed by their 'YYYY-MM-DD' ID."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO wellness (date, data) VALUES (?, ?)",
+                [(r['id'], json.dumps(r)) for r in rows],
+            )
+        return len(rows)
+
+    def activities(self, since=None):
+        """Returns every stored activity (or those starting on or after the date 'since'), ordered by start date."""
+        if since is None:
+            cursor = self.conn.execute("SELECT data FROM activities ORDER BY start_date_local")
+        else:
+            cursor = self.conn.execute("SELECT data FROM activities WHERE start_date_local >= ? ORDER BY start_date_local",
+                                       (since,))
+        return [json.loads(data) for (data,) in cursor]
+
+    def wellness_by_date(self):
+        """Returns every stored wellness row as a dictionary keyed by 'YYYY-MM-DD'."""
+        cursor = self.conn.execute("SELECT date, data FROM wellness")
+        return {day: json.loads(data) for day, data in cursor}
+
+    def get_state(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
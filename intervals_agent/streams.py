@@ -0,0 +1,234 @@
+"""
+Race Activity Streams
+
+Description:
+    Per-second streams (time, power, HR, cadence, speed, distance) of race
+    activities, downloaded from Intervals.icu, so stream-based metrics do not
+    depend on Xert TCX exports matching up with the races.
+
+    - StreamStore keeps one compressed file per activity ('streams/<id>.npz',
+      one array per column), so an activity is fetched once and re-runs only
+      download streams that are not stored yet.
+    - fetch_missing downloads the missing activities concurrently through the
+      shared client (same rate limit, retries and thread pool as the sync).
+      Activities the API refuses for good (a 4xx other than 401/408/429, e.g.
+      404 for a deleted activity) are listed in 'streams/failed.json' and not
+      requested again unless refetch is set; other failures retry next run.
+    - stream_metrics computes the metrics for every race in one vectorized
+      pass: the streams are concatenated and reduced per race with bincount,
+      with no per-race or per-sample Python loop.
+
+Metrics:
+    Aerobic Decoupling (%)   Pw:HR drift from the first to the second half (as in physiology.py)
+    Time in Z1..Z6 (%)       Share of riding time per power zone, relative to the
+                             activity's FTP (icu_ftp, else the given default)
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from intervals_agent import instrument
+from intervals_agent.trackpoints import COLUMNS
+from intervals_agent.physiology import MAX_HOLD_SECONDS, MIN_DECOUPLING_SECONDS
+
+# --- Configuration ---
+DEFAULT_STREAM_DIR = 'streams'
+FAILED_FILE = 'failed.json'  # Activity ID -> error of downloads that will not succeed on retry
+RETRYABLE_CLIENT_ERRORS = {401, 408, 429}  # 4xx statuses that say nothing about the activity itself
+# Intervals.icu stream type -> column name (as in the trackpoint store)
+STREAM_TYPES = {
+    'time': 'time',
+    'watts': 'power',
+    'heartrate': 'hr',
+    'cadence': 'cadence',
+    'velocity_smooth': 'speed',
+    'distance': 'distance',
+}
+POWER_ZONES = (0.55, 0.75, 0.90, 1.05, 1.20)  # Inclusive upper bounds of Z1-Z5 as a fraction of FTP; Z6 is above
+ZONE_COLUMNS = [f'Time in Z{i + 1} (%)' for i in range(len(POWER_ZONES) + 1)]
+METRIC_COLUMNS = ['Aerobic Decoupling (%)'] + ZONE_COLUMNS
+
+
+class StreamStore:
+    """Compressed per-activity stream files, keyed by activity ID."""
+
+    def __init__(self, root=DEFAULT_STREAM_DIR):
+        self.root = root
+
+    def path(self, activity_id):
+        return os.path.join(self.root, f'{activity_id}.npz')
+
+    def __contains__(self, activity_id):
+        return os.path.exists(self.path(activity_id))
+
+    def keys(self):
+        if not os.path.isdir(self.root):
+            return set()
+        return {name[:-4] for name in os.listdir(self.root) if name.endswith('.npz')}
+
+    def save(self, activity_id, streams):
+        """Writes one activity's columns (an activity without data is stored empty, so it is not re-fetched)."""
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(activity_id)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **{c: np.asarray(streams.get(c, ()), dtype=dtype) for c, dtype in COLUMNS.items()})
+        os.replace(tmp_path, path)
+
+    def load(self, activity_id, columns=None):
+        """Returns {column: array} for one activity."""
+        with np.load(self.path(activity_id)) as data:
+            return {c: data[c] for c in (columns or COLUMNS)}
+
+    def failed(self):
+        """{activity_id: error} of downloads that failed for good (see fetch_missing)."""
+        path = os.path.join(self.root, FAILED_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_failed(self, failed):
+        """Replaces the list of failed downloads (removing the file when it is empty)."""
+        path = os.path.join(self.root, FAILED_FILE)
+        if not failed:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(failed, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+def decode_streams(payload):
+    """Turns the API's [{'type': ..., 'data': [...]}, ...] into float columns; missing values become NaN."""
+    by_type = {s.get('type'): s.get('data') or [] for s in payload}
+    length = len(by_type.get('time', []))
+    streams = {}
+    for stream_type, column in STREAM_TYPES.items():
+        data = by_type.get(stream_type)
+        if data is None or len(data) != length:
+            streams[column] = np.full(length, np.nan)
+        else:
+            streams[column] = np.array([np.nan if v is None else v for v in data], dtype=np.float64)
+    return streams
+
+
+def fetch_streams(client, activity_id):
+    """Downloads and decodes one activity's streams."""
+    response = client.get(client.activity_url(activity_id, 'streams'), params={'types': ','.join(STREAM_TYPES)})
+    return decode_streams(response.json())
+
+
+@instrument.timed('fetch_streams')
+def is_permanent(error):
+    """True if a download error will not go away on retry (a 4xx about the activity itself)."""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    return status is not None and 400 <= status < 500 and status not in RETRYABLE_CLIENT_ERRORS
+
+def fetch_missing(client, store, activity_ids, refetch=False):
+    """
+    Fetches and stores the streams of every activity not in the store yet,
+    concurrently. A download that failed for good is recorded and skipped on
+    later runs (unless refetch is set); other failures are retried next run.
+    Returns (number fetched, list of (activity_id, error)).
+    """
+    known_failed = store.failed()
+    missing = set(activity_ids) - store.keys()
+    skipped = set() if refetch else missing & set(known_failed)
+    if skipped:
+        print(f"Skipping streams of {len(skipped)} race(s) that could not be fetched before (--refetch retries them).")
+    missing = sorted(missing - skipped)
+    instrument.count('streams.skipped', len(skipped))
+    if not missing:
+        return 0, []
+    print(f"Fetching streams for {len(missing)} race(s)...")
+
+    def fetch(activity_id):
+        try:
+            store.save(activity_id, fetch_streams(client, activity_id))
+            return None
+        except Exception as e:
+            return activity_id, f"{type(e).__name__}: {e}", is_permanent(e)
+
+    results = [result for result in client.map(fetch, missing) if result]
+    failed = [(activity_id, error) for activity_id, error, _ in results]
+    instrument.count('streams.fetched', len(missing) - len(failed))
+    instrument.count('streams.failed', len(failed))
+    for activity_id, error in failed:
+        print(f"Warning: could not fetch streams for {activity_id}: {error}")
+
+    still_failed = {a: e for a, e in known_failed.items() if a not in missing}
+    still_failed.update({activity_id: error for activity_id, error, permanent in results if permanent})
+    if still_failed != known_failed:
+        store.save_failed(still_failed)
+    return len(missing) - len(failed), failed
+
+
+@instrument.timed('stream_metrics')
+def stream_metrics(store, activity_ids, ftps=None, default_ftp=None, zones=POWER_ZONES):
+    """
+    METRIC_COLUMNS for every stored activity in activity_ids, computed in one
+    pass over the concatenated streams. ftps maps activity ID -> FTP (falling
+    back to default_ftp); zones are NaN without an FTP. Returns a DataFrame
+    with an 'Activity ID' column, one row per activity that has streams.
+    """
+    ids = [a for a in dict.fromkeys(activity_ids) if a in store]
+    loaded = [store.load(a, ['time', 'power', 'hr']) for a in ids]
+    lengths = np.array([len(s['time']) for s in loaded], dtype=np.int64)
+    result = pd.DataFrame({'Activity ID': ids})
+    for column in METRIC_COLUMNS:
+        result[column] = np.nan
+    if not lengths.sum():
+        return result
+
+    n = len(ids)
+    ride = np.repeat(np.arange(n), lengths)
+    time = np.concatenate([s['time'] for s in loaded]).astype(np.float64)
+    power = np.concatenate([s['power'] for s in loaded]).astype(np.float64)
+    hr = np.concatenate([s['hr'] for s in loaded]).astype(np.float64)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    has_data = lengths > 0
+
+    # Seconds each sample stands for: up to the next sample, capped like the 1 Hz sample-and-hold
+    dt = np.ones(len(time))
+    dt[:-1] = time[1:] - time[:-1]
+    dt[ends[has_data] - 1] = 1.0
+    dt = np.where(np.isfinite(dt), np.clip(dt, 0, MAX_HOLD_SECONDS), 0.0)
+
+    # Time in power zones, relative to each activity's FTP
+    ftps = ftps or {}
+    ride_ftp = np.array([ftps.get(a) or default_ftp or np.nan for a in ids], dtype=np.float64)
+    relative = power / ride_ftp[ride]
+    valid = np.isfinite(relative)
+    zone = np.digitize(np.where(valid, relative, 0), zones, right=True)
+    n_zones = len(zones) + 1
+    in_zone = np.bincount(ride * n_zones + zone, weights=dt * valid, minlength=n * n_zones).reshape(n, n_zones)
+    total = in_zone.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result[ZONE_COLUMNS] = np.where(total > 0, in_zone / total * 100, np.nan).round(1)
+
+    # Aerobic decoupling: dt-weighted Pw:HR of the first vs second half of each ride
+    first = np.where(has_data, time[np.minimum(starts, len(time) - 1)], np.nan)
+    last = np.where(has_data, time[np.maximum(ends - 1, 0)], np.nan)
+    span = last - first
+    second_half = (time - first[ride]) >= span[ride] / 2
+    # Missing power reads as 0 W and only seconds with HR count, as in physiology.aerobic_decoupling
+    with_hr = np.isfinite(hr) & (hr > 0)
+    key = ride * 2 + second_half
+    weights = dt * with_hr
+    power_sum = np.bincount(key, weights=np.nan_to_num(power) * weights, minlength=2 * n).reshape(n, 2)
+    hr_sum = np.bincount(key, weights=np.where(with_hr, hr, 0) * weights, minlength=2 * n).reshape(n, 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = power_sum / hr_sum
+        decoupling = (ratio[:, 0] - ratio[:, 1]) / ratio[:, 0] * 100
+    usable = (span >= MIN_DECOUPLING_SECONDS) & (hr_sum > 0).all(axis=1) & (ratio[:, 0] > 0)
+    result['Aerobic Decoupling (%)'] = np.where(usable, decoupling, np.nan).round(2)
+    instrument.count('streams.samples', int(lengths.sum()))
+    return result
@@ -0,0 +1,130 @@
+"""
+Typed Table Interchange
+
+Description:
+    Reads and writes the tables the scripts hand to each other
+    ('race_analysis', 'xert_metrics', 'race_analysis_with_xert',
+    'race_simulations') as Parquet files with an explicit schema, instead of
+    CSV text that every reader has to re-parse and re-infer.
+
+    Each schema names the text, integer and boolean columns; every other
+    column is float64. Writers conform the frame to the schema before saving
+    (a non-numeric value in a float column is an error, not a silent object
+    column), and Parquet stores the types, so readers get them back as-is.
+    Dates are kept as ISO 'YYYY-MM-DD' strings, the key every script joins on,
+    and start/end times as ISO UTC strings ('YYYY-MM-DDTHH:MM:SSZ').
+
+    CSV stays available:
+    - write_table(..., csv=True) or INTERVALS_EXPORT_CSV=1 also writes a .csv copy
+    - read_table falls back to the .csv next to a missing .parquet (e.g. the
+      sample dataset shipped with the repository), applying the same schema
+    - without pyarrow installed, tables are written and read as CSV
+"""
+
+import os
+import importlib.util
+import pandas as pd
+
+# --- Configuration ---
+EXPORT_CSV = os.getenv('INTERVALS_EXPORT_CSV', '') not in ('', '0')
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+RACE_SCHEMA = {
+    'Activity ID': 'string',
+    'Date': 'string',
+    'Start (UTC)': 'string',
+    'End (UTC)': 'string',
+    'Name': 'string',
+    'Type': 'string',
+    'Incident': 'string',
+}
+XERT_SCHEMA = {
+    'Date': 'string',
+    'Xert_Start': 'string',
+    'Xert_End': 'string',
+    'Xert_Filename': 'string',
+}
+MERGED_SCHEMA = {**RACE_SCHEMA, 'Xert_Match': 'string'}
+SIMULATION_SCHEMA = {
+    'Date': 'string',
+    'Name': 'string',
+    'Race Simulation': 'boolean',
+    'Simulation Of': 'string',
+    'Simulation Rank': 'Int64',
+    'Xert_Filename': 'string',
+}
+SCHEMAS = {
+    'race_analysis': RACE_SCHEMA,
+    'xert_metrics': XERT_SCHEMA,
+    'race_analysis_with_xert': MERGED_SCHEMA,
+    'race_simulations': SIMULATION_SCHEMA,
+}
+
+
+def schema_for(path):
+    """The schema of a table file, looked up by its base name."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name not in SCHEMAS:
+        raise ValueError(f"No schema for table '{name}' (known: {', '.join(SCHEMAS)})")
+    return SCHEMAS[name]
+
+
+def csv_path(path):
+    return os.path.splitext(path)[0] + '.csv'
+
+
+def conform(df, schema):
+    """Casts every column to its schema type; columns not in the schema must be numeric."""
+    df = df.copy()
+    for column in df.columns:
+        dtype = schema.get(column, 'float64')
+        if dtype == 'string':
+            # Missing values stay missing instead of becoming the text 'None'/'nan'
+            df[column] = df[column].astype('string')
+        elif dtype == 'boolean':
+            df[column] = df[column].astype('boolean')
+        else:
+            try:
+                df[column] = pd.to_numeric(df[column]).astype(dtype)
+            except (ValueError, TypeError) as e:
+                raise ValueError(f"Column '{column}' does not match its schema type {dtype}: {e}") from None
+    return df
+
+
+def table_exists(path):
+    return os.path.exists(path) or os.path.exists(csv_path(path))
+
+
+def read_table(path, columns=None):
+    """
+    Loads a table written by write_table. Falls back to the CSV copy if the
+    Parquet file is missing (or pyarrow is not installed).
+    Raises FileNotFoundError if neither exists.
+    """
+    schema = schema_for(path)
+    if PARQUET_AVAILABLE and os.path.exists(path):
+        return pd.read_parquet(path, columns=columns)
+    source = csv_path(path)
+    if not os.path.exists(source):
+        raise FileNotFoundError(path)
+    df = pd.read_csv(source, usecols=columns, encoding='utf-8',
+                     dtype={c: t for c, t in schema.items() if t == 'string'})
+    return conform(df, schema)
+
+
+def write_table(df, path, csv=None):
+    """
+    Saves a table as Parquet (plus a CSV copy if csv, default INTERVALS_EXPORT_CSV).
+    Without pyarrow, only the CSV is written. Returns the paths written.
+    """
+    df = conform(df, schema_for(path))
+    written = []
+    if PARQUET_AVAILABLE:
+        tmp_path = path + '.tmp'
+        df.to_parquet(tmp_path, index=False, engine='pyarrow')
+        os.replace(tmp_path, path)
+        written.append(path)
+    if csv or (csv is None and EXPORT_CSV) or not PARQUET_AVAILABLE:
+        df.to_csv(csv_path(path), index=False, encoding='utf-8')
+        written.append(csv_path(path))
+    return written
@@ -0,0 +1,159 @@
+"""
+Columnar Trackpoint Store
+
+Description:
+    Keeps the full per-sample time series of every ingested ride so new metrics
+    can be computed without re-parsing the XML exports.
+
+    Layout (under 'trackpoints/'):
+        index.json            One entry per ride: key, date, segment, offset, length
+        seg-00001/<col>.npy   One flat NumPy array per column, rides concatenated
+
+    Each ingest run appends whole segments; a ride is a contiguous slice of its
+    segment. Columns are opened with mmap_mode='r', so loading a ride returns
+    zero-copy views and only the requested columns/date range are ever paged in.
+    Replaced or deleted rides leave dead rows behind until compact() rewrites
+    the live data.
+
+Columns:
+    time      float64  Seconds since the Unix epoch (UTC), NaN if missing
+    power     float32  Watts
+    hr        float32  Beats per minute
+    cadence   float32  RPM
+    speed     float32  Metres per second
+    distance  float32  Metres
+"""
+
+import os
+import json
+import shutil
+import numpy as np
+
+# --- Configuration ---
+DEFAULT_STORE_DIR = 'trackpoints'
+INDEX_FILE = 'index.json'
+COLUMNS = {
+    'time': np.float64,
+    'power': np.float32,
+    'hr': np.float32,
+    'cadence': np.float32,
+    'speed': np.float32,
+    'distance': np.float32,
+}
+COMPACT_DEAD_FRACTION = 0.5  # compact() when at least this share of stored rows is dead
+
+
+class TrackpointStore:
+    """Append-only, memory-mappable store of per-ride sample streams."""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self.index = {}
+        self._mmaps = {}
+        index_path = os.path.join(root, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, encoding='utf-8') as f:
+                self.index = {entry['key']: entry for entry in json.load(f)}
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return set(self.index)
+
+    def _segments(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root) if d.startswith('seg-'))
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        index_path = os.path.join(self.root, INDEX_FILE)
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(sorted(self.index.values(), key=lambda e: (e['date'], e['key'])), f)
+        os.replace(tmp_path, index_path)
+
+    def append(self, rides):
+        """
+        Writes rides as one new segment and indexes them.
+        rides: iterable of (key, date 'YYYY-MM-DD', {column: 1-D array}); missing
+        columns are stored as NaN. Re-appending a key replaces the old entry.
+        """
+        rides = list(rides)
+        if not rides:
+            return
+        existing = self._segments()
+        segment = f"seg-{int(existing[-1][4:]) + 1 if existing else 1:05d}"
+        segment_dir = os.path.join(self.root, segment)
+        os.makedirs(segment_dir)
+
+        offsets = np.cumsum([0] + [len(streams['time']) for _, _, streams in rides])
+        for column, dtype in COLUMNS.items():
+            data = np.full(offsets[-1], np.nan, dtype=dtype)
+            for (_, _, streams), start, stop in zip(rides, offsets[:-1], offsets[1:]):
+                if column in streams:
+                    data[start:stop] = streams[column]
+            np.save(os.path.join(segment_dir, f"{column}.npy"), data)
+
+        for (key, date, _), start, stop in zip(rides, offsets[:-1], offsets[1:]):
+            self.index[key] = {'key': key, 'date': date, 'segment': segment,
+                               'offset': int(start), 'length': int(stop - start)}
+        self._save_index()
+
+    def remove(self, keys):
+        """Drops rides from the index; their rows are reclaimed by compact()."""
+        removed = [key for key in keys if self.index.pop(key, None) is not None]
+        if removed:
+            self._save_index()
+        return removed
+
+    def _column(self, segment, column):
+        cache_key = (segment, column)
+        if cache_key not in self._mmaps:
+            self._mmaps[cache_key] = np.load(os.path.join(self.root, segment, f"{column}.npy"), mmap_mode='r')
+        return self._mmaps[cache_key]
+
+    def entries(self, start_date=None, end_date=None, keys=None):
+        """Returns index entries (oldest first), optionally filtered by date range (inclusive) and keys."""
+        selected = []
+        for entry in self.index.values():
+            if start_date and entry['date'] < start_date:
+                continue
+            if end_date and entry['date'] > end_date:
+                continue
+            if keys is not None and entry['key'] not in keys:
+                continue
+            selected.append(entry)
+        return sorted(selected, key=lambda e: (e['date'], e['key']))
+
+    def load(self, columns=None, start_date=None, end_date=None, keys=None):
+        """
+        Yields (entry, {column: read-only array view}) for each selected ride.
+        Arrays are slices of memory-mapped files: nothing is copied until used.
+        """
+        columns = list(columns or COLUMNS)
+        for entry in self.entries(start_date, end_date, keys):
+            start, stop = entry['offset'], entry['offset'] + entry['length']
+            yield entry, {c: self._column(entry['segment'], c)[start:stop] for c in columns}
+
+    def dead_fraction(self):
+        """Share of stored rows no longer referenced by the index."""
+        stored = sum(len(self._column(seg, 'time')) for seg in self._segments())
+        live = sum(entry['length'] for entry in self.index.values())
+        return 1 - live / stored if stored else 0.0
+
+    def compact(self):
+        """Rewrites all live rides into a single fresh segment and deletes the old ones."""
+        old_segments = self._segments()
+        rides = [(e['key'], e['date'], {c: np.array(v) for c, v in streams.items()})
+                 for e, streams in self.load()]
+        self._mmaps.clear()
+        self.index = {}
+        self.append(rides)
+        self._save_index()
+        for segment in old_segments:
+            shutil.rmtree(os.path.join(self.root, segment))
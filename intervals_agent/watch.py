@@ -0,0 +1,153 @@
+"""
+Watch Mode
+
+Description:
+    Keeps the outputs up to date without re-running anything by hand: new
+    races on Intervals.icu and new files in 'Xert/' trigger a pipeline run
+    (see intervals_agent/pipeline.py), which only re-does the stages whose
+    inputs changed - the API sync and TCX/FIT ingest are incremental, and
+    unchanged figures are not redrawn.
+
+    - RacePoller asks the API for the last few days of activities (one
+      request) and compares the races with the local store, so a poll that
+      finds nothing new costs no sync and no pipeline run.
+    - DirectoryWatcher notices added, changed or removed ride files. It uses
+      watchdog (inotify and friends) when it is installed, to wake up as soon
+      as a file lands, and otherwise compares directory listings. Either way
+      a change only counts once the listing has been stable for a few
+      seconds, so a large export is not picked up half-copied.
+"""
+
+import os
+import time
+import threading
+import importlib.util
+from datetime import date, timedelta
+
+from intervals_agent.store import LocalStore, DEFAULT_DB_PATH, ACTIVITY_FIELDS
+from intervals_agent.sources import RIDE_SUFFIXES, ARCHIVE_SUFFIX
+from intervals_agent import instrument
+
+# --- Configuration ---
+POLL_SECONDS = 30          # Between race checks against the API
+SCAN_SECONDS = 2           # Between directory checks (the longest wait without watchdog)
+SETTLE_SECONDS = 5         # A directory must be unchanged this long before it counts as changed
+RACE_LOOKBACK_DAYS = 7     # Days of activities compared with the store on each poll
+WATCHDOG_AVAILABLE = importlib.util.find_spec('watchdog') is not None
+
+
+class RacePoller:
+    """Finds races that are new or changed on Intervals.icu compared with the local store."""
+
+    def __init__(self, client, db_path=DEFAULT_DB_PATH, lookback_days=RACE_LOOKBACK_DAYS):
+        self.client = client
+        self.db_path = db_path
+        self.lookback_days = lookback_days
+
+    def check(self):
+        """Returns the IDs of races (or former races) whose API record differs from the stored one."""
+        today = date.today()
+        oldest = (today - timedelta(days=self.lookback_days)).isoformat()
+        recent = self.client.get_json('activities', params={'oldest': oldest, 'newest': today.isoformat(),
+                                                            'fields': ','.join(ACTIVITY_FIELDS)})
+        with LocalStore(self.db_path) as store:
+            stored = {a['id']: a for a in store.activities(since=oldest)}
+        instrument.count('watch.polls')
+        return [a['id'] for a in recent
+                if (a.get('race') is True or stored.get(a['id'], {}).get('race') is True) and stored.get(a['id']) != a]
+
+
+class DirectoryWatcher:
+    """Reports when the ride files in a directory have changed and then stayed put for settle seconds."""
+
+    def __init__(self, path, settle=SETTLE_SECONDS, use_watchdog=WATCHDOG_AVAILABLE):
+        self.path = path
+        self.settle = settle
+        self.seen = self.snapshot()
+        self.pending = None  # (snapshot, time it was first seen) of a change that has not settled yet
+        self.event = threading.Event()
+        self.observer = None
+        if use_watchdog and os.path.isdir(path):
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+
+            handler = FileSystemEventHandler()
+            handler.on_any_event = lambda event: self.event.set()
+            self.observer = Observer()
+            self.observer.schedule(handler, path, recursive=False)
+            self.observer.daemon = True
+            self.observer.start()
+
+    def snapshot(self):
+        """{file name: (size, mtime)} of the ride files and archives in the directory."""
+        if not os.path.isdir(self.path):
+            return {}
+        return {entry.name: (entry.stat().st_size, entry.stat().st_mtime_ns) for entry in os.scandir(self.path)
+                if entry.is_file() and entry.name.lower().endswith(RIDE_SUFFIXES + (ARCHIVE_SUFFIX,))}
+
+    def changed(self):
+        """True once per settled change."""
+        current = self.snapshot()
+        if current == self.seen:
+            self.pending = None
+            return False
+        now = time.monotonic()
+        if self.pending is None or self.pending[0] != current:
+            self.pending = (current, now)
+            return False
+        if now - self.pending[1] < self.settle:
+            return False
+        self.seen, self.pending = current, None
+        return True
+
+    def wait(self, seconds):
+        """Sleeps up to seconds; with watchdog, returns early when something in the directory changes."""
+        if self.observer is None:
+            time.sleep(seconds)
+        else:
+            self.event.wait(seconds)
+            self.event.clear()
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+
+
+def watch(run, poller=None, watcher=None, interval=POLL_SECONDS, scan=SCAN_SECONDS):
+    """
+    Runs until interrupted: run(fetch) whenever poller.check() finds new races
+    (fetch=True, the sync picks them up) or watcher reports new exports
+    (fetch=False). A failed poll is reported and retried at the next interval.
+    """
+    next_poll = time.monotonic() + interval
+    watching = []
+    if poller is not None:
+        watching.append(f"for new races every {interval:g} s")
+    if watcher is not None:
+        watching.append(f"for new files in '{watcher.path}' ({'watchdog' if watcher.observer else 'polling'})")
+    print(f"Watching {' and '.join(watching)} - press Ctrl+C to stop.")
+    try:
+        while True:
+            races = []
+            if poller is not None and time.monotonic() >= next_poll:
+                next_poll = time.monotonic() + interval
+                try:
+                    races = poller.check()
+                except Exception as e:
+                    print(f"Warning: could not check for new races: {type(e).__name__}: {e}")
+            exports = watcher is not None and watcher.changed()
+            if races or exports:
+                reasons = ([f"new or changed race(s) {', '.join(map(str, races))}"] if races else []) + \
+                          (["new Xert exports"] if exports else [])
+                print(f"\n[{time.strftime('%H:%M:%S')}] Updating: {' and '.join(reasons)}")
+                instrument.count('watch.runs')
+                run(bool(races))
+            if watcher is not None:
+                watcher.wait(scan)
+            else:
+                time.sleep(max(0.0, min(scan, next_poll - time.monotonic())))
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        if watcher is not None:
+            watcher.stop()
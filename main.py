@@ -7,10 +7,31 @@ Description:
     and Training Load metrics (Fitness, Fatigue, Form), and calculates a custom
     'Performance Score' for each race.
 
-    The output is saved to 'race_analysis.csv'.
+    Every race and wellness row fetched is kept in a local SQLite store
+    ('intervals_cache.sqlite'). Later runs only fetch what changed since the last
+    sync and rebuild the output from the local copy.
+
+    The activity history is requested in yearly windows, concurrently, asking
+    only for the fields the race table uses. Each response is decoded as it
+    streams in and everything but races is dropped on the spot, so memory does
+    not grow with the length of the history and a full sync takes about as
+    long as the slowest window.
+
+    With --streams, the per-second streams of every race are downloaded once into
+    'streams/' (see intervals_agent/streams.py); races with stored streams get
+    aerobic decoupling and time-in-power-zone columns. Races the API refuses
+    (e.g. 404) are remembered and skipped on later runs; --refetch retries them.
+
+    The output is saved to 'race_analysis.parquet' (typed, see intervals_agent/tables.py);
+    --csv also writes 'race_analysis.csv'.
 
 Usage:
-    python main.py
+    python main.py                 # Incremental sync, then rebuild
+    python main.py --full-sync     # Re-download the full history
+    python main.py --offline       # Rebuild from the local store only
+    python main.py --offline --windows 3,7,14,28,42 --ewm-spans 7,28 --extra-features
+    python main.py --streams       # Also download race streams (drift, time in power zones)
+    python main.py --streams --refetch  # ... and retry streams the API refused before
 
 Dependencies:
     - requests
@@ -18,139 +39,203 @@ Dependencies:
     - python-dotenv
 
 Configuration:
-    Requires a .env file with:
+    Requires a .env file with (not needed for --offline):
     - INTERVALS_API_KEY
     - INTERVALS_ATHLETE_ID
+    For several athletes at once, see run_batch.py.
+    Concurrency, rate limit and base URL can be tuned, see intervals_agent/client.py.
 """
 
 import os
-import requests
-import csv
+import sys
+import argparse
 import pandas as pd
-import io
 from dotenv import load_dotenv
 from datetime import date, timedelta, datetime
+from intervals_agent.client import IntervalsClient
+from intervals_agent.store import LocalStore, DEFAULT_DB_PATH, ACTIVITY_FIELDS
+from intervals_agent.features import daily_wellness_frame, pre_race_features, DEFAULT_WINDOWS
+from intervals_agent.tables import write_table
+from intervals_agent.matching import utc_iso
+from intervals_agent.streams import StreamStore, fetch_missing, stream_metrics, DEFAULT_STREAM_DIR
+from intervals_agent import instrument
 
 # Load environment variables
 load_dotenv()
 
-API_KEY = os.getenv("INTERVALS_API_KEY")
-ATHLETE_ID = os.getenv("INTERVALS_ATHLETE_ID")
+# --- Constants ---
+OUTPUT_FILE = "race_analysis.parquet"
+WELLNESS_CHUNK_DAYS = 365  # Days of wellness requested per API call
+ACTIVITY_CHUNK_DAYS = 365  # Days of activities requested per API call
+WELLNESS_LOOKBACK_DAYS = 90  # Wellness fetched before the first race on a full sync (longest usable window)
+HISTORY_START = date(2000, 1, 1)
+SYNC_OVERLAP_DAYS = 7  # Re-fetch this many days before the watermark to catch edits and late wellness
 
-if not API_KEY or not ATHLETE_ID:
-    raise ValueError("Missing API_KEY or ATHLETE_ID in .env file.")
+def load_credentials():
+    """Returns (athlete_id, api_key) from the environment / .env file. Raises if either is missing."""
+    api_key = os.getenv("INTERVALS_API_KEY")
+    athlete_id = os.getenv("INTERVALS_ATHLETE_ID")
+    if not api_key or not athlete_id:
+        raise ValueError("Missing API_KEY or ATHLETE_ID in .env file.")
+    return athlete_id, api_key
 
-# --- Constants ---
-OUTPUT_FILE = "race_analysis.csv"
-BASE_URL = "https://intervals.icu/api/v1"
-
-def get_auth():
-    """Returns the authentication tuple for requests."""
-    return ("API_KEY", API_KEY)
-
-def fetch_activities(oldest_date, newest_date):
-    """Fetches all activities within the specified date range."""
-    url = f"{BASE_URL}/athlete/{ATHLETE_ID}/activities?oldest={oldest_date}&newest={newest_date}"
-    print("Fetching all activities...")
-    response = requests.get(url, auth=get_auth())
-    response.raise_for_status()
-    return response.json()
-
-def fetch_wellness(oldest_date, newest_date):
-    """Fetches wellness data for a specific date range."""
-    url = f"{BASE_URL}/athlete/{ATHLETE_ID}/wellness?oldest={oldest_date}&newest={newest_date}"
+def default_ftp():
+    """FTP from INTERVALS_FTP for the power zones of races without icu_ftp; None if unset or not a number."""
+    value = os.getenv("INTERVALS_FTP", "").strip()
     try:
-        response = requests.get(url, auth=get_auth())
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException:
-        return []
+        return float(value or 0) or None
+    except ValueError:
+        print(f"Warning: ignoring INTERVALS_FTP={value!r}, not a number.")
+        return None
+
+def date_chunks(oldest_date, newest_date, chunk_days):
+    """Splits an inclusive date range into consecutive (oldest, newest) ISO date pairs of at most chunk_days."""
+    chunks = []
+    chunk_start = oldest_date
+    while chunk_start <= newest_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), newest_date)
+        chunks.append((chunk_start.isoformat(), chunk_end.isoformat()))
+        chunk_start = chunk_end + timedelta(days=1)
+    return chunks
 
-def get_weight_for_date(target_date, api_key, athlete_id):
+@instrument.timed('fetch_race_window')
+def fetch_race_window(client, window):
     """
-    Attempts to find the athlete's weight on the target date.
-    Falls back to a +/- 30 day window if exact date is missing.
+    Fetches one (oldest, newest) window of activities, keeping the races as they
+    are decoded. Returns (races, IDs of the other activities).
+    """
+    races, others = [], []
+    params = {'oldest': window[0], 'newest': window[1], 'fields': ','.join(ACTIVITY_FIELDS)}
+    for activity in client.iter_json('activities', params=params):
+        if activity.get('race') is True:
+            races.append(activity)
+        else:
+            others.append(activity['id'])
+    return races, others
+
+def fetch_races(client, oldest_date, newest_date, chunk_days=ACTIVITY_CHUNK_DAYS):
+    """
+    Fetches the activities between two dates in windows of chunk_days,
+    concurrently. Yields (races, IDs of the other activities) per window, in
+    the order the windows complete.
+    """
+    chunks = date_chunks(oldest_date, newest_date, chunk_days)
+    print(f"Fetching activities {oldest_date.isoformat()} to {newest_date.isoformat()} in {len(chunks)} chunk(s)...")
+    yield from client.map_unordered(lambda chunk: fetch_race_window(client, chunk), chunks)
+
+def get_activity_date(activity):
+    """Returns the local calendar date of an activity."""
+    return datetime.strptime(activity['start_date_local'].split('T')[0], '%Y-%m-%d').date()
+
+def race_window(activity):
+    """(start, end) of an activity as ISO UTC strings, end = start + elapsed time; None where unknown."""
+    start = utc_iso(activity.get('start_date'))
+    elapsed = activity.get('elapsed_time') or activity.get('moving_time')
+    if start is None or not elapsed:
+        return start, None
+    return start, utc_iso(datetime.fromisoformat(start.replace('Z', '+00:00')) + timedelta(seconds=elapsed))
+
+def fetch_wellness(client, oldest_date, newest_date):
+    """Fetches wellness data for a specific date range. Raises if the request ultimately fails."""
+    return client.get_json('wellness', params={'oldest': oldest_date, 'newest': newest_date})
+
+@instrument.timed('fetch_wellness_history')
+def fetch_wellness_history(client, oldest_date, newest_date, chunk_days=WELLNESS_CHUNK_DAYS):
+    """
+    Fetches all wellness rows between two dates in a few large chunks, concurrently.
+    Returns a dictionary mapping 'YYYY-MM-DD' to the wellness entry for that day.
+    """
+    chunks = date_chunks(oldest_date, newest_date, chunk_days)
+    print(f"Fetching wellness {oldest_date.isoformat()} to {newest_date.isoformat()} in {len(chunks)} chunk(s)...")
+    wellness_by_date = {}
+    for rows in client.map(lambda chunk: fetch_wellness(client, *chunk), chunks):
+        for entry in rows:
+            wellness_by_date[entry['id']] = entry
+    return wellness_by_date
+
+@instrument.timed('process_races')
+def process_races(activities, wellness_by_date, windows=DEFAULT_WINDOWS, ewm_spans=(), extra_features=False):
+    """
+    Builds the race table from the stored races.
+    Wellness data comes from an in-memory index keyed by 'YYYY-MM-DD'; the
+    pre-race features for all races are computed in one vectorized pass
+    (see intervals_agent/features.py). Returns a DataFrame, one row per race.
     """
-    # Try exact date
-    wellness = fetch_wellness(target_date.isoformat(), target_date.isoformat())
-    if wellness and wellness[0].get('weight'):
-        return wellness[0]['weight']
-
-    # Fallback: Search +/- 30 days
-    start_date = target_date - timedelta(days=30)
-    end_date = target_date + timedelta(days=30)
-    wellness_data = fetch_wellness(start_date.isoformat(), end_date.isoformat())
-    
-    if wellness_data:
-        # Sort by proximity to target_date
-        wellness_data.sort(key=lambda x: abs((datetime.strptime(x['id'], '%Y-%m-%d').date() - target_date).days))
-        for entry in wellness_data:
-            if entry.get('weight'):
-                return entry['weight']
-    return None
-
-def process_races(activities):
-    """Filters activities for races and aggregates metrics."""
     race_analysis_data = []
     
-    print(f"Processing {len(activities)} activities. Filtering for races...")
-    
-    for activity in sorted(activities, key=lambda x: x['id']):
-        # Only process activities flagged as 'race'
-        if activity.get('race') is True:
-            race_date_str = activity['start_date_local'].split('T')[0]
-            race_date = datetime.strptime(race_date_str, '%Y-%m-%d').date()
-
-            # Basic Race Data
-            race_entry = {
-                'Activity ID': activity['id'],
-                'Date': race_date_str,
-                'Name': activity['name'],
-                'Type': activity['type'],
-                'Average Speed (km/h)': round(activity.get('average_speed', 0) * 3.6, 2),
-                'Kilojoules': activity.get('icu_joules'),
-                'Distance (km)': round(activity.get('distance', 0) / 1000, 2),
-                'Moving Time (minutes)': round(activity.get('moving_time', 0) / 60, 2),
-                'Kilojoules/Hour': round(activity.get('icu_joules', 0) / (activity.get('moving_time', 1) / 3600), 2) if activity.get('moving_time', 1) > 0 else 0,
-                'Max HR (in-race)': activity.get('max_heartrate'),
-                'Variability': activity.get('icu_variability_index'),
-                'Power/HR': activity.get('icu_power_hr'),
-                'Efficiency Factor': activity.get('icu_efficiency_factor'),
-                'Incident': None, 
-            }
-
-            # Weight & Power/Weight
-            weight = get_weight_for_date(race_date, API_KEY, ATHLETE_ID)
-            if activity.get('icu_weighted_avg_watts') and weight:
-                race_entry['Power/Weight (W/kg)'] = round(activity['icu_weighted_avg_watts'] / weight, 2)
-            else:
-                race_entry['Power/Weight (W/kg)'] = None
-
-            # --- Pre-Race Wellness (7 & 14 days) ---
-            for days in [7, 14]:
-                start_date = race_date - timedelta(days=days)
-                wellness_data = fetch_wellness(start_date.isoformat(), race_date.isoformat())
-                
-                # Extract valid values
-                resting_hrs = [e['restingHR'] for e in wellness_data if e.get('restingHR')]
-                hrvs = [e['hrv'] for e in wellness_data if e.get('hrv')]
-                sleeps = [e['sleepSecs'] for e in wellness_data if e.get('sleepSecs')]
-
-                race_entry[f'Avg Resting HR ({days}-day pre-race)'] = round(sum(resting_hrs) / len(resting_hrs), 2) if resting_hrs else None
-                race_entry[f'Avg HRV ({days}-day pre-race)'] = round(sum(hrvs) / len(hrvs), 2) if hrvs else None
-                race_entry[f'Avg Sleep (hours, {days}-day pre-race)'] = round(sum(sleeps) / len(sleeps) / 3600, 2) if sleeps else None
-
-            # --- PMC Data (Fitness/Fatigue) ---
-            day_before = race_date - timedelta(days=1)
-            pmc_data = fetch_wellness(day_before.isoformat(), day_before.isoformat())
-            if pmc_data:
-                race_entry['Fitness (CTL, day pre-race)'] = pmc_data[0].get('ctl')
-                race_entry['Fatigue (ATL, day pre-race)'] = pmc_data[0].get('atl')
-                race_entry['Form (Ramp Rate, day pre-race)'] = pmc_data[0].get('rampRate')
-
-            race_analysis_data.append(race_entry)
-            
-    return race_analysis_data
+    races = sorted((a for a in activities if a.get('race') is True), key=lambda x: x['id'])
+    print(f"Processing {len(races)} races...")
+
+    for activity in races:
+        # Basic Race Data
+        race_analysis_data.append({
+            'Activity ID': activity['id'],
+            'Date': activity['start_date_local'].split('T')[0],
+            **dict(zip(['Start (UTC)', 'End (UTC)'], race_window(activity))),
+            'Name': activity['name'],
+            'Type': activity['type'],
+            'Average Speed (km/h)': round(activity.get('average_speed', 0) * 3.6, 2),
+            'Kilojoules': activity.get('icu_joules'),
+            'Distance (km)': round(activity.get('distance', 0) / 1000, 2),
+            'Moving Time (minutes)': round(activity.get('moving_time', 0) / 60, 2),
+            'Kilojoules/Hour': round(activity.get('icu_joules', 0) / (activity.get('moving_time', 1) / 3600), 2) if activity.get('moving_time', 1) > 0 else 0,
+            'Max HR (in-race)': activity.get('max_heartrate'),
+            'Variability': activity.get('icu_variability_index'),
+            'Power/HR': activity.get('icu_power_hr'),
+            'Efficiency Factor': activity.get('icu_efficiency_factor'),
+            'Incident': None, 
+        })
+
+    instrument.count('races', len(races))
+    df = pd.DataFrame(race_analysis_data)
+    if df.empty:
+        return df
+
+    features = pre_race_features([get_activity_date(a) for a in races], daily_wellness_frame(wellness_by_date),
+                                 windows=windows, ewm_spans=ewm_spans, extra=extra_features)
+
+    # Weight & Power/Weight
+    weighted_watts = pd.Series([a.get('icu_weighted_avg_watts') for a in races], dtype=float).replace(0, float('nan'))
+    df['Power/Weight (W/kg)'] = (weighted_watts / features.pop('Weight (kg)')).round(2)
+
+    return pd.concat([df, features], axis=1)
+
+@instrument.timed('sync_store')
+def sync_store(store, client, full_sync=False):
+    """
+    Brings the local store up to date with Intervals.icu.
+
+    The first run (or a full sync) downloads the whole activity history and the
+    wellness needed for every race. Later runs only re-fetch from the last sync
+    watermark, minus a small overlap so edited activities and late wellness
+    uploads are picked up. Races are stored window by window as they arrive;
+    activities that are no longer races are removed from the store.
+    """
+    today = date.today()
+    last_sync = None if full_sync else store.get_state('last_sync')
+
+    oldest = date.fromisoformat(last_sync) - timedelta(days=SYNC_OVERLAP_DAYS) if last_sync else HISTORY_START
+    n_activities, n_races, first_race = 0, 0, today
+    for races, others in fetch_races(client, oldest, today):
+        store.upsert_activities(races)
+        store.delete_activities(others)
+        n_activities += len(races) + len(others)
+        n_races += len(races)
+        first_race = min([first_race] + [get_activity_date(a) for a in races])
+    instrument.count('activities_synced', n_activities)
+    instrument.count('races_synced', n_races)
+
+    if last_sync:
+        wellness_oldest = oldest
+    else:
+        wellness_oldest = first_race - timedelta(days=WELLNESS_LOOKBACK_DAYS) if n_races else today
+    wellness_by_date = fetch_wellness_history(client, wellness_oldest, today)
+    store.upsert_wellness(wellness_by_date.values())
+    instrument.count('wellness_days_synced', len(wellness_by_date))
+
+    store.set_state('last_sync', today.isoformat())
+    print(f"Synced {n_races} races ({n_activities} activities) and {len(wellness_by_date)} wellness days "
+          f"since {oldest.isoformat()}.")
 
 def calculate_performance_score(df):
     """Calculates a normalized Performance Score based on key metrics."""
@@ -188,27 +273,91 @@ def calculate_performance_score(df):
     )
     return df
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fetch Intervals.icu races and wellness into race_analysis.parquet.")
+    parser.add_argument('--full-sync', action='store_true', help="Ignore the sync watermark and re-download the full history.")
+    parser.add_argument('--offline', action='store_true', help="Skip the API and rebuild from the local store.")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help=f"Local store path (default: {DEFAULT_DB_PATH}).")
+    parser.add_argument('--windows', default=','.join(map(str, DEFAULT_WINDOWS)),
+                        help="Comma-separated pre-race windows in days, e.g. 3,7,14,28,42 (default: %(default)s).")
+    parser.add_argument('--ewm-spans', default='', help="Comma-separated EWMA spans in days, e.g. 7,28.")
+    parser.add_argument('--extra-features', action='store_true', help="Add window deltas and missing-day counts.")
+    parser.add_argument('--streams', action='store_true',
+                        help=f"Also download the per-second streams of new races into {DEFAULT_STREAM_DIR}/ (drift, time in zone).")
+    parser.add_argument('--refetch', action='store_true',
+                        help="With --streams, retry races whose streams the API refused before (e.g. 404).")
+    parser.add_argument('--ftp', type=float, default=None,
+                        help="FTP for the power zones of races without an FTP in Intervals.icu (default: INTERVALS_FTP).")
+    parser.add_argument('--csv', action='store_true', default=None, help="Also export a CSV copy (or set INTERVALS_EXPORT_CSV=1).")
+    parser.add_argument('--profile', action='store_true', help="Print timings and counters and save a trace to profiles/ (or set INTERVALS_PROFILE=1).")
+    return parser.parse_args()
+
+def parse_days(value):
+    """Parses a comma-separated list of day counts."""
+    return tuple(int(v) for v in value.split(',') if v.strip())
+
+def add_stream_metrics(df, activities, stream_store, default_ftp=None):
+    """Left-joins drift and time-in-zone from the stored race streams (no-op if none are stored)."""
+    if not stream_store.keys():
+        return df
+    ftps = {a['id']: a.get('icu_ftp') for a in activities if a.get('race') is True}
+    metrics = stream_metrics(stream_store, df['Activity ID'], ftps=ftps, default_ftp=default_ftp)
+    print(f"Added stream metrics for {len(metrics)} of {len(df)} races.")
+    return df.merge(metrics, on='Activity ID', how='left')
+
+def run(athlete_id=None, api_key=None, db_path=DEFAULT_DB_PATH, output_file=OUTPUT_FILE, offline=False,
+        full_sync=False, windows=DEFAULT_WINDOWS, ewm_spans=(), extra_features=False, csv=None, rate_limiter=None,
+        streams=False, stream_dir=DEFAULT_STREAM_DIR, default_ftp=None, refetch=False):
+    """
+    Syncs one athlete into their local store (unless offline), rebuilds the
+    race table from it and writes it to output_file. Returns the paths
+    written (empty if there are no races). Errors are raised, not printed,
+    so batch runs can report them per athlete.
+
+    With streams, the per-second streams of races not in stream_dir yet are
+    downloaded too (races the API refused before only with refetch); stored
+    streams always add their metrics to the table.
+    """
+    stream_store = StreamStore(stream_dir)
+    with LocalStore(db_path) as store:
+        # Sync, then process from the local copy
+        if not offline:
+            with IntervalsClient(athlete_id, api_key, rate_limiter=rate_limiter) as client:
+                sync_store(store, client, full_sync=full_sync)
+                if streams:
+                    fetch_missing(client, stream_store, [a['id'] for a in store.activities() if a.get('race') is True],
+                                  refetch=refetch)
+        with instrument.timer('load_store'):
+            activities, wellness_by_date = store.activities(), store.wellness_by_date()
+        instrument.count('store.activities_read', len(activities))
+        instrument.count('store.wellness_days_read', len(wellness_by_date))
+        df = process_races(activities, wellness_by_date, windows=windows, ewm_spans=ewm_spans,
+                           extra_features=extra_features)
+
+    if df.empty:
+        print("No races found.")
+        return []
+    df = calculate_performance_score(df)
+    df = add_stream_metrics(df, activities, stream_store, default_ftp)
+
+    with instrument.timer('write_table'):
+        written = write_table(df, output_file, csv=csv)
+    print(f"Successfully saved race analysis data to {', '.join(written)}")
+    return written
+
 def main():
+    args = parse_args()
+    instrument.enable_from_env('main', args.profile)
+    # Credentials are only needed to talk to the API
+    athlete_id, api_key = (None, None) if args.offline else load_credentials()
     try:
-        # Define date range
-        oldest_date = date(2000, 1, 1).isoformat()
-        today = date.today().isoformat()
-
-        # Fetch and Process
-        activities = fetch_activities(oldest_date, today)
-        race_data = process_races(activities)
-
-        if race_data:
-            df = pd.DataFrame(race_data)
-            df = calculate_performance_score(df)
-            
-            df.to_csv(OUTPUT_FILE, index=False, encoding='utf-8')
-            print(f"Successfully saved race analysis data to {OUTPUT_FILE}")
-        else:
-            print("No races found.")
-
+        run(athlete_id, api_key, db_path=args.db, offline=args.offline, full_sync=args.full_sync,
+            windows=parse_days(args.windows), ewm_spans=parse_days(args.ewm_spans),
+            extra_features=args.extra_features, csv=args.csv, streams=args.streams,
+            default_ftp=args.ftp or default_ftp(), refetch=args.refetch)
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""
+Multi-Athlete Batch Runner
+
+Description:
+    Runs the race analysis (main.py) for every athlete in a roster, concurrently,
+    under one shared request budget.
+
+    - All athletes' API requests draw from a single token bucket, so the batch
+      as a whole never exceeds --rate-limit requests per second, and with enough
+      workers the total wall time approaches (total requests / rate limit)
+      instead of the sum of the individual runs.
+    - Each athlete gets their own directory, 'athletes/<athlete_id>/', holding
+      their local store ('intervals_cache.sqlite', so later runs are incremental),
+      race streams ('streams/', with --streams) and 'race_analysis.parquet'.
+    - Failures are isolated: an invalid key or a failed download is recorded for
+      that athlete and the rest of the batch carries on. The exit code is 1 if
+      any athlete failed.
+
+Roster:
+    A CSV file with a header row and the columns athlete_id, api_key and
+    optionally name. Athlete IDs name the output folders, so they may only
+    contain letters, digits, '_' and '-'. An api_key of the form $VARIABLE is read from the
+    environment (or .env), so keys need not be stored in the roster.
+
+        athlete_id,api_key,name
+        i12345,$KEY_ALICE,Alice
+        i67890,0123abcd...,Bob
+
+Usage:
+    python run_batch.py roster.csv
+    python run_batch.py roster.csv --workers 16 --rate-limit 10
+    python run_batch.py roster.csv --only i12345 --full-sync
+    python run_batch.py roster.csv --offline          # Rebuild every athlete from their local store
+
+Output:
+    'athletes/<athlete_id>/race_analysis.parquet' per athlete and a summary of
+    every athlete's outcome in 'athletes/batch_summary.json'.
+"""
+
+import os
+import re
+import csv
+import json
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+import main as agent
+from intervals_agent.client import TokenBucket, RATE_LIMIT
+from intervals_agent.store import DEFAULT_DB_PATH
+from intervals_agent.features import DEFAULT_WINDOWS
+from intervals_agent.streams import DEFAULT_STREAM_DIR
+from intervals_agent import instrument
+
+load_dotenv()
+
+# --- Configuration ---
+OUTPUT_DIR = 'athletes'
+SUMMARY_FILE = 'batch_summary.json'
+DEFAULT_WORKERS = 8  # Athletes processed at the same time
+ATHLETE_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]+')  # Safe as a folder name (no '..' or path separators)
+
+
+def read_roster(path):
+    """
+    Reads the roster CSV into a list of {'athlete_id', 'api_key', 'name'} dicts.
+    Raises ValueError for missing columns, athlete IDs that are not
+    ATHLETE_ID_PATTERN, or duplicate athlete IDs.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(line for line in f if line.strip() and not line.lstrip().startswith('#')))
+    if rows and not {'athlete_id', 'api_key'} <= set(rows[0]):
+        raise ValueError(f"{path}: the roster needs 'athlete_id' and 'api_key' columns.")
+
+    roster, seen = [], set()
+    for row in rows:
+        athlete_id = (row.get('athlete_id') or '').strip()
+        if not athlete_id:
+            continue
+        if not ATHLETE_ID_PATTERN.fullmatch(athlete_id):
+            raise ValueError(f"{path}: invalid athlete ID {athlete_id!r} (letters, digits, '_' and '-' only).")
+        if athlete_id in seen:
+            raise ValueError(f"{path}: athlete {athlete_id} is listed more than once.")
+        seen.add(athlete_id)
+        roster.append({
+            'athlete_id': athlete_id,
+            'api_key': (row.get('api_key') or '').strip(),
+            'name': (row.get('name') or '').strip() or athlete_id,
+        })
+    return roster
+
+
+def resolve_key(api_key):
+    """Returns the API key, looking up $VARIABLE references in the environment."""
+    if api_key.startswith('$'):
+        return os.getenv(api_key[1:])
+    return api_key
+
+
+def athlete_dir(athlete_id, output_dir=OUTPUT_DIR):
+    return os.path.join(output_dir, athlete_id)
+
+
+def run_athlete(entry, args, rate_limiter):
+    """Runs main.run for one athlete. Never raises: returns a summary dict with status and error."""
+    athlete_id = entry['athlete_id']
+    directory = athlete_dir(athlete_id, args.output_dir)
+    result = {'athlete_id': athlete_id, 'name': entry['name'], 'status': 'ok', 'error': None, 'outputs': []}
+    start = time.perf_counter()
+    try:
+        api_key = resolve_key(entry['api_key'])
+        if not api_key and not args.offline:
+            raise ValueError(f"no API key ({entry['api_key'] or 'empty'})")
+        os.makedirs(directory, exist_ok=True)
+        with instrument.timer('batch.athlete'):
+            result['outputs'] = agent.run(athlete_id, api_key,
+                                          db_path=os.path.join(directory, DEFAULT_DB_PATH),
+                                          output_file=os.path.join(directory, agent.OUTPUT_FILE),
+                                          offline=args.offline, full_sync=args.full_sync,
+                                          windows=args.windows, csv=args.csv, rate_limiter=rate_limiter,
+                                          streams=args.streams, stream_dir=os.path.join(directory, DEFAULT_STREAM_DIR),
+                                          refetch=args.refetch,
+                                          default_ftp=args.default_ftp)
+        if not result['outputs']:
+            result['status'] = 'no races'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = round(time.perf_counter() - start, 2)
+    instrument.count(f"batch.{result['status'].replace(' ', '_')}")
+    print(f"[{athlete_id}] {result['status']} in {result['seconds']:.1f} s" +
+          (f" - {result['error']}" if result['error'] else ""))
+    return result
+
+
+def run_batch(roster, args):
+    """Processes every athlete on a thread pool sharing one rate limiter. Returns the per-athlete results."""
+    rate_limiter = TokenBucket(rate=args.rate_limit)
+    workers = max(1, min(args.workers, len(roster)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda entry: run_athlete(entry, args, rate_limiter), roster))
+
+
+def write_summary(results, seconds, output_dir=OUTPUT_DIR):
+    """Saves the outcome of every athlete to athletes/batch_summary.json. Returns its path."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, SUMMARY_FILE)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'finished': datetime.now().isoformat(timespec='seconds'), 'seconds': round(seconds, 2),
+                   'athletes': results}, f, indent=2)
+    return path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the race analysis for every athlete in a roster.")
+    parser.add_argument('roster', help="CSV with athlete_id, api_key[, name] columns.")
+    parser.add_argument('--only', nargs='+', metavar='ATHLETE_ID', help="Only process these athletes.")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Athletes processed concurrently (default: %(default)s).")
+    parser.add_argument('--rate-limit', type=float, default=RATE_LIMIT,
+                        help="Requests per second for the whole batch (default: %(default)s, INTERVALS_RATE_LIMIT).")
+    parser.add_argument('--full-sync', action='store_true', help="Re-download every athlete's full history.")
+    parser.add_argument('--offline', action='store_true', help="Skip the API and rebuild from the local stores.")
+    parser.add_argument('--streams', action='store_true', help="Also download each athlete's new race streams.")
+    parser.add_argument('--refetch', action='store_true', help="With --streams, retry streams the API refused before.")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help="Directory holding one folder per athlete (default: %(default)s).")
+    parser.add_argument('--windows', default=','.join(map(str, DEFAULT_WINDOWS)),
+                        help="Comma-separated pre-race windows in days (default: %(default)s).")
+    parser.add_argument('--csv', action='store_true', default=None, help="Also export CSV copies (or set INTERVALS_EXPORT_CSV=1).")
+    parser.add_argument('--profile', action='store_true', help="Print timings and counters and save a trace to profiles/ (or set INTERVALS_PROFILE=1).")
+    args = parser.parse_args()
+    args.windows = agent.parse_days(args.windows)
+    args.default_ftp = agent.default_ftp()
+    return args
+
+
+def main():
+    args = parse_args()
+    instrument.enable_from_env('run_batch', args.profile)
+    roster = read_roster(args.roster)
+    if args.only:
+        unknown = set(args.only) - {entry['athlete_id'] for entry in roster}
+        if unknown:
+            print(f"Warning: not in the roster: {', '.join(sorted(unknown))}")
+        roster = [entry for entry in roster if entry['athlete_id'] in args.only]
+    if not roster:
+        print("No athletes to process.")
+        return
+
+    print(f"Processing {len(roster)} athlete(s) with {min(args.workers, len(roster))} worker(s)"
+          f"{'' if args.offline else f' at up to {args.rate_limit:g} requests/s'}...")
+    start = time.perf_counter()
+    results = run_batch(roster, args)
+    seconds = time.perf_counter() - start
+
+    summary_path = write_summary(results, seconds, args.output_dir)
+    print(f"\n{'Athlete':<24}{'Status':<10}{'Seconds':>8}  Error")
+    for result in results:
+        print(f"{result['name'][:23]:<24}{result['status']:<10}{result['seconds']:>8.1f}  {result['error'] or ''}")
+    failed = [r for r in results if r['status'] == 'failed']
+    print(f"\nBatch finished in {seconds:.1f} s: {len(results) - len(failed)} succeeded, {len(failed)} failed. "
+          f"Summary saved to {summary_path}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Pipeline Runner
+
+Description:
+    Single entry point for the whole workflow. Instead of running main.py,
+    analyze_xert_tcx.py, merge_xert_data.py and the figure scripts by hand, this
+    runs them as a dependency graph and only re-executes the stages whose
+    inputs, code or settings changed since their last successful run
+    (see intervals_agent/pipeline.py).
+
+        races ──────────┬──> merge ──┬──> correlations
+        tcx ────────────┘            └──> dashboard
+        races ─────────────> plots
+
+    - 'races' rebuilds race_analysis.parquet from the local Intervals.icu cache
+      (main.py --offline). With --fetch it syncs with the API first; this stage
+      then always runs, but downstream stages only follow if the table changed.
+    - 'tcx' parses new Xert exports; it re-runs when a file in Xert/ is added,
+      removed or modified.
+    - Stages in the same wave run in parallel.
+
+    Stages whose inputs are missing (e.g. no local cache yet) are reported as
+    blocked and their existing outputs are used as they are.
+
+    --watch keeps running after the first refresh: it checks Intervals.icu for
+    new or edited races every --interval seconds and watches Xert/ for new
+    exports, and refreshes again when either shows up (see intervals_agent/watch.py).
+
+Usage:
+    python run_pipeline.py                    # Refresh whatever is out of date
+    python run_pipeline.py --fetch            # Pull new races from Intervals.icu first
+    python run_pipeline.py --fetch --streams  # ... and download their per-second streams
+    python run_pipeline.py --dry-run          # Show what would run
+    python run_pipeline.py --force merge      # Re-run stages regardless of the cache
+    python run_pipeline.py --profile          # Per-stage timings; each stage writes profiles/<script>.json
+    python run_pipeline.py --watch            # Refresh now, then whenever a race or Xert export lands
+
+Output:
+    The stage outputs (Parquet tables and figures); stage fingerprints are kept in 'pipeline_state.json'.
+"""
+
+import os
+import argparse
+from dotenv import load_dotenv
+from intervals_agent.pipeline import Stage, Pipeline, DEFAULT_STATE_PATH, DEFAULT_JOBS
+from intervals_agent.watch import watch, RacePoller, DirectoryWatcher, POLL_SECONDS
+from intervals_agent import instrument
+
+load_dotenv()
+
+# --- Configuration ---
+PACKAGE = 'intervals_agent'
+XERT_DIR = 'Xert'
+
+
+def build_stages(fetch=False, streams=False):
+    """The project's stage graph."""
+    races_command = ['main.py'] + (['--streams'] if streams else []) if fetch else ['main.py', '--offline']
+    return [
+        Stage('races', races_command,
+              inputs=['intervals_cache.sqlite'] if not fetch else [],
+              outputs=['race_analysis.parquet'],
+              code=['main.py', f'{PACKAGE}/client.py', f'{PACKAGE}/store.py', f'{PACKAGE}/features.py',
+                    f'{PACKAGE}/tables.py', f'{PACKAGE}/streams.py',
+                    f'{PACKAGE}/matching.py'],
+              env=['INTERVALS_ATHLETE_ID', 'INTERVALS_FTP'],
+              always=fetch),
+        Stage('tcx', ['scripts/analyze_xert_tcx.py'],
+              inputs=[XERT_DIR],
+              outputs=['xert_metrics.parquet', 'xert_manifest.json', 'best_efforts.npz'],
+              code=['scripts/analyze_xert_tcx.py', f'{PACKAGE}/manifest.py', f'{PACKAGE}/trackpoints.py',
+                    f'{PACKAGE}/physiology.py', f'{PACKAGE}/tables.py', f'{PACKAGE}/matching.py',
+                    f'{PACKAGE}/sources.py', f'{PACKAGE}/scheduler.py', f'{PACKAGE}/fit.py', f'{PACKAGE}/dedup.py',
+                    f'{PACKAGE}/efforts.py'],
+              env=['XERT_FTP']),
+        Stage('merge', ['scripts/merge_xert_data.py'],
+              inputs=['race_analysis.parquet', 'xert_metrics.parquet', 'best_efforts.npz'],
+              outputs=['race_analysis_with_xert.parquet'],
+              code=['scripts/merge_xert_data.py', f'{PACKAGE}/tables.py', f'{PACKAGE}/matching.py',
+                    f'{PACKAGE}/efforts.py']),
+        Stage('correlations', ['scripts/calculate_xert_correlations.py'],
+              inputs=['race_analysis_with_xert.parquet'],
+              outputs=['figures/Xert_Correlations.png'],
+              code=['scripts/calculate_xert_correlations.py', f'{PACKAGE}/correlation.py', f'{PACKAGE}/render.py']),
+        Stage('dashboard', ['scripts/generate_dashboard.py'],
+              inputs=['race_analysis_with_xert.parquet'],
+              outputs=['figures/xert_correlation_dashboard.jpg'],
+              code=['scripts/generate_dashboard.py', f'{PACKAGE}/correlation.py', f'{PACKAGE}/render.py']),
+        Stage('plots', ['plot_race_data.py'],
+              inputs=['race_analysis.parquet'],
+              outputs=['figures/*_vs_Performance_Score.png'],
+              code=['plot_race_data.py', f'{PACKAGE}/render.py']),
+    ]
+
+
+def run_once(args, fetch, force=()):
+    """Runs the pipeline once and prints a summary. Returns {stage name: status}."""
+    pipeline = Pipeline(build_stages(fetch=fetch, streams=args.streams), state_path=args.state)
+    status = pipeline.run(jobs=args.jobs, force=force, dry_run=args.dry_run, verbose=args.verbose)
+    counts = {}
+    for value in status.values():
+        counts[value] = counts.get(value, 0) + 1
+    print("\nPipeline: " + ", ".join(f"{n} {value}" for value, n in sorted(counts.items())))
+    return status
+
+
+def watch_pipeline(args):
+    """Refreshes now, then again whenever new races or Xert exports appear, until interrupted."""
+    from intervals_agent.client import IntervalsClient
+
+    athlete_id, api_key = os.getenv("INTERVALS_ATHLETE_ID"), os.getenv("INTERVALS_API_KEY")
+    client = IntervalsClient(athlete_id, api_key) if athlete_id and api_key else None
+    if client is None:
+        print("Warning: INTERVALS_ATHLETE_ID/INTERVALS_API_KEY are not set; only watching for Xert exports.")
+    watcher = DirectoryWatcher(XERT_DIR)
+    run_once(args, fetch=client is not None)
+    try:
+        watch(lambda fetch: run_once(args, fetch), poller=RacePoller(client) if client else None,
+              watcher=watcher, interval=args.interval)
+    finally:
+        if client is not None:
+            client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the analysis pipeline, skipping stages that are up to date.")
+    parser.add_argument('--fetch', action='store_true', help="Sync new activities and wellness from Intervals.icu first.")
+    parser.add_argument('--streams', action='store_true', help="With --fetch, also download new race streams.")
+    parser.add_argument('--force', nargs='*', metavar='STAGE', help="Re-run these stages (all stages if none are given).")
+    parser.add_argument('--dry-run', action='store_true', help="Only show which stages would run.")
+    parser.add_argument('--watch', action='store_true', help="Keep running and refresh when new races or Xert exports appear.")
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS,
+                        help="With --watch, seconds between checks for new races (default: %(default)s).")
+    parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS, help="Stages to run in parallel.")
+    parser.add_argument('--verbose', action='store_true', help="Print the output of every stage, not just failures.")
+    parser.add_argument('--state', default=DEFAULT_STATE_PATH, help="Path of the stage fingerprint file.")
+    parser.add_argument('--profile', action='store_true',
+                        help="Time every stage and have each stage save its own trace to profiles/ (or set INTERVALS_PROFILE=1).")
+    args = parser.parse_args()
+    instrument.enable_from_env('run_pipeline', args.profile)
+
+    stage_names = [stage.name for stage in build_stages()]
+    force = set(stage_names) if args.force == [] else set(args.force or ())
+    unknown = force - set(stage_names)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))} (choose from {', '.join(stage_names)})")
+    if args.watch:
+        if args.dry_run or force:
+            parser.error("--watch cannot be combined with --dry-run or --force")
+        watch_pipeline(args)
+        return
+
+    status = run_once(args, fetch=args.fetch, force=force)
+    if 'failed' in status.values():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,126 +6,581 @@ Description:
     It extracts key physiological metrics including:
     - Max and Average Power (Watts)
     - Max and Average Heart Rate (BPM)
-    - Duration
+    - Duration, and start/end time (UTC) for matching rides to races
+    - Normalized Power, Variability Index, IF and TSS (IF/TSS need an FTP)
+    - Mean-maximal power at 5 s to 60 min
+    - Aerobic decoupling (first-half vs second-half Pw:HR)
 
-    It uses multiprocessing to handle large numbers of files efficiently.
+    FIT files ('.fit', e.g. Garmin originals) are read too, through a binary
+    decoder that unpacks the record messages into arrays in bulk (see
+    intervals_agent/fit.py); they yield the same metrics and streams as TCX.
+
+    Files can be plain '.tcx'/'.fit', gzipped or members of '.zip' archives;
+    they are decompressed as they are parsed, never unpacked to disk (see
+    intervals_agent/sources.py).
+
+    Parsing runs on a process pool in chunks of files that are submitted as
+    workers free up and written out as they complete (see
+    intervals_agent/scheduler.py), so memory stays flat for any archive size
+    and a progress line shows files/s and MB/s. A file that fails - malformed
+    XML, no power data, or still parsing after --timeout seconds - is listed
+    with the reason in 'xert_errors.log' instead of being dropped silently.
+
+    A manifest ('xert_manifest.json') records each file's size, mtime, content
+    hash, parsed metrics and ride fingerprint. Re-runs only parse new or
+    changed files and drop rows for deleted ones, so a weekly refresh costs
+    time proportional to the new exports rather than the archive size.
+
+    The full per-sample streams (time, power, HR, cadence, speed, distance) are
+    written once to a columnar store under 'trackpoints/' (see
+    intervals_agent/trackpoints.py), so new metrics never need the XML again.
+
+    Rides exported more than once are kept once (see intervals_agent/dedup.py):
+    files with identical content are not parsed again, and rides whose
+    fingerprints show the same or a near-identical recording are left out of
+    the table and the trackpoint store. 'xert_duplicates.log' lists what was
+    dropped in favour of which file.
+
+    The best-efforts index ('best_efforts.npz', see intervals_agent/efforts.py)
+    is brought up to date with the trackpoint store at the end of each run,
+    computing only the new rides.
 
 Usage:
-    python scripts/analyze_xert_tcx.py
+    python scripts/analyze_xert_tcx.py             # Incremental
+    python scripts/analyze_xert_tcx.py --rebuild   # Ignore the manifest and re-parse everything
+    python scripts/analyze_xert_tcx.py --ftp 280   # FTP for IF/TSS (or set XERT_FTP)
+    python scripts/analyze_xert_tcx.py --workers 4 --timeout 60
 
 Output:
-    Saves 'xert_metrics.csv' in the project root.
+    Saves 'xert_metrics.parquet' in the project root (plus 'xert_metrics.csv' with --csv),
+    'xert_errors.log' when some files yielded no data and 'xert_duplicates.log'
+    when some rides were duplicates. Updates 'trackpoints/' and 'best_efforts.npz'.
 """
 
 import os
-import glob
+import sys
 import time
+import argparse
+import numpy as np
 import pandas as pd
+from array import array
 import xml.etree.ElementTree as ET
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import partial
 from concurrent.futures import ProcessPoolExecutor
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from intervals_agent.manifest import Manifest
+from intervals_agent.fit import decode_fit
+from intervals_agent.sources import find_sources, open_source, source_stat, source_sha256
+from intervals_agent.scheduler import chunk_size, chunked, bounded_map, Progress, IN_FLIGHT_PER_WORKER
+from intervals_agent.trackpoints import TrackpointStore, COMPACT_DEAD_FRACTION
+from intervals_agent.physiology import ride_metrics, add_load_metrics, PHYSIOLOGY_COLUMNS
+from intervals_agent.tables import write_table
+from intervals_agent.matching import utc_iso, epoch_window
+from intervals_agent.dedup import ride_fingerprint, find_duplicates
+from intervals_agent.efforts import BestEffortsIndex
+from intervals_agent import instrument
+
 # --- Configuration ---
 TCX_DIR = 'Xert'
-OUTPUT_FILE = 'xert_metrics.csv'
+OUTPUT_FILE = 'xert_metrics.parquet'
+MANIFEST_FILE = 'xert_manifest.json'
+TRACKPOINT_DIR = 'trackpoints'
+EFFORTS_FILE = 'best_efforts.npz'
+ERROR_LOG = 'xert_errors.log'
+DUPLICATE_LOG = 'xert_duplicates.log'
+STREAM_SEGMENT_RIDES = 100  # Rides buffered in memory before they are written as one store segment
+FILE_TIMEOUT_SECONDS = 120  # Per-file parse time limit (0 disables it)
+CHECKPOINT_SECONDS = 30     # Save the manifest at least this often during a long run
 NAMESPACE = {
     'ns': 'http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2',
     'ext': 'http://www.garmin.com/xmlschemas/ActivityExtension/v2'
 }
 
-def parse_tcx(file_path):
+# Fully qualified tags, as reported by iterparse
+TCX_NS = '{' + NAMESPACE['ns'] + '}'
+EXT_NS = '{' + NAMESPACE['ext'] + '}'
+TAG_ACTIVITY = TCX_NS + 'Activity'
+TAG_ID = TCX_NS + 'Id'
+TAG_TRACK = TCX_NS + 'Track'
+TAG_TRACKPOINT = TCX_NS + 'Trackpoint'
+TAG_TIME = TCX_NS + 'Time'
+TAG_HEART_RATE = TCX_NS + 'HeartRateBpm'
+TAG_VALUE = TCX_NS + 'Value'
+TAG_WATTS = EXT_NS + 'Watts'
+TAG_SPEED = EXT_NS + 'Speed'
+TAG_CADENCE = TCX_NS + 'Cadence'
+TAG_DISTANCE = TCX_NS + 'DistanceMeters'
+NAN = float('nan')
+FIT_SUFFIXES = ('.fit', '.fit.gz')
+TIMEOUT_CHECK_EVENTS = 4096  # Parser events between deadline checks
+WINDOW_COLUMNS = ['Xert_Start', 'Xert_End']  # First/last trackpoint (UTC), for matching rides to races
+
+class RideFileError(ValueError):
+    """A ride file that parsed but holds no usable ride (the message is the reason)."""
+
+def stream_times_to_epoch(times):
+    """Converts ISO-8601 time strings (None allowed) to float seconds since the epoch, NaN if missing."""
+    stamps = pd.to_datetime(pd.Series(times, dtype=object), utc=True, format='ISO8601', errors='coerce')
+    return ((stamps - pd.Timestamp(0, tz='UTC')) / pd.Timedelta(seconds=1)).to_numpy(dtype=np.float64, na_value=np.nan)
+
+def read_tcx(file_path, collect_streams=False, timeout=None):
     """
-    Parses a single TCX file to extract power, HR, and duration metrics.
-    Returns a dictionary of metrics or None if parsing fails.
+    Parses a single TCX file (plain, .tcx.gz or a zip member, see
+    intervals_agent/sources.py) to extract power, HR, and duration metrics.
+    Returns (metrics, streams); streams is a dictionary of per-trackpoint
+    arrays (see intervals_agent/trackpoints.py) when collect_streams is set,
+    otherwise None. Raises RideFileError for files without usable data, TimeoutError
+    after timeout seconds, and the parser's error for malformed XML.
+
+    The file is streamed once with iterparse: each Trackpoint is folded into
+    running sums/maxima and then cleared, so memory stays flat however long
+    the ride is (apart from the optional streams themselves).
     """
-    try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        
-        activity = root.find('.//ns:Activity', NAMESPACE)
-        if activity is None:
-            return None
-            
-        activity_id = activity.find('ns:Id', NAMESPACE).text
+    deadline = None if not timeout else time.monotonic() + timeout
+    with open_source(file_path) as source:
+        activity_id = None
+        seen_activity = in_activity = in_trackpoint = False
+        track = None
+
+        watts_count, watts_sum, max_power = 0, 0.0, None
+        hr_count, hr_sum, max_hr = 0, 0.0, None
+        first_time = last_time = None
+        time_count = 0
+        tp_watts = tp_hr = tp_time = None
+        tp_cadence = tp_speed = tp_distance = None
+        if collect_streams:
+            times = []
+            samples = {column: array('d') for column in ('power', 'hr', 'cadence', 'speed', 'distance')}
+
+        for n_events, (event, elem) in enumerate(ET.iterparse(source, events=('start', 'end'))):
+            if deadline is not None and not n_events % TIMEOUT_CHECK_EVENTS and time.monotonic() > deadline:
+                raise TimeoutError(f"still parsing after {timeout:g} s")
+            tag = elem.tag
+            if event == 'start':
+                if tag == TAG_TRACKPOINT:
+                    in_trackpoint = True
+                    tp_watts = tp_hr = tp_time = None
+                    tp_cadence = tp_speed = tp_distance = None
+                elif tag == TAG_TRACK:
+                    track = elem
+                elif tag == TAG_ACTIVITY and not seen_activity:
+                    seen_activity = in_activity = True
+                continue
+
+            if in_trackpoint:
+                if tag == TAG_TRACKPOINT:
+                    in_trackpoint = False
+                    if tp_watts is not None:
+                        watts_count += 1
+                        watts_sum += tp_watts
+                        if max_power is None or tp_watts > max_power:
+                            max_power = tp_watts
+                    if tp_hr is not None:
+                        hr_count += 1
+                        hr_sum += tp_hr
+                        if max_hr is None or tp_hr > max_hr:
+                            max_hr = tp_hr
+                    if tp_time is not None:
+                        if first_time is None:
+                            first_time = tp_time
+                        last_time = tp_time
+                        time_count += 1
+                    if collect_streams:
+                        times.append(tp_time)
+                        samples['power'].append(NAN if tp_watts is None else tp_watts)
+                        samples['hr'].append(NAN if tp_hr is None else tp_hr)
+                        samples['cadence'].append(NAN if tp_cadence is None else tp_cadence)
+                        samples['speed'].append(NAN if tp_speed is None else tp_speed)
+                        samples['distance'].append(NAN if tp_distance is None else tp_distance)
+                    # Drop the finished trackpoint from the partially built tree
+                    elem.clear()
+                    if track is not None:
+                        track.clear()
+                elif tag == TAG_WATTS:
+                    if tp_watts is None:
+                        tp_watts = float(elem.text)
+                elif tag == TAG_HEART_RATE:
+                    value = elem.find(TAG_VALUE)
+                    if tp_hr is None and value is not None:
+                        tp_hr = float(value.text)
+                elif tag == TAG_TIME:
+                    if tp_time is None:
+                        tp_time = elem.text
+                elif collect_streams:
+                    if tag == TAG_CADENCE:
+                        tp_cadence = float(elem.text)
+                    elif tag == TAG_SPEED:
+                        tp_speed = float(elem.text)
+                    elif tag == TAG_DISTANCE:
+                        tp_distance = float(elem.text)
+            elif in_activity:
+                if tag == TAG_ID and activity_id is None:
+                    activity_id = elem.text
+                elif tag == TAG_ACTIVITY:
+                    in_activity = False
+
+        if not seen_activity or activity_id is None:
+            raise RideFileError("no Activity with an Id")
         # Convert ID to date string (assuming it's ISO format like 2023-01-01T12:00:00Z)
         activity_date = activity_id.split('T')[0]
-        
-        watts_list = []
-        heart_rates = []
-        
-        # Iterate through all Trackpoints
-        for tp in root.findall('.//ns:Trackpoint', NAMESPACE):
-            # Extract Watts
-            watts_elem = tp.find('.//ext:Watts', NAMESPACE)
-            if watts_elem is not None:
-                watts_list.append(float(watts_elem.text))
-            
-            # Extract Heart Rate
-            hr_elem = tp.find('.//ns:HeartRateBpm/ns:Value', NAMESPACE)
-            if hr_elem is not None:
-                heart_rates.append(float(hr_elem.text))
 
-        if not watts_list:
-            return None
+        if not watts_count:
+            raise RideFileError("no power data")
 
         # Calculate Statistics
-        avg_power = sum(watts_list) / len(watts_list)
-        max_power = max(watts_list)
-        avg_hr = sum(heart_rates) / len(heart_rates) if heart_rates else None
-        max_hr = max(heart_rates) if heart_rates else None
-        
+        avg_power = watts_sum / watts_count
+        avg_hr = hr_sum / hr_count if hr_count else None
+
         # Calculate duration from first and last timestamp
-        times = [tp.find('ns:Time', NAMESPACE).text for tp in root.findall('.//ns:Trackpoint', NAMESPACE) if tp.find('ns:Time', NAMESPACE) is not None]
         duration_min = 0
-        if len(times) > 1:
+        if time_count > 1:
             try:
-                t1 = datetime.fromisoformat(times[0].replace('Z', '+00:00'))
-                t2 = datetime.fromisoformat(times[-1].replace('Z', '+00:00'))
+                t1 = datetime.fromisoformat(first_time.replace('Z', '+00:00'))
+                t2 = datetime.fromisoformat(last_time.replace('Z', '+00:00'))
                 duration_min = (t2 - t1).total_seconds() / 60
             except ValueError:
                 pass # Date parsing failed
 
-        return {
+        metrics = {
             'Date': activity_date,
             'Xert_Max_Power': round(max_power, 1),
             'Xert_Avg_Power': round(avg_power, 1),
             'Xert_Max_HR': max_hr,
             'Xert_Avg_HR': round(avg_hr, 1) if avg_hr else None,
             'Xert_Duration_Min': round(duration_min, 1),
+            'Xert_Start': utc_iso(first_time),
+            'Xert_End': utc_iso(last_time),
             'Xert_Filename': os.path.basename(file_path)
         }
+
+        streams = None
+        if collect_streams:
+            streams = {column: np.frombuffer(values, dtype=np.float64) for column, values in samples.items()}
+            streams['time'] = stream_times_to_epoch(times)
+        return metrics, streams
+
+def read_fit(file_path, collect_streams=False, timeout=None):
+    """
+    Reads a FIT file (see intervals_agent/fit.py) into the same (metrics,
+    streams) as read_tcx: the records are decoded into arrays in bulk and the
+    summary is computed from them. Raises like read_tcx.
+    """
+    deadline = None if not timeout else time.monotonic() + timeout
+    with open_source(file_path) as source:
+        start, streams = decode_fit(source.read(), deadline)
+    if start is None:
+        raise RideFileError("no start time")
+
+    power, hr, times = streams['power'], streams['hr'], streams['time']
+    has_power = ~np.isnan(power)
+    if not has_power.any():
+        raise RideFileError("no power data")
+    has_hr = ~np.isnan(hr)
+    first_time, last_time = epoch_window(times)
+    timed = times[~np.isnan(times)]
+    duration_min = (timed[-1] - timed[0]) / 60 if len(timed) > 1 else 0
+    avg_hr = float(hr[has_hr].mean()) if has_hr.any() else None
+
+    metrics = {
+        'Date': utc_iso(datetime.fromtimestamp(start, timezone.utc))[:10],
+        'Xert_Max_Power': round(float(power[has_power].max()), 1),
+        'Xert_Avg_Power': round(float(power[has_power].mean()), 1),
+        'Xert_Max_HR': float(hr[has_hr].max()) if has_hr.any() else None,
+        'Xert_Avg_HR': round(avg_hr, 1) if avg_hr else None,
+        'Xert_Duration_Min': round(duration_min, 1),
+        'Xert_Start': first_time,
+        'Xert_End': last_time,
+        'Xert_Filename': os.path.basename(file_path)
+    }
+    return metrics, (streams if collect_streams else None)
+
+def ride_format(file_path):
+    """'fit' for FIT files, 'tcx' for everything else."""
+    return 'fit' if file_path.lower().endswith(FIT_SUFFIXES) else 'tcx'
+
+def read_ride(file_path, collect_streams=False, timeout=None):
+    """read_fit for FIT files, read_tcx for everything else."""
+    if ride_format(file_path) == 'fit':
+        return read_fit(file_path, collect_streams, timeout)
+    return read_tcx(file_path, collect_streams, timeout)
+
+def parse_tcx(file_path):
+    """
+    Parses a single TCX file to extract power, HR, and duration metrics.
+    Returns a dictionary of metrics or None if parsing fails.
+    """
+    try:
+        return read_tcx(file_path)[0]
     except Exception:
-        # In production, logging errors to a file would be better than silence
         return None
 
+def ingest_ride(file_path, keep_streams=True, timeout=None, sha256=None):
+    """
+    Parses one file (sha256 is its content hash, if already known). Never raises: returns (path, record, streams, error) where
+    record is the manifest record (stat, content hash, metrics, error and
+    fingerprint; metrics None if the file failed), streams are None unless keep_streams is set and error is
+    the reason the file yielded no metrics. record is None when the failure
+    should not be remembered (a timeout, or the file vanished), so the next run
+    tries again.
+    """
+    try:
+        stat = source_stat(file_path)
+        sha256 = sha256 or source_sha256(file_path)
+    except Exception as e:
+        return file_path, None, None, f"{type(e).__name__}: {e}"
+    metrics = streams = error = fingerprint = None
+    try:
+        metrics, streams = read_ride(file_path, collect_streams=True, timeout=timeout)
+        metrics.update(ride_metrics(streams))
+        fingerprint = ride_fingerprint(streams)
+    except TimeoutError as e:
+        return file_path, None, None, f"TimeoutError: {e}"
+    except Exception as e:
+        metrics, streams = None, None
+        error = str(e) if isinstance(e, RideFileError) else f"{type(e).__name__}: {e}"
+    record = (file_path, stat.st_size, stat.st_mtime, sha256, metrics, error, fingerprint)
+    return file_path, record, (streams if keep_streams else None), error
+
+def ingest_chunk(items, keep_streams=True, timeout=None):
+    """Runs ingest_ride over a chunk of (path, sha256 or None) pairs (one pool task)."""
+    return [ingest_ride(path, keep_streams, timeout, sha256) for path, sha256 in items]
+
+def write_error_log(errors, path=ERROR_LOG):
+    """Writes 'path<TAB>reason' for every failing file, or removes the log when nothing failed."""
+    if not errors:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        for file_path, reason in sorted(errors.items()):
+            f.write(f"{file_path}\t{reason}\n")
+
+def write_duplicate_log(duplicates, path=DUPLICATE_LOG):
+    """Writes 'dropped<TAB>kept<TAB>exact|near' for every duplicate, or removes the log when there are none."""
+    if not duplicates:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        for dropped, (kept, kind) in sorted(duplicates.items()):
+            f.write(f"{dropped}\t{kept}\t{kind}\n")
+
+def skip_identical(manifest, paths):
+    """
+    Splits off files whose content is identical to an already parsed file or
+    to an earlier file in paths, so each content is parsed once. Files only
+    count as identical in the same format (the same bytes may read as FIT but
+    not as TCX). Returns (paths to parse, {identical path: path it is identical
+    to}, {path: sha256}) so the hashes need not be computed again.
+    """
+    pending = set(paths)
+    parsed = {(entry['sha256'], ride_format(path)): path for path, entry in manifest.files.items()
+              if path not in pending and entry['metrics'] is not None and entry.get('fingerprint')}
+    unique, identical, hashes = [], {}, {}
+    for path in paths:
+        try:
+            sha256 = source_sha256(path)
+        except Exception:
+            unique.append(path)  # ingest_ride reports why
+            continue
+        hashes[path] = sha256
+        key = (sha256, ride_format(path))
+        if key in parsed:
+            identical[path] = parsed[key]
+        else:
+            parsed[key] = path
+            unique.append(path)
+    return unique, identical, hashes
+
+def copy_entry(manifest, path, original):
+    """
+    Records path with the parse results of the identical file original. Only
+    successful results are copied: returns False if original failed or was not
+    recorded, and path is then parsed on its own.
+    """
+    entry = manifest.files.get(original)
+    if entry is None or entry['metrics'] is None or entry.get('error') is not None:
+        return False
+    stat = source_stat(path)
+    metrics = dict(entry['metrics'], Xert_Filename=os.path.basename(path))
+    manifest.update(path, stat.st_size, stat.st_mtime, entry['sha256'], metrics, None, entry.get('fingerprint'))
+    return True
+
+def upgrade_metrics(manifest, store, paths):
+    """
+    Fills physiology and start/end columns and the fingerprint for manifest
+    entries parsed by an older version. Rides already in the trackpoint store
+    are computed from it directly; the rest are returned so they can be re-parsed.
+    """
+    stale = [path for path, entry in manifest.files.items()
+             if path not in paths and entry['metrics'] is not None
+             and (any(column not in entry['metrics'] for column in PHYSIOLOGY_COLUMNS + WINDOW_COLUMNS)
+                  or 'fingerprint' not in entry)]
+    in_store = [path for path in stale if store is not None and path in store]
+    for entry, streams in (store.load(['time', 'power', 'hr'], keys=set(in_store)) if in_store else []):
+        manifest_entry = manifest.files[entry['key']]
+        manifest_entry['metrics'].update(ride_metrics(streams))
+        manifest_entry['metrics'].update(zip(WINDOW_COLUMNS, epoch_window(streams['time'])))
+        manifest_entry['fingerprint'] = ride_fingerprint(streams)
+    return [path for path in stale if path not in set(in_store)]
+
 def main():
+    parser = argparse.ArgumentParser(description="Extract power/HR metrics from Xert TCX exports.")
+    parser.add_argument('--rebuild', action='store_true', help="Ignore the manifest and re-parse every file.")
+    parser.add_argument('--no-streams', action='store_true', help=f"Skip writing per-sample streams to '{TRACKPOINT_DIR}/'.")
+    parser.add_argument('--ftp', type=float, default=float(os.getenv('XERT_FTP', 0)) or None, help="FTP in watts for IF/TSS (default: $XERT_FTP).")
+    parser.add_argument('--workers', type=int, default=None, help="Parser processes (default: one per CPU core).")
+    parser.add_argument('--timeout', type=float, default=FILE_TIMEOUT_SECONDS,
+                        help="Give up on a file after this many seconds, 0 for no limit (default: %(default)s).")
+    parser.add_argument('--csv', action='store_true', default=None, help="Also export a CSV copy (or set INTERVALS_EXPORT_CSV=1).")
+    parser.add_argument('--profile', action='store_true', help="Print timings and counters and save a trace to profiles/ (or set INTERVALS_PROFILE=1).")
+    args = parser.parse_args()
+    instrument.enable_from_env('analyze_xert_tcx', args.profile)
+
     # Verify directory exists
     if not os.path.exists(TCX_DIR):
         print(f"Error: Directory '{TCX_DIR}' not found.")
-        return
+        sys.exit(1)
 
-    tcx_files = glob.glob(os.path.join(TCX_DIR, '*.tcx'))
+    tcx_files = find_sources(TCX_DIR)
     total_files = len(tcx_files)
-    print(f"Found {total_files} TCX files in '{TCX_DIR}' directory.")
+    print(f"Found {total_files} TCX files in '{TCX_DIR}' directory (including .tcx.gz files and zip archives).")
     
     start_time = time.time()
+
+    with instrument.timer('plan'):
+        manifest = Manifest(MANIFEST_FILE)
+        if args.rebuild:
+            manifest.files = {}
+        to_parse, deleted = manifest.plan(tcx_files, stat=source_stat, sha256=source_sha256)
+        manifest.remove(deleted)
+
+        store = None
+        if not args.no_streams:
+            store = TrackpointStore(TRACKPOINT_DIR)
+            store.remove(deleted + to_parse)
+            # Backfill streams for files parsed before the store existed (duplicates need none)
+            skip = set(to_parse) | set(find_duplicates(manifest.fingerprints(), stored=store.keys()))
+            to_parse += [path for path, entry in manifest.files.items()
+                         if entry['metrics'] is not None and path not in store and path not in skip]
+        to_parse += upgrade_metrics(manifest, store, set(to_parse))
+        to_parse, identical, hashes = skip_identical(manifest, to_parse)
+    print(f"{len(to_parse)} to parse, {len(identical)} identical to another file, "
+          f"{total_files - len(to_parse) - len(identical)} unchanged, {len(deleted)} removed.")
+    instrument.count('manifest.hits', total_files - len(to_parse))
+    instrument.count('manifest.misses', len(to_parse))
+    instrument.count('files.deleted', len(deleted))
     
-    print("Starting processing with multiprocessing...")
-    # Use ProcessPoolExecutor to utilize multiple CPU cores
-    with ProcessPoolExecutor() as executor:
-        results = list(executor.map(parse_tcx, tcx_files))
+    run_errors = {}
+    workers = args.workers or os.cpu_count() or 1
+
+    def parse(paths):
+        """Parses paths in the worker pool, recording the results in the manifest and the streams in the store."""
+        size = chunk_size(len(paths), workers)
+        print(f"Starting processing with {workers} worker process(es), {size} file(s) per task...")
+        buffered = []
+        progress = Progress(len(paths))
+        last_checkpoint = time.perf_counter()
+
+        def flush(save_manifest):
+            """Writes the buffered streams as one store segment (then the manifest, so it never runs ahead of the store)."""
+            if buffered:
+                with instrument.timer('store.append'):
+                    store.append(buffered)
+                buffered.clear()
+            if save_manifest:
+                with instrument.timer('manifest.save'):
+                    manifest.save()
+
+        # Chunks are submitted lazily and collected as they finish, so memory holds the
+        # chunks in flight and one store segment, however many files there are
+        task = partial(ingest_chunk, keep_streams=store is not None, timeout=args.timeout)
+        items = [(path, hashes.get(path)) for path in paths]
+        with instrument.timer('parse'), ProcessPoolExecutor(max_workers=workers) as executor:
+            for results in bounded_map(executor, task, chunked(items, size), workers * IN_FLIGHT_PER_WORKER):
+                for path, record, streams, error in results:
+                    if record is not None:
+                        manifest.update(*record)
+                    if error is not None:
+                        run_errors[path] = error
+                    metrics = record[4] if record is not None else None
+                    instrument.count('files.parsed' if metrics is not None else 'files.failed')
+                    instrument.count('bytes.parsed', record[1] if record is not None else 0)
+                    if streams is not None and metrics is not None:
+                        instrument.count('trackpoints', len(streams['time']))
+                        buffered.append((path, metrics['Date'], streams))
+                    progress.update(1, record[1] if record is not None else 0)
+                checkpoint = time.perf_counter() - last_checkpoint >= CHECKPOINT_SECONDS
+                if len(buffered) >= STREAM_SEGMENT_RIDES or checkpoint:
+                    flush(checkpoint)
+                    if checkpoint:
+                        last_checkpoint = time.perf_counter()
+            flush(False)
+        progress.finish()
+
+    if to_parse:
+        parse(to_parse)
+    copied = [path for path, original in identical.items() if copy_entry(manifest, path, original)]
+    # Files identical to one that failed get their own parse (and their own error)
+    retry = sorted(set(identical) - set(copied))
+    if retry:
+        parse(retry)
+        to_parse += retry
+    if to_parse:
+        instrument.rate('trackpoints/s', 'trackpoints', 'parse')
+        instrument.rate('files/s', 'files.parsed', 'parse')
+    instrument.count('files.identical', len(copied))
+
+    with instrument.timer('dedup'):
+        duplicates = find_duplicates(manifest.fingerprints(), stored=store.keys() if store is not None else ())
+    write_duplicate_log(duplicates)
+    instrument.count('files.duplicates', len(duplicates))
+    if duplicates:
+        exact = sum(kind == 'exact' for _, kind in duplicates.values())
+        print(f"Dropped {len(duplicates)} duplicate ride(s) ({exact} exact, {len(duplicates) - exact} near), "
+              f"listed in {DUPLICATE_LOG}.")
+        if store is not None:
+            store.remove([path for path in duplicates if path in store])
+    with instrument.timer('manifest.save'):
+        manifest.save()
+
+    # Failing files: those recorded in the manifest (this run or earlier) plus this run's timeouts
+    errors = {**manifest.errors(), **{path: reason for path, reason in run_errors.items() if path not in manifest.files}}
+    write_error_log(errors)
+    if errors:
+        print(f"{len(errors)} file(s) yielded no data ({len(run_errors)} this run), reasons in {ERROR_LOG}.")
+    if store is not None and store.dead_fraction() >= COMPACT_DEAD_FRACTION:
+        print("Compacting trackpoint store...")
+        with instrument.timer('store.compact'):
+            store.compact()
+    if store is not None:
+        efforts = BestEffortsIndex(EFFORTS_FILE)
+        indexed = len(efforts.keys)
+        with instrument.timer('efforts.update'):
+            # Keyed on the content hash, so compaction does not invalidate the index
+            updated = efforts.update(store, {path: entry['sha256'] for path, entry in manifest.files.items()})
+        # Only rewritten when it changed, so the merge is not re-run for nothing
+        if updated or len(efforts.keys) != indexed or not os.path.exists(EFFORTS_FILE):
+            efforts.save()
+        instrument.count('efforts.rides_updated', updated)
+        print(f"Best-efforts index: {updated} new or changed rides ({len(efforts.keys)} rides).")
         
-    data = [r for r in results if r is not None]
+    data = manifest.metrics(exclude=duplicates)
             
     if data:
-        df = pd.DataFrame(data)
-        df = df.sort_values(by='Date')
+        with instrument.timer('build_table'):
+            df = pd.DataFrame(data)
+            df = add_load_metrics(df, args.ftp)
+            df = df.sort_values(by='Date')
         
-        df.to_csv(OUTPUT_FILE, index=False)
+        with instrument.timer('write_table'):
+            written = write_table(df, OUTPUT_FILE, csv=args.csv)
         
         end_time = time.time()
-        print(f"Successfully processed {len(data)} files in {end_time - start_time:.2f} seconds.")
-        print(f"Saved metrics to {OUTPUT_FILE}")
+        print(f"Parsed {len(to_parse)} files in {end_time - start_time:.2f} seconds ({len(data)} files with data).")
+        print(f"Saved metrics to {', '.join(written)}")
         print(df.head())
     else:
         print("No valid data found in TCX files.")
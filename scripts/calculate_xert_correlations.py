@@ -2,33 +2,61 @@
 Xert Correlation Analyzer
 
 Description:
-    This script calculates the Pearson correlation coefficient between the custom
-    'Performance Score' and various Xert metrics. It prints the correlation matrix
-    and saves a heatmap visualization.
+    This script calculates the Pearson and Spearman correlations between the custom
+    'Performance Score' and various Xert metrics, with bootstrap confidence
+    intervals and permutation p-values (see intervals_agent/correlation.py).
+    It prints the results and saves a heatmap of the full correlation matrix.
+
+    With --include-simulations, training rides tagged by find_race_simulations.py
+    are added to the sample. They have no Performance Score, so they only
+    tighten the correlations between the Xert metrics themselves; correlations
+    with the score still use races only (pairwise-complete rows).
 
 Usage:
-    python scripts/calculate_xert_correlations.py
+    python scripts/calculate_xert_correlations.py [--include-simulations]
 
 Output:
     Saves 'figures/Xert_Correlations.png' (if directory exists, otherwise local).
 """
 
+import argparse
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from intervals_agent.correlation import correlate, format_table
+from intervals_agent.tables import read_table, table_exists
+from intervals_agent.render import FigureJob, render
+from intervals_agent import instrument
 
 # --- Configuration ---
-INPUT_FILE = 'race_analysis_with_xert.csv'
+INPUT_FILE = 'race_analysis_with_xert.parquet'
 OUTPUT_DIR = 'figures'
+SIMULATIONS_FILE = 'race_simulations.parquet'
+
+def draw_heatmap(corr_matrix, style):
+    """Annotated heatmap of the full correlation matrix."""
+    fig = plt.figure(figsize=style['figsize'])
+    sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1)
+    plt.title('Correlation Matrix: Performance vs Xert Metrics')
+    plt.tight_layout()
+    return fig
 
 def main():
-    if not os.path.exists(INPUT_FILE):
+    parser = argparse.ArgumentParser(description="Correlate Xert metrics with the Performance Score.")
+    parser.add_argument('--include-simulations', action='store_true', help=f"Add the race simulations from {SIMULATIONS_FILE}.")
+    args = parser.parse_args()
+    instrument.enable_from_env('calculate_xert_correlations')
+
+    if not table_exists(INPUT_FILE):
         print(f"Error: {INPUT_FILE} not found. Please run merge_xert_data.py first.")
-        return
+        sys.exit(1)
 
     try:
-        df = pd.read_csv(INPUT_FILE)
+        df = read_table(INPUT_FILE)
         
         # Filter for rows that have both Performance Score and Xert data
         df_analyzable = df.dropna(subset=['Performance Score', 'Xert_Max_Power'])
@@ -39,6 +67,14 @@ def main():
 
         print(f"Calculating correlations for {len(df_analyzable)} races with Xert data...")
 
+        if args.include_simulations:
+            if table_exists(SIMULATIONS_FILE):
+                df_sims = read_table(SIMULATIONS_FILE)
+                df_analyzable = pd.concat([df_analyzable, df_sims], ignore_index=True)
+                print(f"Including {len(df_sims)} race simulations (Xert metrics only).")
+            else:
+                print(f"Warning: {SIMULATIONS_FILE} not found. Please run find_race_simulations.py first.")
+
         # Define metrics to correlate
         metrics = [
             'Performance Score',
@@ -46,34 +82,46 @@ def main():
             'Xert_Avg_Power',
             'Xert_Max_HR',
             'Xert_Avg_HR',
-            'Xert_Duration_Min'
+            'Xert_Duration_Min',
+            'Xert_NP',
+            'Xert_IF',
+            'Xert_TSS',
+            'Xert_Decoupling_Pct',
+            'Xert_MMP_1min',
+            'Xert_MMP_5min',
+            'Xert_MMP_20min',
+            'Xert_Best_MMP_5min_60d',
+            'Xert_Best_MMP_20min_60d'
         ]
+        # Older datasets may not have the physiology or best-effort columns yet
+        metrics = [m for m in metrics if m in df_analyzable.columns]
         
         # Calculate correlation matrix
         corr_matrix = df_analyzable[metrics].corr()
         
-        # Extract correlations with Performance Score
-        perf_correlations = corr_matrix['Performance Score'].sort_values(ascending=False)
-        
-        print("\n--- Correlations with Performance Score ---")
-        print(perf_correlations)
-        
-        # Generate a heatmap plot
-        plt.figure(figsize=(10, 8))
-        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1)
-        plt.title('Correlation Matrix: Performance vs Xert Metrics')
-        plt.tight_layout()
+        # Correlations with Performance Score, with uncertainty (races only: simulations have no score)
+        with instrument.timer('correlate'):
+            result = correlate(df_analyzable, 'Performance Score', metrics[1:])
+        result = result.sort_values('pearson_r', ascending=False)
+
+        print("\n--- Pearson Correlations with Performance Score ---")
+        print(format_table(result, 'pearson'))
+        print("\n--- Spearman Rank Correlations with Performance Score ---")
+        print(format_table(result, 'spearman'))
         
-        # Determine output path
+        # Generate a heatmap plot (skipped if the correlation matrix is unchanged)
         output_path = 'Xert_Correlations.png'
         if os.path.exists(OUTPUT_DIR):
             output_path = os.path.join(OUTPUT_DIR, output_path)
-            
-        plt.savefig(output_path)
-        print(f"\nSaved correlation heatmap to '{output_path}'")
+        rendered, _ = render([FigureJob(output_path, draw_heatmap, corr_matrix, style={'figsize': (10, 8)})])
+        if rendered:
+            print(f"\nSaved correlation heatmap to '{output_path}'")
+        else:
+            print(f"\nCorrelation heatmap unchanged: '{output_path}'")
 
     except Exception as e:
         print(f"An error occurred: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+"""
+Race Simulation Finder (TRACK-003)
+
+Description:
+    This script tags training rides that match race intensity, to grow the
+    small race sample. For each race in 'race_analysis.parquet' it takes the race
+    ride from the trackpoint store (same date), builds a profile from its
+    hardest window, and finds the top-k most similar windows across the whole
+    ride archive using the cached window index (see intervals_agent/simulations.py).
+
+    The tagged simulations are written with the same Xert_* column names as
+    'race_analysis_with_xert.parquet' (computed over the matched window), plus the
+    race they simulate and the similarity distance. The correlation scripts
+    accept them via --include-simulations.
+
+Usage:
+    python scripts/find_race_simulations.py [--k 5] [--ftp 280]
+
+Output:
+    Saves 'race_simulations.parquet' in the project root (plus a CSV copy with --csv).
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from intervals_agent.trackpoints import TrackpointStore
+from intervals_agent.manifest import Manifest
+from intervals_agent.simulations import SimulationIndex, ride_windows, FEATURE_NAMES, WINDOW_MINUTES
+from intervals_agent.tables import read_table, write_table, table_exists
+from intervals_agent import instrument
+
+# --- Configuration ---
+RACE_FILE = 'race_analysis.parquet'
+TRACKPOINT_DIR = 'trackpoints'
+MANIFEST_FILE = 'xert_manifest.json'
+OUTPUT_FILE = 'race_simulations.parquet'
+
+def race_profile(store, race_key, race_minutes, ref_power):
+    """Profile of a race: the feature vector of its highest-NP window at the closest standard length."""
+    window_minutes = min(WINDOW_MINUTES, key=lambda m: abs(m - race_minutes))
+    _, streams = next(store.load(['time', 'power', 'hr'], keys={race_key}))
+    lengths, _, features = ride_windows(streams, ref_power, window_minutes=(window_minutes,))
+    if not len(lengths):
+        return None, window_minutes
+    return features[np.nanargmax(features[:, FEATURE_NAMES.index('normalized_power')])], window_minutes
+
+def main():
+    parser = argparse.ArgumentParser(description="Find training rides that simulate race intensity.")
+    parser.add_argument('--k', type=int, default=5, help="Simulations to tag per race.")
+    parser.add_argument('--ftp', type=float, default=float(os.getenv('XERT_FTP', 0)) or None,
+                        help="Reference power for the zone features (default: $XERT_FTP, else median race NP).")
+    parser.add_argument('--csv', action='store_true', default=None, help="Also export a CSV copy (or set INTERVALS_EXPORT_CSV=1).")
+    args = parser.parse_args()
+    instrument.enable_from_env('find_race_simulations')
+
+    if not table_exists(RACE_FILE):
+        print(f"Error: {RACE_FILE} not found. Please run main.py first.")
+        sys.exit(1)
+    store = TrackpointStore(TRACKPOINT_DIR)
+    if not len(store):
+        print(f"Error: trackpoint store '{TRACKPOINT_DIR}' is empty. Please run analyze_xert_tcx.py first.")
+        sys.exit(1)
+
+    df_race = read_table(RACE_FILE)
+
+    # The race ride is the longest stored ride on the race date
+    rides_by_date = {}
+    for entry in store.entries():
+        best = rides_by_date.get(entry['date'])
+        if best is None or entry['length'] > best['length']:
+            rides_by_date[entry['date']] = entry
+    races = df_race[df_race['Date'].isin(rides_by_date)]
+    print(f"{len(races)} of {len(df_race)} races have a ride in the trackpoint store.")
+    if races.empty:
+        return
+
+    ref_power = args.ftp
+    if not ref_power:
+        race_np = [race_profile(store, rides_by_date[d]['key'], rides_by_date[d]['length'] / 60, 1.0)[0] for d in races['Date']]
+        ref_power = float(np.nanmedian([p[FEATURE_NAMES.index('normalized_power')] for p in race_np if p is not None]))
+    print(f"Reference power: {ref_power:.0f} W")
+
+    index = SimulationIndex()
+    # Keyed on the content hash, so compacting the store does not invalidate the index
+    signatures = {path: entry['sha256'] for path, entry in Manifest(MANIFEST_FILE).files.items()}
+    with instrument.timer('index.update'):
+        updated = index.update(store, ref_power, signatures)
+    instrument.count('index.rides_updated', updated)
+    instrument.count('index.rides_cached', len(index.keys) - updated)
+    index.save()
+    print(f"Indexed {updated} new or changed rides ({len(index.keys)} rides, {len(index.features)} windows).")
+
+    race_keys = {rides_by_date[d]['key'] for d in df_race['Date'] if d in rides_by_date}
+    rows = []
+    query_start = time.perf_counter()
+    for _, race in races.iterrows():
+        entry = rides_by_date[race['Date']]
+        race_minutes = race.get('Moving Time (minutes)', entry['length'] / 60)
+        profile, window_minutes = race_profile(store, entry['key'], race_minutes, ref_power)
+        if profile is None:
+            continue
+        for rank, (key, date, start, distance, features) in enumerate(index.top_k(profile, window_minutes, args.k, race_keys), start=1):
+            f = dict(zip(FEATURE_NAMES, features))
+            rows.append({
+                'Date': date,
+                'Name': f"Simulation of {race.get('Name', race['Date'])}",
+                'Race Simulation': True,
+                'Simulation Of': race.get('Activity ID', race['Date']),
+                'Simulation Rank': rank,
+                'Simulation Distance': round(distance, 3),
+                'Window Start (minutes)': round(start / 60, 1),
+                'Xert_Avg_Power': round(f['mean_power'], 1),
+                'Xert_NP': round(f['normalized_power'], 1),
+                'Xert_VI': round(f['variability_index'], 3),
+                'Xert_Avg_HR': round(f['mean_hr'], 1) if np.isfinite(f['mean_hr']) else None,
+                'Xert_Duration_Min': window_minutes,
+                'Xert_Filename': os.path.basename(key),
+            })
+    query_time = time.perf_counter() - query_start
+
+    if rows:
+        df = pd.DataFrame(rows)
+        written = write_table(df, OUTPUT_FILE, csv=args.csv)
+        print(f"Tagged {len(df)} simulations for {len(races)} races in {query_time:.2f} seconds.")
+        print(f"Saved simulations to {', '.join(written)}")
+    else:
+        print("No race simulations found.")
+
+if __name__ == "__main__":
+    main()
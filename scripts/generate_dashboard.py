@@ -10,6 +10,13 @@ Description:
     - Strong Negative Correlations (Red)
     - Neutral/Weak Correlations (Gray)
 
+    Error bars show bootstrap 95% confidence intervals; metrics whose
+    permutation p-value stays below 0.05 after multiple-testing correction are
+    marked with '*' (see intervals_agent/correlation.py).
+
+    The 300-dpi image is only re-rendered when the correlations behind it
+    change (see intervals_agent/render.py).
+
 Usage:
     python scripts/generate_dashboard.py
 
@@ -17,26 +24,65 @@ Output:
     Saves 'xert_correlation_dashboard.jpg' in the 'figures/' directory.
 """
 
-import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from intervals_agent.correlation import correlate
+from intervals_agent.tables import read_table, table_exists
+from intervals_agent.render import FigureJob, render
+from intervals_agent import instrument
 
 # --- Configuration ---
-INPUT_FILE = 'race_analysis_with_xert.csv'
+INPUT_FILE = 'race_analysis_with_xert.parquet'
 OUTPUT_DIR = 'figures'
 OUTPUT_FILENAME = 'xert_correlation_dashboard.jpg'
+SIGNIFICANCE_LEVEL = 0.05
+
+def draw_dashboard(result, style):
+    """Bar chart of r per metric with bootstrap CI error bars; '*' marks significant metrics."""
+    perf_correlations = result['pearson_r']
+    errors = [perf_correlations - result['pearson_ci_low'], result['pearson_ci_high'] - perf_correlations]
+    significant = result['pearson_p_adj'] < style['significance_level']
+    
+    # --- Create Dashboard Figure (Bar Chart) ---
+    fig = plt.figure(figsize=(10, 6))
+    
+    # Color logic: Strong Positive (>0.3), Strong Negative (<-0.3), Neutral
+    colors = ['#2ecc71' if x > 0.3 else '#e74c3c' if x < -0.3 else '#95a5a6' for x in perf_correlations.values]
+    
+    ax = perf_correlations.plot(kind='bar', color=colors, yerr=errors, capsize=4, ecolor='#34495e')
+    
+    plt.title('Correlation with Race Performance Score (Xert Metrics)', fontsize=14, pad=20)
+    plt.ylabel('Correlation Coefficient (r)', fontsize=12)
+    plt.xlabel('Metric', fontsize=12)
+    plt.axhline(0, color='black', linewidth=0.8)
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+    plt.ylim(-1.1, 1.1)
+    
+    # Add numeric labels next to the bars ('*' = significant after correction)
+    for i, (v, sig) in enumerate(zip(perf_correlations, significant)):
+        y_pos = v + (0.05 if v > 0 else -0.1)
+        ax.text(i, y_pos, f"{v:.2f}{'*' if sig else ''}", ha='center', fontweight='bold')
+    plt.figtext(0.99, 0.01, f"Error bars: bootstrap 95% CI. * adjusted p < {style['significance_level']}",
+                ha='right', fontsize=8, color='#555555')
+        
+    plt.tight_layout()
+    return fig
 
 def main():
-    if not os.path.exists(INPUT_FILE):
+    instrument.enable_from_env('generate_dashboard')
+    if not table_exists(INPUT_FILE):
         print(f"Error: {INPUT_FILE} not found. Please run merge_xert_data.py first.")
-        return
+        sys.exit(1)
 
     # Ensure output directory exists
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
 
     try:
-        df = pd.read_csv(INPUT_FILE)
+        df = read_table(INPUT_FILE)
         
         # Filter for rows that have both Performance Score and Xert data
         # We need at least 2 points for a correlation
@@ -52,43 +98,41 @@ def main():
             'Xert_Avg_Power',
             'Xert_Max_HR',
             'Xert_Avg_HR',
-            'Xert_Duration_Min'
+            'Xert_Duration_Min',
+            'Xert_NP',
+            'Xert_IF',
+            'Xert_TSS',
+            'Xert_Decoupling_Pct',
+            'Xert_MMP_1min',
+            'Xert_MMP_5min',
+            'Xert_MMP_20min',
+            'Xert_Best_MMP_5min_60d',
+            'Xert_Best_MMP_20min_60d'
         ]
+        # Older datasets may not have the physiology or best-effort columns yet
+        metrics = [m for m in metrics if m in df_analyzable.columns]
         
-        # Calculate correlation matrix
-        corr_matrix = df_analyzable[metrics].corr()
-        
-        # Extract correlations with Performance Score, drop the score itself
-        perf_correlations = corr_matrix['Performance Score'].drop('Performance Score').sort_values(ascending=False)
-        
-        # --- Create Dashboard Figure (Bar Chart) ---
-        plt.figure(figsize=(10, 6))
-        
-        # Color logic: Strong Positive (>0.3), Strong Negative (<-0.3), Neutral
-        colors = ['#2ecc71' if x > 0.3 else '#e74c3c' if x < -0.3 else '#95a5a6' for x in perf_correlations.values]
-        
-        ax = perf_correlations.plot(kind='bar', color=colors)
-        
-        plt.title('Correlation with Race Performance Score (Xert Metrics)', fontsize=14, pad=20)
-        plt.ylabel('Correlation Coefficient (r)', fontsize=12)
-        plt.xlabel('Metric', fontsize=12)
-        plt.axhline(0, color='black', linewidth=0.8)
-        plt.grid(axis='y', linestyle='--', alpha=0.7)
-        plt.ylim(-1, 1)
-        
-        # Add numeric labels on top of bars
-        for i, v in enumerate(perf_correlations):
-            y_pos = v + (0.05 if v > 0 else -0.1)
-            ax.text(i, y_pos, f"{v:.2f}", ha='center', fontweight='bold')
-            
-        plt.tight_layout()
+        # Correlations with Performance Score, with bootstrap CIs and adjusted p-values
+        with instrument.timer('correlate'):
+            result = correlate(df_analyzable, 'Performance Score', metrics[1:])
+        result = result.dropna(subset=['pearson_r']).sort_values('pearson_r', ascending=False)
+        if result.empty:
+            print("Not enough matching data to calculate correlations.")
+            return
         
         output_path = os.path.join(OUTPUT_DIR, OUTPUT_FILENAME)
-        plt.savefig(output_path, dpi=300, format='jpg')
-        print(f"Dashboard figure saved to: {output_path}")
+        data = result[['pearson_r', 'pearson_ci_low', 'pearson_ci_high', 'pearson_p_adj']]
+        job = FigureJob(output_path, draw_dashboard, data, style={'significance_level': SIGNIFICANCE_LEVEL},
+                        savefig={'dpi': 300, 'format': 'jpg'})
+        rendered, _ = render([job])
+        if rendered:
+            print(f"Dashboard figure saved to: {output_path}")
+        else:
+            print(f"Dashboard unchanged: {output_path}")
 
     except Exception as e:
         print(f"An error occurred: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
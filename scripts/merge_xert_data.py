@@ -2,71 +2,172 @@
 Xert Data Merger
 
 Description:
-    This script merges the processed Xert metrics ('xert_metrics.csv') into the main
-    race analysis dataset ('race_analysis.csv').
+    This script merges the processed Xert metrics ('xert_metrics.parquet') into the main
+    race analysis dataset ('race_analysis.parquet'). Both are typed tables (see
+    intervals_agent/tables.py), so no dtypes or dates are re-inferred; older
+    CSV outputs are read if the Parquet files do not exist yet.
 
-    It handles data aggregation for days with multiple Xert files (taking Max Power,
-    Sum Duration, etc.) and performs a left join on the 'Date' column.
+    Each Xert file is matched to the race whose start/end time it overlaps
+    (see intervals_agent/matching.py), so warm-ups, cool-downs and the other
+    ride of a double-activity day stay out of the race's metrics. When several
+    files cover one race (e.g. a recording split in two) they are combined,
+    weighted by duration (Max Power, summed Duration, duration-weighted
+    averages, etc.).
+
+    Races or files without start/end times (tables written by older versions)
+    fall back to the previous join on 'Date', combining every such file of
+    the day. 'Xert_Match' records which join was used for each race.
+
+    Each race also gets its pre-race best efforts from the best-efforts index
+    ('best_efforts.npz', written by analyze_xert_tcx.py, see
+    intervals_agent/efforts.py): the best mean-maximal power and HR at 5 s to
+    60 min in the N days before the race day, e.g. 'Xert_Best_MMP_5min_60d'.
 
 Usage:
-    python scripts/merge_xert_data.py
+    python scripts/merge_xert_data.py [--csv] [--effort-windows 28,60]
 
 Output:
-    Saves 'race_analysis_with_xert.csv' in the project root.
+    Saves 'race_analysis_with_xert.parquet' in the project root (plus a CSV copy with --csv).
 """
 
+import argparse
+import numpy as np
 import pandas as pd
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from intervals_agent.tables import read_table, write_table, table_exists
+from intervals_agent.matching import to_epoch, assign_files, aggregate_by
+from intervals_agent.efforts import BestEffortsIndex, EFFORT_WINDOWS_DAYS
+from intervals_agent import instrument
 
 # --- Configuration ---
-RACE_FILE = 'race_analysis.csv'
-XERT_FILE = 'xert_metrics.csv'
-OUTPUT_FILE = 'race_analysis_with_xert.csv'
+RACE_FILE = 'race_analysis.parquet'
+XERT_FILE = 'xert_metrics.parquet'
+OUTPUT_FILE = 'race_analysis_with_xert.parquet'
+EFFORTS_FILE = 'best_efforts.npz'
+WEIGHT_COLUMN = 'Xert_Duration_Min'
+
+def times(df, start_column, end_column):
+    """Start/end epoch seconds of each row (NaN if the columns are missing, e.g. older tables)."""
+    if start_column not in df or end_column not in df:
+        return np.full(len(df), np.nan), np.full(len(df), np.nan)
+    return to_epoch(df[start_column]), to_epoch(df[end_column])
+
+def combine(files, key, aggregation):
+    """Aggregates the files of each key value, adding the number of files combined."""
+    combined = aggregate_by(files, key, aggregation, WEIGHT_COLUMN)
+    counts = files.groupby(key).size().rename('Xert_Files').reset_index()
+    combined = combined.merge(counts, on=key)
+    # VI of combined files is the combined NP over the combined average power
+    if {'Xert_VI', 'Xert_NP', 'Xert_Avg_Power'} <= set(combined.columns):
+        several = combined['Xert_Files'] > 1
+        combined.loc[several, 'Xert_VI'] = (combined['Xert_NP'] / combined['Xert_Avg_Power'])[several].round(3)
+    return combined
 
 def main():
-    if not os.path.exists(RACE_FILE):
+    parser = argparse.ArgumentParser(description="Merge Xert metrics into the race analysis dataset.")
+    parser.add_argument('--csv', action='store_true', default=None, help="Also export a CSV copy (or set INTERVALS_EXPORT_CSV=1).")
+    parser.add_argument('--effort-windows', default=','.join(map(str, EFFORT_WINDOWS_DAYS)),
+                        help="Comma-separated days before each race for the best-effort columns (default: %(default)s).")
+    args = parser.parse_args()
+    instrument.enable_from_env('merge_xert_data')
+
+    if not table_exists(RACE_FILE):
         print(f"Error: {RACE_FILE} not found. Please run main.py first.")
-        return
-    if not os.path.exists(XERT_FILE):
+        sys.exit(1)
+    if not table_exists(XERT_FILE):
         print(f"Error: {XERT_FILE} not found. Please run analyze_xert_tcx.py first.")
-        return
+        sys.exit(1)
 
     print("Reading files...")
-    df_race = pd.read_csv(RACE_FILE)
-    df_xert = pd.read_csv(XERT_FILE)
-
-    # Ensure Date columns are string type for reliable merging
-    df_race['Date'] = df_race['Date'].astype(str)
-    df_xert['Date'] = df_xert['Date'].astype(str)
-
-    print("Aggregating Xert data by Date...")
-    # Aggregation Strategy:
-    # - Max Power/HR: Take the peak value seen in any file that day.
-    # - Avg Power/HR: Take the mean of averages (approximation).
-    # - Duration: Sum of all durations.
-    df_xert_daily = df_xert.groupby('Date').agg({
+    # Date is an ISO string column in both schemas, so the join needs no conversion
+    with instrument.timer('read_tables'):
+        df_race = read_table(RACE_FILE).reset_index(drop=True)
+        df_xert = read_table(XERT_FILE).reset_index(drop=True)
+
+    # Aggregation Strategy (files of one race, weighted by duration):
+    # - Max Power/HR, VI, MMP: Take the peak value seen in any file.
+    # - Avg Power/HR, Decoupling: Duration-weighted mean.
+    # - NP/IF: Duration-weighted 4th-power mean (how NP itself averages).
+    # - Duration, TSS: Sum.
+    aggregation = {
         'Xert_Max_Power': 'max',
-        'Xert_Avg_Power': 'mean',
+        'Xert_Avg_Power': 'wmean',
         'Xert_Max_HR': 'max',
-        'Xert_Avg_HR': 'mean',
-        'Xert_Duration_Min': 'sum'
-    }).reset_index()
+        'Xert_Avg_HR': 'wmean',
+        'Xert_Duration_Min': 'sum',
+        'Xert_NP': 'wpow4',
+        'Xert_VI': 'max',
+        'Xert_IF': 'wpow4',
+        'Xert_TSS': 'sum',
+        'Xert_Decoupling_Pct': 'wmean',
+    }
+    aggregation.update({c: 'max' for c in df_xert.columns if c.startswith('Xert_MMP_')})
+    # Older xert_metrics files may not have the physiology columns yet
+    aggregation = {c: how for c, how in aggregation.items() if c in df_xert.columns}
+
+    print("Matching Xert files to races by start/end time...")
+    with instrument.timer('match'):
+        race_start, race_end = times(df_race, 'Start (UTC)', 'End (UTC)')
+        file_start, file_end = times(df_xert, 'Xert_Start', 'Xert_End')
+        assigned = assign_files(race_start, race_end, file_start, file_end)
+    race_timed = np.isfinite(race_start) & np.isfinite(race_end)
+    file_timed = np.isfinite(file_start) & np.isfinite(file_end)
+
+    with instrument.timer('aggregate'):
+        matched = combine(df_xert[assigned >= 0].assign(_race=assigned[assigned >= 0]), '_race', aggregation)
+        matched['Xert_Match'] = 'overlap'
+
+        # Date fallback for races not matched by time: untimed races take every file of
+        # their day that no race took by time, timed races only untimed files (timed ones
+        # that did not overlap the race are other rides, not missing matches)
+        unmatched = df_race.index[~df_race.index.isin(matched['_race'])]
+        fallback = []
+        used_by_date = np.zeros(len(df_xert), dtype=bool)
+        for timed, available in ((False, assigned < 0), (True, ~file_timed)):
+            races = df_race.loc[unmatched[race_timed[unmatched] == timed], ['Date']]
+            available = available & df_xert['Date'].isin(races['Date']).to_numpy()
+            if races.empty or not available.any():
+                continue
+            used_by_date |= available
+            daily = combine(df_xert[available], 'Date', aggregation)
+            fallback.append(races.reset_index(names='_race').merge(daily, on='Date').drop(columns='Date'))
+        by_date = pd.concat(fallback, ignore_index=True) if fallback else matched.iloc[:0].copy()
+        by_date['Xert_Match'] = 'date'
 
     print("Merging data...")
     # Left join ensures we keep all races from the main analysis, adding Xert data only where available.
-    df_merged = pd.merge(df_race, df_xert_daily, on='Date', how='left')
+    with instrument.timer('merge'):
+        per_race = pd.concat([matched, by_date], ignore_index=True).set_index('_race')
+        df_merged = df_race.join(per_race)
+
+    if os.path.exists(EFFORTS_FILE):
+        windows = [int(days) for days in args.effort_windows.split(',') if days.strip()]
+        with instrument.timer('best_efforts'):
+            efforts = BestEffortsIndex(EFFORTS_FILE).pre_race(df_merged['Date'], windows)
+            df_merged = pd.concat([df_merged, efforts.set_axis(df_merged.index)], axis=1)
+        print(f"Added pre-race best efforts over {', '.join(f'{days}d' for days in windows)} "
+              f"from {EFFORTS_FILE} ({len(efforts.columns)} columns).")
 
     # Save the merged file
-    df_merged.to_csv(OUTPUT_FILE, index=False)
-    
+    with instrument.timer('write_table'):
+        written = write_table(df_merged, OUTPUT_FILE, csv=args.csv)
+
     # Validation stats
     total_races = len(df_race)
     matched_races = df_merged['Xert_Max_Power'].notna().sum()
-    
-    print(f"Successfully saved merged data to {OUTPUT_FILE}")
+    # Timed files on a race day that no race took, by time or by date
+    left_out = int((file_timed & (assigned < 0) & ~used_by_date & df_xert['Date'].isin(df_race['Date']).to_numpy()).sum())
+
+    print(f"Successfully saved merged data to {', '.join(written)}")
     print(f"Total Races: {total_races}")
-    print(f"Races with matching Xert data: {matched_races}")
-    
+    print(f"Races with matching Xert data: {matched_races} "
+          f"({(df_merged['Xert_Match'] == 'overlap').sum()} by time overlap, {(df_merged['Xert_Match'] == 'date').sum()} by date)")
+    if left_out:
+        print(f"Left out {left_out} file(s) recorded on race days outside the race (warm-ups, cool-downs, other rides).")
+
     if matched_races > 0:
         print("\nFirst 5 rows with matching Xert data:")
         print(df_merged[df_merged['Xert_Max_Power'].notna()].head()[['Date', 'Name', 'Performance Score', 'Xert_Max_Power', 'Xert_Duration_Min']])
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The package, the synthetic data and mock server, and the scripts are imported from the checkout
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'benchmarks'), os.path.join(ROOT, 'scripts')):
+    sys.path.insert(0, path)
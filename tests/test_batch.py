@@ -0,0 +1,26 @@
+import pytest
+
+from run_batch import read_roster
+
+
+def write_roster(tmp_path, *rows):
+    path = tmp_path / 'roster.csv'
+    path.write_text('athlete_id,api_key,name\n' + ''.join(row + '\n' for row in rows), encoding='utf-8')
+    return str(path)
+
+
+def test_reads_the_roster(tmp_path):
+    roster = read_roster(write_roster(tmp_path, 'i123,$KEY_A,Alice', '# comment', '', 'i_4-5,abc,'))
+    assert roster == [{'athlete_id': 'i123', 'api_key': '$KEY_A', 'name': 'Alice'},
+                      {'athlete_id': 'i_4-5', 'api_key': 'abc', 'name': 'i_4-5'}]
+
+
+@pytest.mark.parametrize('athlete_id', ['../x', '..', 'a/b', 'a\\b', '/etc', 'i1 2', 'i1.2'])
+def test_rejects_ids_that_are_not_plain_folder_names(tmp_path, athlete_id):
+    with pytest.raises(ValueError, match='invalid athlete ID'):
+        read_roster(write_roster(tmp_path, 'i1,k,', f'"{athlete_id}",k,'))
+
+
+def test_rejects_duplicates(tmp_path):
+    with pytest.raises(ValueError, match='more than once'):
+        read_roster(write_roster(tmp_path, 'i1,k,', 'i1,k2,'))
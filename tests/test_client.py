@@ -0,0 +1,64 @@
+import json
+
+import pytest
+import requests
+
+from intervals_agent.client import IntervalsClient, TokenBucket, iter_json_array
+from mock_api import synthetic_server
+
+
+def make_client(server, max_retries=5):
+    """A client for the mock server with no rate limit and near-zero backoff."""
+    return IntervalsClient('i1', 'key', base_url=server.base_url, rate_limiter=TokenBucket(rate=1e6),
+                           max_retries=max_retries, backoff=0.001)
+
+
+def test_retries_throttled_and_failed_requests():
+    params = {'oldest': '0000-00-00', 'newest': '9999-99-99'}
+    with synthetic_server(10, latency=0, throttle=0.3, errors=0.3, seed=1) as server, \
+            make_client(server, max_retries=20) as client:
+        for _ in range(5):
+            assert client.get_json('activities', params) == server.activities
+        assert server.throttled and server.failed
+        assert server.requests == 5 + server.throttled + server.failed
+
+
+@pytest.mark.parametrize('fault', ['throttle', 'errors'])
+def test_gives_up_after_max_retries(fault):
+    with synthetic_server(1, latency=0, **{fault: 1.0}) as server, make_client(server, max_retries=3) as client:
+        with pytest.raises(requests.HTTPError) as excinfo:
+            client.get_json('activities')
+        assert excinfo.value.response.status_code == (429 if fault == 'throttle' else 503)
+        assert server.requests == 4
+
+
+def test_iter_json_streams_the_activity_list():
+    with synthetic_server(10, latency=0) as server, make_client(server) as client:
+        assert list(client.iter_json('activities', {'fields': 'id,type'})) == \
+            [{'id': a['id'], 'type': a['type']} for a in server.activities]
+
+
+def chunks(text, size):
+    data = text.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 1000])
+def test_iter_json_array_any_chunking(size):
+    items = [{'name': 'Zwift – Côte', 'watts': [250, 301.5, None]}, 12345, 'a,]b', [], {}, True, -0.5]
+    assert list(iter_json_array(chunks(json.dumps(items), size))) == items
+
+
+def test_iter_json_array_empty_and_whitespace():
+    assert list(iter_json_array(chunks(' [ \n ] ', 1))) == []
+
+
+@pytest.mark.parametrize('text', ['[1, 2', '[{"a": 1}', '', '[12'])
+def test_iter_json_array_truncated(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunks(text, 3)))
+
+
+def test_iter_json_array_not_an_array():
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunks('{"a": 1}', 4)))
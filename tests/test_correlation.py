@@ -0,0 +1,96 @@
+from itertools import permutations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from intervals_agent.correlation import correlate, adjust_pvalues, _prepare, _bootstrap_ci, BATCH_SIZE
+
+
+def sample_frame(n=30, seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.normal(size=n)
+    df = pd.DataFrame({'Performance Score': y, 'strong': y * 2 + rng.normal(scale=0.5, size=n),
+                       'weak': rng.normal(size=n), 'gappy': y + rng.normal(size=n)})
+    df.loc[rng.choice(n, 8, replace=False), 'gappy'] = np.nan
+    df.loc[3, 'Performance Score'] = np.nan
+    return df
+
+
+def test_coefficients_match_pandas_pairwise():
+    df = sample_frame()
+    result = correlate(df, 'Performance Score', n_boot=10, n_perm=10)
+    rows = df[df['Performance Score'].notna()]
+    for feature in ('strong', 'weak', 'gappy'):
+        pairs = rows[[feature, 'Performance Score']].dropna()
+        assert result.loc[feature, 'n'] == len(pairs)
+        assert result.loc[feature, 'pearson_r'] == pytest.approx(pairs.corr().iloc[0, 1])
+        assert result.loc[feature, 'spearman_rho'] == pytest.approx(pairs.corr(method='spearman').iloc[0, 1])
+
+
+def test_too_few_pairs_give_nan():
+    df = pd.DataFrame({'Performance Score': [1.0, 2.0, 3.0, 4.0], 'x': [1.0, np.nan, np.nan, 2.0],
+                       'flat': [5.0, 5.0, 5.0, 5.0]})
+    result = correlate(df, 'Performance Score', n_boot=10, n_perm=10)
+    assert result[['pearson_r', 'pearson_p', 'pearson_ci_low']].isna().all().all()
+
+
+def test_permutation_p_matches_full_enumeration():
+    x = np.array([1.0, 2.5, 2.0, 4.0, 3.0, 6.0, 5.5])
+    y = np.array([1.2, 1.9, 3.1, 3.8, 5.2, 5.9, 7.1])
+    r = np.corrcoef(x, y)[0, 1]
+    exact = np.mean([abs(np.corrcoef(x, np.array(p))[0, 1]) >= abs(r) - 1e-12 for p in permutations(y)])
+    result = correlate(pd.DataFrame({'Performance Score': y, 'x': x}), 'Performance Score', n_boot=10,
+                       n_perm=20000)
+    assert result.loc['x', 'pearson_p'] == pytest.approx(exact, abs=0.005)
+
+
+def test_bootstrap_matches_resampling_rows():
+    df = sample_frame(n=12, seed=1)
+    X = df[['strong', 'gappy']].to_numpy()
+    Y = np.broadcast_to(df['Performance Score'].to_numpy()[:, None], X.shape)
+    n_boot = BATCH_SIZE + 50
+    low, high = _bootstrap_ci(*_prepare(X, Y), n_boot, 0.9, np.random.default_rng(7))
+
+    rng = np.random.default_rng(7)
+    weights = np.concatenate([rng.multinomial(len(X), np.full(len(X), 1 / len(X)), size=size)
+                              for size in (BATCH_SIZE, 50)])
+    for column in range(X.shape[1]):
+        complete = np.isfinite(X[:, column]) & np.isfinite(Y[:, column])
+        samples = []
+        for w in weights:
+            rows = np.repeat(np.flatnonzero(complete), w[complete])
+            x, y = X[rows, column], Y[rows, column]
+            samples.append(np.corrcoef(x, y)[0, 1] if len(rows) >= 3 and x.std() > 0 and y.std() > 0 else np.nan)
+        assert (low[column], high[column]) == pytest.approx(tuple(np.nanquantile(samples, [0.05, 0.95])))
+
+
+def brute_adjust(p, method):
+    """Textbook BH / Holm / Bonferroni over the finite p-values."""
+    tested = [i for i in range(len(p)) if np.isfinite(p[i])]
+    m, out = len(tested), np.full(len(p), np.nan)
+    ranked = sorted(tested, key=lambda i: p[i])
+    for k, i in enumerate(ranked):
+        if method == 'bonferroni':
+            out[i] = p[i] * m
+        elif method == 'holm':
+            out[i] = max(p[j] * (m - kk) for kk, j in enumerate(ranked[:k + 1]))
+        else:
+            out[i] = min(p[j] * m / (kk + 1) for kk, j in enumerate(ranked) if kk >= k)
+    return np.minimum(out, 1.0)
+
+
+@pytest.mark.parametrize('method', ['fdr_bh', 'holm', 'bonferroni'])
+def test_adjusted_p_values_match_the_textbook_procedures(method):
+    p = np.random.default_rng(3).uniform(0, 0.2, 15)
+    p[[2, 9]] = np.nan
+    p[5] = p[6]  # A tie
+    assert np.allclose(adjust_pvalues(p, method), brute_adjust(p, method), equal_nan=True)
+
+
+def test_adjusted_p_values_reference():
+    p = [0.01, 0.04, 0.03, 0.005]
+    assert adjust_pvalues(p, 'fdr_bh') == pytest.approx([0.02, 0.04, 0.04, 0.02])
+    assert adjust_pvalues(p, 'holm') == pytest.approx([0.03, 0.06, 0.06, 0.02])
+    with pytest.raises(ValueError):
+        adjust_pvalues(p, 'sidak')
@@ -0,0 +1,98 @@
+import shutil
+
+import numpy as np
+
+import synthetic
+import analyze_xert_tcx
+from analyze_xert_tcx import skip_identical, copy_entry, ingest_ride, source_sha256
+from intervals_agent.manifest import Manifest
+from intervals_agent.dedup import ride_fingerprint, find_duplicates, is_near
+
+
+def ride_files(tmp_path):
+    """a.tcx, its byte-for-byte copy b.tcx, and the same bytes named a.fit."""
+    paths = [str(tmp_path / name) for name in ('a.tcx', 'b.tcx', 'a.fit')]
+    synthetic.write_tcx(paths[0], 600, seed=1)
+    for path in paths[1:]:
+        shutil.copy(paths[0], path)
+    return paths
+
+
+def test_identical_content_is_only_shared_within_a_format(tmp_path):
+    tcx, copy, fit = ride_files(tmp_path)
+    unique, identical, hashes = skip_identical(Manifest(str(tmp_path / 'manifest.json')), [tcx, copy, fit])
+    assert unique == [tcx, fit]
+    assert identical == {copy: tcx}
+    assert hashes[tcx] == hashes[fit] == source_sha256(tcx)
+
+
+def test_already_parsed_files_are_matched_by_hash_and_format(tmp_path):
+    tcx, copy, fit = ride_files(tmp_path)
+    manifest = Manifest(str(tmp_path / 'manifest.json'))
+    manifest.update(*ingest_ride(tcx)[1])
+    unique, identical, _ = skip_identical(manifest, [copy, fit])
+    assert unique == [fit]
+    assert identical == {copy: tcx}
+
+
+def test_failed_parses_are_not_copied(tmp_path):
+    tcx, copy, fit = ride_files(tmp_path)
+    manifest = Manifest(str(tmp_path / 'manifest.json'))
+    path, record, _, error = ingest_ride(fit)
+    assert error is not None and record[4] is None
+    manifest.update(*record)
+    assert not copy_entry(manifest, tcx, fit)
+    assert tcx not in manifest.files
+
+    manifest.update(*ingest_ride(tcx)[1])
+    assert copy_entry(manifest, copy, tcx)
+    assert manifest.files[copy]['metrics']['Xert_Filename'] == 'b.tcx'
+    assert manifest.files[copy]['fingerprint'] == manifest.files[tcx]['fingerprint']
+
+
+def test_ingest_uses_the_given_hash(tmp_path, monkeypatch):
+    tcx = ride_files(tmp_path)[0]
+    sha256 = source_sha256(tcx)
+    monkeypatch.setattr(analyze_xert_tcx, 'source_sha256', None)  # Would raise if called
+    assert ingest_ride(tcx, sha256=sha256)[1][3] == sha256
+
+
+def test_the_same_ride_in_both_formats_is_an_exact_duplicate(tmp_path):
+    tcx, fit = str(tmp_path / 'ride.tcx'), str(tmp_path / 'ride.fit')
+    synthetic.write_tcx(tcx, 1800, seed=3)
+    synthetic.write_fit(fit, 1800, seed=3)
+    fingerprints = {path: ingest_ride(path)[1][6] for path in (tcx, fit)}
+    assert find_duplicates(fingerprints, stored={fit}) == {tcx: (fit, 'exact')}
+
+
+def test_fingerprint_of_out_of_order_timestamps():
+    times = np.array([1000.0, 400.0, 1200.0, 1300.0, np.nan])
+    fingerprint = ride_fingerprint({'time': times, 'power': np.array([100.0, 200.0, 150.0, np.nan, 90.0]),
+                                    'hr': np.full(5, 140.0)})
+    assert fingerprint['start'] == 1000
+    assert fingerprint['profile'][:2] == [400 // 120, 200]
+    assert len(fingerprint['profile']) == 1 + 1300 // 120 - 400 // 120 + 1
+
+
+def near_ride(start, samples, watts):
+    return {'start': start, 'samples': samples, 'digest': f'{start}', 'profile': [0] + [watts] * 4}
+
+
+def test_near_duplicates_are_not_chained():
+    # A ~ B and B ~ C (4 W apart), but A and C differ by 8 W
+    rides = {'a': near_ride(0, 1000, 100), 'b': near_ride(10, 990, 104), 'c': near_ride(20, 980, 108)}
+    assert find_duplicates(rides) == {'b': ('a', 'near')}
+    rides['b']['samples'] = 1010
+    assert find_duplicates(rides) == {'a': ('b', 'near'), 'c': ('b', 'near')}
+
+
+def test_every_dropped_ride_matches_its_kept_ride():
+    rng = np.random.default_rng(4)
+    rides = {f'r{i}': near_ride(int(rng.integers(0, 600)), int(rng.integers(950, 1050)), int(rng.integers(100, 130)))
+             for i in range(60)}
+    duplicates = find_duplicates(rides)
+    kept = sorted(set(rides) - set(duplicates))
+    for path, (other, kind) in duplicates.items():
+        assert other in kept and kind == 'near' and is_near(rides[path], rides[other])
+        assert rides[other]['samples'] >= rides[path]['samples']
+    assert not any(is_near(rides[a], rides[b]) for i, a in enumerate(kept) for b in kept[i + 1:])
@@ -0,0 +1,86 @@
+import numpy as np
+
+from intervals_agent.efforts import BestEffortsIndex, EFFORT_COLUMNS, day_numbers
+from intervals_agent.physiology import mean_max_hr, MIN_HR_COVERAGE
+from intervals_agent.trackpoints import TrackpointStore
+
+
+def index_of(tmp_path, dates, values):
+    index = BestEffortsIndex(str(tmp_path / 'best_efforts.npz'))
+    index.keys = np.array([f'ride{i}' for i in range(len(dates))])
+    index.dates, index.signatures = np.array(dates), np.array(index.keys)
+    index.values = np.asarray(values, dtype=np.float64)
+    index._build()
+    return index
+
+
+def brute_force_best(days, values, first, last):
+    """Column-wise maximum over the rides dated first..last, NaN if none has a value."""
+    best = np.full(values.shape[1], np.nan)
+    for day, row in zip(days, values):
+        if np.isfinite(day) and first <= day <= last:
+            best = np.fmax(best, row)
+    return best
+
+
+def test_best_between_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(5)
+    day_offsets = rng.integers(0, 200, 150)
+    dates = [str(np.datetime64('2024-01-01') + int(d)) for d in day_offsets] + ['', 'not a date']
+    values = rng.uniform(100, 900, (len(dates), len(EFFORT_COLUMNS)))
+    values[rng.random(values.shape) < 0.3] = np.nan
+    index = index_of(tmp_path, dates, values)
+
+    days = day_numbers(dates)
+    first = days[0] + rng.integers(-260, 260, 400)
+    last = first + rng.integers(-5, 120, 400)  # Includes reversed (empty) ranges
+    first[:3], last[:3] = np.nan, [days[0], np.nan, days[0]]
+    best = index.best_between(first, last)
+    for row, (lo, hi) in enumerate(zip(first, last)):
+        expected = brute_force_best(days, values, lo, hi)
+        assert np.array_equal(best[row], expected, equal_nan=True), (lo, hi)
+
+
+def test_best_before_leaves_out_the_race_day(tmp_path):
+    index = index_of(tmp_path, ['2024-03-01', '2024-03-10', '2024-03-11'],
+                     [[300.0] * len(EFFORT_COLUMNS), [250.0] * len(EFFORT_COLUMNS), [400.0] * len(EFFORT_COLUMNS)])
+    best = index.best_before(['2024-03-11', '2024-03-10', '2024-03-01', None], 10)
+    assert np.array_equal(best['Xert_Best_MMP_5s_10d'], [300.0, 300.0, np.nan, np.nan], equal_nan=True)
+
+
+def test_signatures_survive_compact(tmp_path):
+    store = TrackpointStore(str(tmp_path / 'store'))
+    ride = {'time': np.arange(600.0), 'power': np.full(600, 200.0), 'hr': np.full(600, 150.0)}
+    store.append([('a', '2024-01-01', ride)])
+    store.append([('b', '2024-01-02', ride)])
+    index = BestEffortsIndex(str(tmp_path / 'best_efforts.npz'))
+    assert index.update(store, {'a': 'sha-a', 'b': 'sha-b'}) == 2
+    store.remove(['a'])
+    store.compact()  # Moves b to a new segment and offset
+    assert index.update(store, {'b': 'sha-b'}) == 0
+    assert list(index.keys) == ['b']
+    assert index.update(store) == 1  # Without a signature the moved ride is recomputed
+
+
+def brute_force_mean_max_hr(hr, seconds):
+    best = None
+    for start in range(len(hr) - seconds + 1):
+        window = hr[start:start + seconds]
+        present = window[np.isfinite(window)]
+        if len(present) >= MIN_HR_COVERAGE * seconds:
+            best = max(best or -np.inf, present.mean())
+    return best
+
+
+def test_mean_max_hr_matches_brute_force():
+    rng = np.random.default_rng(6)
+    hr = rng.uniform(110, 180, 400)
+    hr[rng.random(400) < 0.08] = np.nan
+    hr[150:200] = np.nan  # No 5-minute window has enough HR
+    durations = {'5s': 5, '30s': 30, '1min': 60, '5min': 300, '10min': 600}
+    curve = mean_max_hr(hr, durations)
+    for label, seconds in durations.items():
+        expected = brute_force_mean_max_hr(hr, seconds)
+        assert (curve[label] is None) == (expected is None), label
+        if expected is not None:
+            assert np.isclose(curve[label], expected), label
@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+from intervals_agent.features import daily_wellness_frame, pre_race_features, WEIGHT_TOLERANCE_DAYS
+
+START = date(2023, 1, 1)
+
+
+def wellness_index(records):
+    return {entry['id']: entry for entry in records}
+
+
+def window_mean(index, race, days, field):
+    """Mean of the recorded (non-zero) values of field from `days` days before race through race day."""
+    values = [index[d][field] for d in ((race - timedelta(days=n)).isoformat() for n in range(days + 1))
+              if d in index and index[d].get(field)]
+    return np.mean(values) if values else np.nan
+
+
+def nearest_weights(index, race):
+    """The weights recorded closest to race (within the tolerance); several if equally close."""
+    found = [(abs((date.fromisoformat(d) - race).days), entry['weight']) for d, entry in index.items()
+             if entry.get('weight')]
+    found = [(gap, weight) for gap, weight in found if gap <= WEIGHT_TOLERANCE_DAYS]
+    if not found:
+        return {np.nan}
+    closest = min(gap for gap, _ in found)
+    return {weight for gap, weight in found if gap == closest}
+
+
+def test_matches_a_per_race_loop():
+    records = synthetic.wellness(200, seed=2, start=START)
+    records[40]['restingHR'] = 0  # Zero means "not recorded"
+    index = wellness_index(records)
+    races = [START + timedelta(days=n) for n in (0, 3, 45, 46, 120, 199, 230)]
+    features = pre_race_features(races, daily_wellness_frame(index), windows=(3, 7, 14))
+
+    for row, race in enumerate(races):
+        for days in (3, 7, 14):
+            assert features[f'Avg Resting HR ({days}-day pre-race)'][row] == \
+                pytest.approx(round(window_mean(index, race, days, 'restingHR'), 2), nan_ok=True)
+            assert features[f'Avg Sleep (hours, {days}-day pre-race)'][row] == \
+                pytest.approx(round(window_mean(index, race, days, 'sleepSecs') / 3600, 2), nan_ok=True)
+        day_before = index.get((race - timedelta(days=1)).isoformat(), {})
+        assert features['Fitness (CTL, day pre-race)'][row] == pytest.approx(day_before.get('ctl', np.nan), nan_ok=True)
+        weight = features['Weight (kg)'][row]
+        assert any(weight == w or (np.isnan(weight) and np.isnan(w)) for w in nearest_weights(index, race))
+
+
+def test_extra_columns_count_missing_days_and_deltas():
+    records = [{'id': f'2024-03-{d:02d}', 'restingHR': 50 + d, 'hrv': 60, 'sleepSecs': 28800} for d in (1, 2, 4, 8)]
+    features = pre_race_features(['2024-03-08'], daily_wellness_frame(wellness_index(records)), windows=(3, 7),
+                                 extra=True)
+    assert features['Missing Resting HR Days (3-day pre-race)'][0] == 3
+    assert features['Missing Resting HR Days (7-day pre-race)'][0] == 4
+    assert features['Resting HR Delta (3 vs 7-day)'][0] == pytest.approx(58 - (51 + 52 + 54 + 58) / 4)
+
+
+def test_ewma_skips_the_missing_days():
+    records = synthetic.wellness(60, seed=3, start=START)
+    race = date.fromisoformat(records[-1]['id'])
+    features = pre_race_features([race], daily_wellness_frame(wellness_index(records)), windows=(7,), ewm_spans=(10,))
+    expected = pd.Series([r['hrv'] for r in records]).ewm(span=10).mean().iloc[-1]
+    assert features['EWMA HRV (10-day span)'][0] == pytest.approx(round(expected, 2))
+
+
+def test_no_races_and_no_wellness():
+    assert pre_race_features([], daily_wellness_frame({})).empty
+    features = pre_race_features(['2024-01-10'], daily_wellness_frame({}))
+    assert features.isna().all().all()
@@ -0,0 +1,90 @@
+import struct
+
+import numpy as np
+import pytest
+
+import synthetic
+from intervals_agent.fit import decode_fit, FitError, FIT_EPOCH
+
+UINT8, UINT16, UINT32, ENUM = 0x02, 0x84, 0x86, 0x00
+T0 = 1_000_000_000  # FIT seconds
+
+
+def definition(local, global_number, fields, big=False, developer=()):
+    """A definition message; fields and developer fields are (number, size, base type) / (number, size, index)."""
+    endian = '>' if big else '<'
+    out = bytes([0x40 | (0x20 if developer else 0) | local, 0, int(big)])
+    out += struct.pack(endian + 'HB', global_number, len(fields)) + bytes(b for field in fields for b in field)
+    if developer:
+        out += bytes([len(developer)]) + bytes(b for field in developer for b in field)
+    return out
+
+
+def message(local, fmt, *values, big=False, compressed=None):
+    """A data message, with a compressed-timestamp header when compressed (the time offset) is given."""
+    header = 0x80 | (local << 5) | (compressed & 0x1F) if compressed is not None else local
+    return bytes([header]) + struct.pack(('>' if big else '<') + fmt, *values)
+
+
+def fit_file(body):
+    header = struct.pack('<BBHI4s', 14, 0x20, 2132, len(body), b'.FIT')
+    return header + struct.pack('<H', 0) + body + struct.pack('<H', 0)
+
+
+def first_file():
+    return fit_file(
+        definition(0, 0, [(4, 4, UINT32)]) + message(0, 'I', T0)
+        + definition(1, 20, [(253, 4, UINT32), (7, 2, UINT16), (3, 1, UINT8)])
+        + message(1, 'IHB', T0, 200, 140)
+        + message(1, 'IHB', T0 + 1, 0xFFFF, 141)              # No power
+        + definition(2, 21, [(0, 1, ENUM)]) + message(2, 'B', 3)  # An event between the records
+        + message(1, 'IHB', T0 + 2, 210, 0xFF)                # No HR
+        # Local type 3: big-endian records without a timestamp, enhanced speed and a 2-byte developer field
+        + definition(3, 20, [(7, 2, UINT16), (73, 4, UINT32), (6, 2, UINT16)], big=True, developer=[(0, 2, 0)])
+        + message(3, 'HIHH', 230, 5000, 4000, 0xABCD, big=True, compressed=(T0 + 5) & 0x1F)
+        + message(3, 'HIHH', 240, 0xFFFFFFFF, 4000, 0xABCD, big=True, compressed=(T0 + 6) & 0x1F)
+        + definition(0, 18, [(2, 4, UINT32)]) + message(0, 'I', T0 - 10)  # Local 0 redefined: session
+    )
+
+
+def second_file():
+    return fit_file(definition(0, 20, [(253, 4, UINT32), (4, 1, UINT8), (5, 4, UINT32)])
+                    + message(0, 'IBI', T0 + 100, 90, 123456))
+
+
+def test_decodes_every_message_kind():
+    start, streams = decode_fit(first_file() + second_file())
+    assert start == T0 - 10 + FIT_EPOCH  # The session start wins over file_id
+    assert np.array_equal(streams['time'] - FIT_EPOCH, [T0, T0 + 1, T0 + 2, T0 + 5, T0 + 6, T0 + 100])
+    assert np.array_equal(streams['power'], [200, np.nan, 210, 230, 240, np.nan], equal_nan=True)
+    assert np.array_equal(streams['hr'], [140, 141, np.nan, np.nan, np.nan, np.nan], equal_nan=True)
+    assert np.array_equal(streams['speed'], [np.nan, np.nan, np.nan, 5.0, 4.0, np.nan], equal_nan=True)
+    assert np.array_equal(streams['cadence'][-1:], [90]) and streams['distance'][-1] == 1234.56
+
+
+def test_truncated_file_keeps_the_records_before_the_cut():
+    start, streams = decode_fit(first_file()[:-19])  # Cut into the last record
+    assert np.array_equal(streams['power'], [200, np.nan, 210, 230], equal_nan=True)
+    assert start == T0 + FIT_EPOCH  # No session any more: file_id
+
+
+def test_matches_the_synthetic_ride(tmp_path):
+    path = tmp_path / 'ride.fit'
+    synthetic.write_fit(str(path), 600, seed=2)
+    start, streams = decode_fit(path.read_bytes())
+    samples = synthetic.ride_samples(600, seed=2)
+    expected_start = (synthetic.ride_start(2) - synthetic.FIT_EPOCH).total_seconds() + FIT_EPOCH
+    assert start == expected_start
+    assert np.array_equal(streams['time'], expected_start + np.arange(600))
+    assert np.array_equal(streams['power'], [np.nan if w is None else w for w, _, _, _ in samples], equal_nan=True)
+    assert np.array_equal(streams['hr'], [np.nan if h is None else h for _, h, _, _ in samples], equal_nan=True)
+    assert np.array_equal(streams['cadence'], [c for _, _, c, _ in samples])
+    assert np.allclose(streams['distance'], [d for _, _, _, d in samples])
+    assert (streams['speed'] == 9.0).all()
+
+
+def test_rejects_other_files():
+    with pytest.raises(FitError):
+        decode_fit(b'<?xml version="1.0"?><TrainingCenterDatabase/>')
+    with pytest.raises(FitError, match='undefined local type'):
+        decode_fit(fit_file(message(5, 'B', 1)))
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from intervals_agent.matching import aggregate_by, overlap_pairs, assign_files
+
+
+def test_sums_of_groups_without_values_stay_nan():
+    df = pd.DataFrame({'Date': ['2024-01-01', '2024-01-01', '2024-01-02', '2024-01-02'],
+                       'Xert_TSS': [50.0, np.nan, np.nan, np.nan],
+                       'Xert_Max_Power': [400.0, 420.0, np.nan, 380.0],
+                       'Xert_Duration_Min': [60.0, 30.0, 45.0, 15.0]})
+    out = aggregate_by(df, 'Date', {'Xert_TSS': 'sum', 'Xert_Max_Power': 'max', 'Xert_Duration_Min': 'sum'},
+                       'Xert_Duration_Min').set_index('Date')
+    assert out.loc['2024-01-01', 'Xert_TSS'] == 50.0
+    assert np.isnan(out.loc['2024-01-02', 'Xert_TSS'])
+    assert out['Xert_Duration_Min'].tolist() == [90.0, 60.0]
+    assert out['Xert_Max_Power'].tolist() == [420.0, 380.0]
+
+
+def test_weighted_mean_ignores_missing_values():
+    df = pd.DataFrame({'Date': ['d', 'd', 'd'], 'Xert_Avg_HR': [150.0, 160.0, np.nan],
+                       'Xert_Duration_Min': [30.0, 10.0, 60.0]})
+    out = aggregate_by(df, 'Date', {'Xert_Avg_HR': 'wmean'}, 'Xert_Duration_Min')
+    assert out['Date'].tolist() == ['d']
+    assert np.isclose(out['Xert_Avg_HR'].iloc[0], 152.5)
+
+
+def brute_overlaps(race_start, race_end, file_start, file_end):
+    pairs = set()
+    for r, (rs, re) in enumerate(zip(race_start, race_end)):
+        for f, (fs, fe) in enumerate(zip(file_start, file_end)):
+            overlap = min(re, fe) - max(rs, fs)
+            if np.isfinite([rs, re, fs, fe]).all() and overlap > 0:
+                pairs.add((r, f, overlap))
+    return pairs
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_overlap_pairs_match_all_pairs(seed):
+    rng = np.random.default_rng(seed)
+    race_start = rng.uniform(0, 10000, 60)
+    race_end = race_start + rng.uniform(0, 3000, 60)
+    file_start = rng.uniform(-1000, 11000, 200)
+    file_end = file_start + rng.uniform(0, 2000, 200)
+    race_start[[3, 7]] = np.nan
+    file_end[[0, 5, 9]] = np.nan
+    races, files, overlap = overlap_pairs(race_start, race_end, file_start, file_end)
+    assert set(zip(races.tolist(), files.tolist(), overlap.tolist())) == \
+        brute_overlaps(race_start, race_end, file_start, file_end)
+    assert len(races) == len(set(zip(races.tolist(), files.tolist())))
+
+
+def test_assign_files_takes_the_longest_overlap():
+    race_start, race_end = np.array([0.0, 1000.0, np.nan]), np.array([1200.0, 5000.0, np.nan])
+    file_start = np.array([100.0, 900.0, 1150.0, 6000.0, np.nan, 1050.0])
+    file_end = np.array([1100.0, 3000.0, 1190.0, 7000.0, 500.0, 1150.0])
+    # File 5 lies inside both races: it goes to the one that started later
+    assert assign_files(race_start, race_end, file_start, file_end).tolist() == [0, 1, -1, -1, -1, 1]
@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from intervals_agent.tables import read_table, write_table
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'merge_xert_data.py')
+
+
+def xert_file(date, start, end, power, minutes, tss):
+    return {'Date': date, 'Xert_Start': start, 'Xert_End': end, 'Xert_Max_Power': power, 'Xert_Avg_Power': power / 2,
+            'Xert_Duration_Min': minutes, 'Xert_TSS': tss}
+
+
+def test_files_are_used_by_one_race_only(tmp_path):
+    races = pd.DataFrame({
+        'Date': ['2024-05-01', '2024-05-01', '2024-05-02'],
+        'Name': ['Crit', 'Hill climb (no times)', 'Road race'],
+        'Performance Score': [1.0, 2.0, 3.0],
+        'Start (UTC)': ['2024-05-01T09:00:00Z', None, '2024-05-02T09:00:00Z'],
+        'End (UTC)': ['2024-05-01T10:00:00Z', None, '2024-05-02T12:00:00Z'],
+    })
+    files = pd.DataFrame([
+        xert_file('2024-05-01', '2024-05-01T08:58:00Z', '2024-05-01T10:01:00Z', 900.0, 63.0, 80.0),  # The crit
+        xert_file('2024-05-01', '2024-05-01T14:00:00Z', '2024-05-01T14:20:00Z', 500.0, 20.0, 20.0),  # Overlaps no race
+        xert_file('2024-05-01', None, None, 600.0, 10.0, 5.0),                                        # No times
+        xert_file('2024-05-02', '2024-05-02T09:00:00Z', '2024-05-02T12:00:00Z', 1000.0, 180.0, 200.0),
+        xert_file('2024-05-02', '2024-05-02T07:30:00Z', '2024-05-02T08:15:00Z', 400.0, 45.0, 30.0),  # Warm-up
+    ])
+    write_table(races, str(tmp_path / 'race_analysis.parquet'))
+    write_table(files, str(tmp_path / 'xert_metrics.parquet'))
+    result = subprocess.run([sys.executable, SCRIPT], cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+    merged = read_table(str(tmp_path / 'race_analysis_with_xert.parquet')).set_index('Name')
+    assert merged.loc['Crit', ['Xert_Match', 'Xert_Files', 'Xert_TSS']].tolist() == ['overlap', 1, 80.0]
+    # The untimed race takes the day's files no race took by time: not the crit's
+    assert merged.loc['Hill climb (no times)', ['Xert_Match', 'Xert_Files', 'Xert_Max_Power', 'Xert_TSS']].tolist() == \
+        ['date', 2, 600.0, 25.0]
+    assert merged.loc['Road race', ['Xert_Match', 'Xert_Files', 'Xert_Duration_Min']].tolist() == ['overlap', 1, 180.0]
+    assert merged['Xert_TSS'].sum() == files['Xert_TSS'].sum() - 30.0
+    assert 'Left out 1 file(s)' in result.stdout
+    assert np.isfinite(merged['Xert_Avg_Power']).all()
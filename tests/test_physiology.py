@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from intervals_agent.physiology import (resample_1hz, normalized_power, intensity_factor, training_stress_score,
+                                        mean_max_power, aerobic_decoupling, ride_metrics, add_load_metrics,
+                                        MAX_HOLD_SECONDS)
+
+
+def brute_resample(time, power):
+    """Sample-and-hold onto a 1 Hz grid, one second at a time."""
+    order = sorted(range(len(time)), key=lambda i: time[i])
+    t0, out = time[order[0]], []
+    for second in range(int(round(time[order[-1]] - t0)) + 1):
+        last = [i for i in order if round(time[i] - t0) <= second][-1]
+        held = second - round(time[last] - t0)
+        out.append(0.0 if held > MAX_HOLD_SECONDS or np.isnan(power[last]) else power[last])
+    return np.array(out)
+
+
+def test_resample_holds_samples_and_stops_after_gaps():
+    time = np.array([100.0, 101.0, 104.0, 103.0, 120.0, 121.0])
+    power = np.array([200.0, 210.0, np.nan, 250.0, 300.0, 310.0])
+    hr = np.array([140.0, 141.0, 142.0, 143.0, 150.0, 151.0])
+    p, h = resample_1hz(time, power, hr)
+    assert np.array_equal(p, brute_resample(time, power))
+    assert len(p) == 22
+    assert np.isnan(h[10:20]).all() and h[20] == 150.0
+
+
+def test_resample_without_timestamps():
+    p, h = resample_1hz([np.nan, np.nan], [1.0, 2.0], [3.0, 4.0])
+    assert len(p) == 0 and len(h) == 0
+
+
+def test_normalized_power_and_mmp_match_loops():
+    rng = np.random.default_rng(0)
+    power = rng.uniform(0, 600, 4000)
+    rolling = [power[i:i + 30].mean() for i in range(len(power) - 29)]
+    assert normalized_power(power) == pytest.approx(np.mean(np.power(rolling, 4)) ** 0.25)
+    curve = mean_max_power(power, {'5s': 5, '5min': 300, '2h': 7200})
+    assert curve['5s'] == pytest.approx(max(power[i:i + 5].mean() for i in range(len(power) - 4)))
+    assert curve['5min'] == pytest.approx(max(power[i:i + 300].mean() for i in range(len(power) - 299)))
+    assert curve['2h'] is None
+    assert normalized_power(power[:29]) is None
+
+
+def test_steady_hour_at_ftp_is_100_tss():
+    power = np.full(3600, 250.0)
+    assert normalized_power(power) == pytest.approx(250.0)
+    assert intensity_factor(250.0, 250.0) == 1.0
+    assert training_stress_score(3600, 250.0, 250.0) == pytest.approx(100.0)
+    assert training_stress_score(1800, 200.0, 250.0) == pytest.approx(0.5 * 0.8 * 0.8 * 100)
+
+
+def test_decoupling():
+    power = np.full(3600, 200.0)
+    assert aerobic_decoupling(power, np.full(3600, 140.0)) == pytest.approx(0.0)
+    drifting = np.concatenate([np.full(1800, 140.0), np.full(1800, 154.0)])
+    assert aerobic_decoupling(power, drifting) == pytest.approx((1 - 140 / 154) * 100)
+    assert aerobic_decoupling(power[:600], drifting[:600]) is None
+
+
+def test_ride_metrics_and_load_columns():
+    time = np.arange(3600.0) + 1.7e9
+    metrics = ride_metrics({'time': time, 'power': np.full(3600, 250.0), 'hr': np.full(3600, 150.0)})
+    assert (metrics['Xert_NP'], metrics['Xert_VI'], metrics['Xert_MMP_60min']) == (250.0, 1.0, 250.0)
+    df = add_load_metrics(pd.DataFrame({'Xert_NP': [250.0, np.nan], 'Xert_Duration_Min': [60.0, 30.0]}), 250)
+    assert df['Xert_IF'].iloc[0] == 1.0 and df['Xert_TSS'].iloc[0] == 100.0
+    assert df[['Xert_IF', 'Xert_TSS']].iloc[1].isna().all()
+    assert add_load_metrics(pd.DataFrame({'Xert_NP': [250.0], 'Xert_Duration_Min': [60.0]}), None)['Xert_TSS'].isna().all()
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from intervals_agent.pipeline import Stage, Pipeline, fingerprint
+
+# Copies its input to its output, upper-cased only if asked (so the output can stay the same)
+COPY = '''import sys
+data = open(sys.argv[1]).read()
+open(sys.argv[2], 'w').write(data.upper() if len(sys.argv) > 3 else data.strip())
+'''
+FAIL = 'import sys; sys.exit(1)\n'
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'copy.py').write_text(COPY)
+    (tmp_path / 'fail.py').write_text(FAIL)
+    (tmp_path / 'raw.txt').write_text('hello\n')
+    return tmp_path
+
+
+def stages(second='copy.py'):
+    return [Stage('first', ['copy.py', 'raw.txt', 'mid.txt'], inputs=['raw.txt'], outputs=['mid.txt'], code=['copy.py']),
+            Stage('second', [second, 'mid.txt', 'out.txt', 'upper'], inputs=['mid.txt'], outputs=['out.txt'],
+                  code=[second], env=['PIPELINE_TEST_VALUE'])]
+
+
+def test_fingerprint_tracks_content_code_command_and_env(workdir, monkeypatch):
+    stage = stages()[0]
+    base = fingerprint(stage)
+    os.utime('raw.txt', (0, 0))
+    assert fingerprint(stage) == base  # Same content, new mtime
+    (workdir / 'raw.txt').write_text('changed\n')
+    assert fingerprint(stage) != base
+    (workdir / 'raw.txt').write_text('hello\n')
+    assert fingerprint(stage) == base
+    (workdir / 'copy.py').write_text(COPY + '# edited\n')
+    assert fingerprint(stage) != base
+    (workdir / 'copy.py').write_text(COPY)
+    assert fingerprint(Stage('first', ['copy.py', 'raw.txt', 'other.txt'], inputs=['raw.txt'], code=['copy.py'])) != base
+
+    second = stages()[1]
+    before = fingerprint(second)
+    monkeypatch.setenv('PIPELINE_TEST_VALUE', '1')
+    assert fingerprint(second) != before
+
+
+def test_directory_inputs_are_fingerprinted_by_listing(workdir):
+    (workdir / 'exports').mkdir()
+    stage = Stage('dir', ['copy.py'], inputs=['exports'])
+    empty = fingerprint(stage)
+    (workdir / 'exports' / 'a.tcx').write_text('x')
+    assert fingerprint(stage) != empty
+
+
+def test_runs_once_then_caches_and_stops_at_unchanged_outputs(workdir):
+    assert Pipeline(stages()).run(jobs=1) == {'first': 'ran', 'second': 'ran'}
+    assert (workdir / 'out.txt').read_text() == 'HELLO'
+    assert Pipeline(stages()).run(jobs=1) == {'first': 'cached', 'second': 'cached'}
+
+    # Only trailing whitespace changes: the first stage re-runs but writes the same mid.txt
+    (workdir / 'raw.txt').write_text('hello\n\n')
+    assert Pipeline(stages()).run(jobs=1) == {'first': 'ran', 'second': 'cached'}
+
+    (workdir / 'out.txt').unlink()
+    assert Pipeline(stages()).run(jobs=1) == {'first': 'cached', 'second': 'ran'}
+
+
+def test_failures_are_not_recorded_and_block_downstream(workdir):
+    failing = [Stage('first', ['fail.py'], inputs=['raw.txt'], outputs=['mid.txt'], code=['fail.py'])] + stages()[1:]
+    (workdir / 'mid.txt').write_text('old\n')
+    assert Pipeline(failing).run(jobs=1) == {'first': 'failed', 'second': 'skipped'}
+    assert Pipeline(failing).run(jobs=1)['first'] == 'failed'  # Still out of date
+
+
+def test_missing_inputs_block_and_dry_run_plans(workdir):
+    (workdir / 'raw.txt').unlink()
+    assert Pipeline(stages()).run(jobs=1) == {'first': 'blocked', 'second': 'blocked'}
+    (workdir / 'raw.txt').write_text('hello\n')
+    assert Pipeline(stages()).run(jobs=1, dry_run=True) == {'first': 'planned', 'second': 'planned'}
+    assert not (workdir / 'mid.txt').exists()
+
+
+def test_waves_follow_the_declared_files():
+    pipeline = Pipeline(list(reversed(stages())))
+    assert pipeline.waves() == [['first'], ['second']]
+    cycle = [Stage('a', [], inputs=['b.txt'], outputs=['a.txt']), Stage('b', [], inputs=['a.txt'], outputs=['b.txt'])]
+    with pytest.raises(ValueError):
+        Pipeline(cycle).waves()
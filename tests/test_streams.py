@@ -0,0 +1,62 @@
+import numpy as np
+import requests
+
+from intervals_agent.streams import StreamStore, fetch_missing, decode_streams
+
+
+class Response:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeClient:
+    """Answers stream requests from a {activity_id: status} table and counts them."""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.requested = []
+
+    def activity_url(self, activity_id, path):
+        return activity_id
+
+    def get(self, url, params=None):
+        self.requested.append(url)
+        status = self.statuses.get(url, 200)
+        if status != 200:
+            raise requests.HTTPError(f"{status} error", response=Response(status))
+        return Response(200, [{'type': 'time', 'data': [0, 1, 2]}, {'type': 'watts', 'data': [100, None, 300]}])
+
+    def map(self, func, items):
+        return [func(item) for item in items]
+
+
+def test_refused_downloads_are_not_requested_again(tmp_path):
+    store = StreamStore(str(tmp_path / 'streams'))
+    client = FakeClient({'gone': 404, 'forbidden': 403, 'busy': 503, 'throttled': 429})
+    ids = ['ok', 'gone', 'forbidden', 'busy', 'throttled']
+    fetched, failed = fetch_missing(client, store, ids)
+    assert fetched == 1 and {a for a, _ in failed} == {'gone', 'forbidden', 'busy', 'throttled'}
+    assert set(store.failed()) == {'gone', 'forbidden'}
+
+    client.requested = []
+    fetch_missing(client, store, ids)
+    assert sorted(client.requested) == ['busy', 'throttled']
+
+    # --refetch retries them; those that now succeed leave the list
+    client.statuses = {'forbidden': 403}
+    client.requested = []
+    fetched, _ = fetch_missing(client, store, ids, refetch=True)
+    assert sorted(client.requested) == ['busy', 'forbidden', 'gone', 'throttled']
+    assert fetched == 3 and set(store.failed()) == {'forbidden'}
+    assert np.array_equal(store.load('gone', ['power'])['power'], [100, np.nan, 300], equal_nan=True)
+
+
+def test_decode_streams_fills_missing_and_mismatched_columns():
+    streams = decode_streams([{'type': 'time', 'data': [0, 1]}, {'type': 'heartrate', 'data': [120]},
+                              {'type': 'watts', 'data': [None, 250]}])
+    assert np.isnan(streams['hr']).all() and len(streams['hr']) == 2
+    assert np.array_equal(streams['power'], [np.nan, 250], equal_nan=True)
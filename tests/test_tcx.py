@@ -0,0 +1,87 @@
+import gzip
+import shutil
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+import synthetic
+from analyze_xert_tcx import read_tcx, RideFileError, NAMESPACE
+
+TCX = ('<?xml version="1.0"?>\n'
+       '<TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2" '
+       'xmlns:ns3="http://www.garmin.com/xmlschemas/ActivityExtension/v2"><Activities>{}</Activities>'
+       '</TrainingCenterDatabase>')
+
+
+def write(tmp_path, body, name='ride.tcx'):
+    path = tmp_path / name
+    path.write_text(TCX.format(body), encoding='utf-8')
+    return str(path)
+
+
+def reference(path):
+    """The metrics of a TCX file from a full ElementTree parse, the way the original parser read them."""
+    points = ET.parse(path).getroot().findall('.//ns:Trackpoint', NAMESPACE)
+    watts = [float(tp.find('.//ext:Watts', NAMESPACE).text) for tp in points
+             if tp.find('.//ext:Watts', NAMESPACE) is not None]
+    hr = [float(tp.find('ns:HeartRateBpm/ns:Value', NAMESPACE).text) for tp in points
+          if tp.find('ns:HeartRateBpm/ns:Value', NAMESPACE) is not None]
+    return watts, hr, [tp.find('ns:Time', NAMESPACE).text for tp in points]
+
+
+def test_matches_a_full_parse(tmp_path):
+    path = str(tmp_path / 'ride.tcx')
+    synthetic.write_tcx(path, 900, seed=4)
+    metrics, streams = read_tcx(path, collect_streams=True)
+    watts, hr, times = reference(path)
+    assert metrics['Date'] == times[0][:10]
+    assert metrics['Xert_Max_Power'] == max(watts)
+    assert metrics['Xert_Avg_Power'] == round(sum(watts) / len(watts), 1)
+    assert metrics['Xert_Max_HR'] == max(hr)
+    assert metrics['Xert_Avg_HR'] == round(sum(hr) / len(hr), 1)
+    assert metrics['Xert_Duration_Min'] == round(899 / 60, 1)
+    assert len(streams['time']) == 900
+    assert np.array_equal(np.diff(streams['time']), np.ones(899))
+    assert np.nansum(streams['power']) == sum(watts)
+    assert np.isnan(streams['power']).sum() == 900 - len(watts)
+
+
+def test_gzipped_file_reads_the_same(tmp_path):
+    path = str(tmp_path / 'ride.tcx')
+    synthetic.write_tcx(path, 300, seed=5)
+    with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    plain, gzipped = read_tcx(path)[0], read_tcx(path + '.gz')[0]
+    assert {k: v for k, v in plain.items() if k != 'Xert_Filename'} == \
+        {k: v for k, v in gzipped.items() if k != 'Xert_Filename'}
+
+
+def test_only_the_first_value_of_a_trackpoint_counts(tmp_path):
+    point = ('<Trackpoint><Time>2024-05-01T10:00:0{s}Z</Time><HeartRateBpm><Value>{hr}</Value></HeartRateBpm>'
+             '<Extensions><ns3:TPX><ns3:Watts>{w}</ns3:Watts><ns3:Watts>999</ns3:Watts></ns3:TPX></Extensions>'
+             '</Trackpoint>')
+    body = ('<Activity><Id>2024-05-01T10:00:00Z</Id><Lap><Track>'
+            + point.format(s=0, hr=140, w=200) + point.format(s=6, hr=150, w=300)
+            + '</Track></Lap></Activity>')
+    metrics = read_tcx(write(tmp_path, body))[0]
+    assert (metrics['Xert_Max_Power'], metrics['Xert_Avg_Power'], metrics['Xert_Avg_HR']) == (300, 250, 145)
+    assert metrics['Xert_Duration_Min'] == 0.1
+    assert (metrics['Xert_Start'], metrics['Xert_End']) == ('2024-05-01T10:00:00Z', '2024-05-01T10:00:06Z')
+
+
+@pytest.mark.parametrize('body, reason', [
+    ('<Activity><Lap><Track></Track></Lap></Activity>', 'no Activity with an Id'),
+    ('<Activity><Id>2024-05-01T10:00:00Z</Id><Lap><Track><Trackpoint><Time>2024-05-01T10:00:00Z</Time>'
+     '</Trackpoint></Track></Lap></Activity>', 'no power data'),
+])
+def test_files_without_a_ride(tmp_path, body, reason):
+    with pytest.raises(RideFileError, match=reason):
+        read_tcx(write(tmp_path, body))
+
+
+def test_malformed_xml(tmp_path):
+    path = tmp_path / 'ride.tcx'
+    path.write_text('<TrainingCenterDatabase><Activities>', encoding='utf-8')
+    with pytest.raises(ET.ParseError):
+        read_tcx(str(path))